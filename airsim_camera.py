@@ -0,0 +1,71 @@
+#this file provides uncompressed camera capture for the detection scripts
+
+import airsim
+import numpy as np
+import cv2
+
+# turns one uncompressed simGetImages response into an HxWxC uint8 array.
+# The array is a read-only view onto the response bytes (no copy), so call .copy() before drawing on it.
+# returns None if the response holds no image (e.g. the camera name was wrong)
+def responseToImage(response):
+    if response.width == 0 or response.height == 0 or len(response.image_data_uint8) == 0:
+        return None
+
+    if response.compress:
+        # compressed responses still work, they just need decoding
+        return cv2.imdecode(np.frombuffer(response.image_data_uint8, np.uint8), cv2.IMREAD_COLOR)
+
+    pixels = np.frombuffer(response.image_data_uint8, np.uint8)
+
+    # Scene images are 3 channel (BGR) on current AirSim builds, older builds send 4 channel BGRA
+    channels = pixels.size // (response.height * response.width)
+    image = pixels.reshape(response.height, response.width, channels)
+    if channels == 4:
+        image = image[:, :, :3]
+    return image
+
+class CameraCapture:
+
+    # client = airsim client to capture with
+    # cameras = list of (camera_name, vehicle_name) pairs to grab on every call.
+    #           all cameras of one vehicle are fetched with a single simGetImages RPC
+    # image_type = airsim.ImageType to request (Scene by default)
+    def __init__(self, client : airsim.MultirotorClient, cameras = [("bottom_center", "")], image_type = airsim.ImageType.Scene):
+        self.client = client
+        self.cameras = list(cameras)
+        self.image_type = image_type
+
+        # group requests by vehicle, since one simGetImages call serves one vehicle.
+        # each entry is (vehicle_name, requests, indices of those cameras in self.cameras)
+        self.batches = []
+        batchByVehicle = {}
+        for i, (cameraName, vehicleName) in enumerate(self.cameras):
+            if vehicleName not in batchByVehicle:
+                batchByVehicle[vehicleName] = (vehicleName, [], [])
+                self.batches.append(batchByVehicle[vehicleName])
+            batchByVehicle[vehicleName][1].append(airsim.ImageRequest(cameraName, self.image_type, False, False))
+            batchByVehicle[vehicleName][2].append(i)
+
+        self.rpc_count = 0
+
+    # grabs one frame from every camera. returns a list of images in the same order as self.cameras
+    # (None for any camera that returned nothing). Images are read-only views, see responseToImage
+    def grab(self):
+        images = [None] * len(self.cameras)
+        for vehicleName, requests, indices in self.batches:
+            responses = self.client.simGetImages(requests, vehicle_name=vehicleName)
+            self.rpc_count += 1
+            for i, response in zip(indices, responses):
+                images[i] = responseToImage(response)
+        return images
+
+    # grabs a single frame from the first camera
+    def grabOne(self):
+        return self.grab()[0]
+
+# captures one uncompressed frame from a single camera
+def grab(client : airsim.MultirotorClient, camera_name = "bottom_center", vehicle_name = ""):
+    responses = client.simGetImages([airsim.ImageRequest(camera_name, airsim.ImageType.Scene, False, False)], vehicle_name=vehicle_name)
+    if not responses:
+        return None
+    return responseToImage(responses[0])
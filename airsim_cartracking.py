@@ -1,5 +1,6 @@
 import airsim_splitscreen
 import airsim_keyboard_controller
+import airsim_camera
 from airsim_drone import Drone
 import airsim
 import keyboard
@@ -22,12 +23,13 @@ def tracking_demo(client : airsim.MultirotorClient):
     
     model = YOLO("yolo11s.pt")
 
+    sink = airsim_splitscreen.SplitScreenImageSink(client, rightSide=True)
+
     while True:
 
         # image processing for right side screen capture
-        raw_image = client.simGetImage(camera_name="bottom_center", image_type=airsim.ImageType.Scene, vehicle_name=mainDrone.vehicleName)
-
-        image = cv2.imdecode(airsim.string_to_uint8_array(raw_image), cv2.IMREAD_COLOR)
+        # copied because the capture is a read-only view and boxes get drawn onto it
+        image = airsim_camera.grab(client, camera_name="bottom_center", vehicle_name=mainDrone.vehicleName).copy()
 
         try:    
             # sent image to model
@@ -59,22 +61,16 @@ def tracking_demo(client : airsim.MultirotorClient):
         # adding stuff for display
         image = cv2.resize(image, (512, 564))
 
-        # save image to file
-        img_path = "demo_image.png"
-        cv2.imwrite(img_path, image)
-
-        # displaying image (needs to get image from file, which is why we have to save it above)
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-
-        absolute_img_path = dir_path + "\\" + img_path
-
-        airsim_splitscreen.simSetSplitScreenToImageFile(client, absolute_img_path, rightSide=True)
+        # displaying image (written to a memory-mapped file Unreal reads from, skipped if nothing changed)
+        sink.push(image)
 
         # disable script
         if(keyboard.is_pressed('esc')):
             break
-        
+
         time.sleep(0.1)
+
+    sink.close()
         
 
 if __name__ == "__main__":
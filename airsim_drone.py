@@ -7,7 +7,8 @@ import utm
 
 class Drone:
 
-    # client = currently connected airsim multirotor client
+    # client = currently connected airsim multirotor client. airsim clients aren't safe to share between threads, so
+    #          anything that makes RPCs from its own thread (schedulers, pollers) should be given its own client
     # sensorSpots = list of positions (Vector3r) audio listening sensors relative to center of the drone
     # vehicleName = vehicle name (should match name according to client)
     # shouldSpawn = whether this vehicle should be spawned here in the script (used if not new vehicle defined in settings)
@@ -17,6 +18,8 @@ class Drone:
         self.vehicleName = vehicleName
         self.sensorSpots = sensorSpots
         self.speed_of_sound_mps = 343
+        # FleetStateCache to read state from instead of making RPCs (see useStateCache)
+        self.stateCache = None
         if(shouldSpawn):
             self.client.simAddVehicle(self.vehicleName, "simpleflight", airsim.Pose(spawnPosition), pawn_path=pawn_path)
 
@@ -27,29 +30,46 @@ class Drone:
     def resetStartingAltitude(self):
         self.starting_altitude = self.client.getGpsData(vehicle_name=self.vehicleName).gnss.geo_point.altitude
 
+    # makes getState, getWorldPosition, getUTMPosition etc. read from a FleetStateCache that polls this vehicle
+    # instead of each making their own RPC. None goes back to asking the simulator directly
+    def useStateCache(self, stateCache):
+        self.stateCache = stateCache
+
     def getUTMPosition(self):
-        geo_point = self.client.getGpsData(vehicle_name=self.vehicleName).gnss.geo_point
+        gps = self.stateCache.getGpsData(self.vehicleName) if self.stateCache is not None else self.client.getGpsData(vehicle_name=self.vehicleName)
+        geo_point = gps.gnss.geo_point
         utm_pos = utm.from_latlon(geo_point.latitude, geo_point.longitude)
         
         return Vector3r(utm_pos[0], utm_pos[1], geo_point.altitude - self.starting_altitude)
 
-    def getWorldPosition(self):
-        return self.client.getMultirotorState(self.vehicleName).kinematics_estimated.position + self.startingPosition
+    # one getMultirotorState RPC. Passing the result to the methods below makes them all use the same physics tick
+    # instead of each asking the simulator again
+    def getState(self):
+        if self.stateCache is not None:
+            return self.stateCache.getMultirotorState(self.vehicleName)
+        return self.client.getMultirotorState(self.vehicleName)
+
+    def getWorldPosition(self, state = None):
+        state = state if state is not None else self.getState()
+        return state.kinematics_estimated.position + self.startingPosition
     
-    def getSensorWorldPos(self):
-        return [sensorSpot + self.getWorldPosition() for sensorSpot in self.sensorSpots]
+    def getSensorWorldPos(self, state = None):
+        worldPosition = self.getWorldPosition(state)
+        return [sensorSpot + worldPosition for sensorSpot in self.sensorSpots]
+
+    # Nx3 array of the world position of each sensor, from a single state sample
+    def getSensorWorldPosArray(self, state = None):
+        worldPosition = self.getWorldPosition(state)
+        spots = np.array([(spot.x_val, spot.y_val, spot.z_val) for spot in self.sensorSpots], dtype=np.float64).reshape(-1, 3)
+        return spots + np.array((worldPosition.x_val, worldPosition.y_val, worldPosition.z_val))
 
-    def simGetAudioTimes(self, soundEmitPoint : Vector3r):
+    def simGetAudioTimes(self, soundEmitPoint : Vector3r, state = None):
 
         # calculating the time it would take to reach each sensor
-        audioTimes = []
-        
-        for sensorSpot in self.getSensorWorldPos():
-            dist = soundEmitPoint.distance_to(sensorSpot)
-            time = dist / self.speed_of_sound_mps
-            audioTimes.append(time)
+        sensorPositions = self.getSensorWorldPosArray(state)
+        dists = np.linalg.norm(sensorPositions - np.array((soundEmitPoint.x_val, soundEmitPoint.y_val, soundEmitPoint.z_val)), axis=1)
 
-        return audioTimes
+        return (dists / self.speed_of_sound_mps).tolist()
     
     def moveToWorldPosition(self, position : airsim.Vector3r, velocity : float = 10, duration : float = 60):
         worldPosition = position - self.startingPosition
@@ -118,4 +138,46 @@ class Drone:
         x_source = np.matmul(np.matmul(np.matmul(np.matmul(np.linalg.inv(first_term), np.transpose(sensorOffsetsToReference)), np.transpose(distanceRemover)), distanceRemover), mew)
 
         return Vector3r(x_source[0], x_source[1], x_source[2])'
-        '''
\ No newline at end of file
+        '''
+
+
+class FleetSnapshot:
+    """
+    Sensor positions of several drones sampled together, one getMultirotorState per drone
+    """
+    __slots__ = ("vehicle_names", "states", "world_positions", "sensor_ids", "sensor_positions", "speed_of_sound_mps")
+
+    def __init__(self, drones, states):
+        self.vehicle_names = [drone.vehicleName for drone in drones]
+        self.states = dict(zip(self.vehicle_names, states))
+        self.world_positions = {drone.vehicleName : drone.getWorldPosition(state) for drone, state in zip(drones, states)}
+
+        # (vehicle name, sensor index) for each row of sensor_positions
+        self.sensor_ids = [(drone.vehicleName, i) for drone in drones for i in range(len(drone.sensorSpots))]
+        self.sensor_positions = np.concatenate([drone.getSensorWorldPosArray(state) for drone, state in zip(drones, states)])
+        self.speed_of_sound_mps = drones[0].speed_of_sound_mps if drones else 343
+
+    # sensor world positions as Vector3r, in the same order as sensor_ids (what calcSoundEmitPosition takes)
+    def sensorWorldPositions(self):
+        return [Vector3r(*position) for position in self.sensor_positions.tolist()]
+
+    # time for a sound at soundEmitPoint to reach every sensor in the fleet
+    def audioTimes(self, soundEmitPoint : Vector3r):
+        dists = np.linalg.norm(self.sensor_positions - np.array((soundEmitPoint.x_val, soundEmitPoint.y_val, soundEmitPoint.z_val)), axis=1)
+        return (dists / self.speed_of_sound_mps).tolist()
+
+# samples the state of every drone once. airsim has no multi-vehicle state call, so the RPCs still go out one by one;
+# pause = pause the simulation while sampling so every drone is read from the same physics tick
+def sampleFleet(drones : list, pause : bool = False):
+    if not drones:
+        return FleetSnapshot([], [])
+    client = drones[0].client
+    if pause:
+        client.simPause(True)
+    try:
+        states = [drone.getState() for drone in drones]
+    finally:
+        if pause:
+            client.simPause(False)
+    return FleetSnapshot(drones, states)
+
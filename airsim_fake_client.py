@@ -0,0 +1,138 @@
+#this file provides a stand-in for airsim.MultirotorClient that serves camera frames from disk
+
+import glob
+import os
+import time
+import itertools
+import numpy as np
+import cv2
+import airsim
+from collections import Counter
+
+class FakeImageResponse:
+    """
+    The parts of airsim.ImageResponse the capture code reads
+    """
+    __slots__ = ("image_data_uint8", "width", "height", "compress", "camera_name", "image_type", "time_stamp")
+
+    def __init__(self, image_data_uint8, width, height, compress, camera_name, image_type, time_stamp):
+        self.image_data_uint8 = image_data_uint8
+        self.width = width
+        self.height = height
+        self.compress = compress
+        self.camera_name = camera_name
+        self.image_type = image_type
+        self.time_stamp = time_stamp
+
+class FakeMultirotorClient:
+
+    # frame_paths = list of image files (or a single glob pattern) to serve as camera frames, in order, looping forever.
+    #               defaults to the satellite test images in this folder
+    # rpc_delay = seconds each call sleeps for, to imitate the RPC round trip to the simulator
+    # read_image_files = load the image file named by split screen console commands, like Unreal does
+    # vehicle_positions = {vehicle name : (x, y, z)} reported by getMultirotorState. Unlisted vehicles are at the origin
+    def __init__(self, frame_paths = None, rpc_delay : float = 0.0, read_image_files = False, vehicle_positions = None):
+        if frame_paths is None:
+            frame_paths = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sat_testimage_*.png")
+        if isinstance(frame_paths, str):
+            frame_paths = sorted(glob.glob(frame_paths))
+        if not frame_paths:
+            raise ValueError("FakeMultirotorClient needs at least one frame to serve.")
+
+        self.frame_paths = list(frame_paths)
+        self.rpc_delay = rpc_delay
+        self.read_image_files = read_image_files
+        self.vehicle_positions = dict(vehicle_positions) if vehicle_positions is not None else {}
+        self.paused = False
+
+        # console commands received, in order
+        self.console_commands = []
+
+        # every served "RPC" is counted by name so callers can check how many round trips they made
+        self.rpc_counts = Counter()
+
+        self.encoded_frames = []
+        for path in self.frame_paths:
+            with open(path, 'rb') as imgfile:
+                self.encoded_frames.append(imgfile.read())
+        self._frame_cycle = itertools.cycle(range(len(self.encoded_frames)))
+
+        # uncompressed BGR versions of the frames, decoded the first time simGetImages needs them
+        self._decoded_frames = None
+
+    def _rpc(self, name):
+        self.rpc_counts[name] += 1
+        if self.rpc_delay > 0:
+            time.sleep(self.rpc_delay)
+
+    def confirmConnection(self):
+        self._rpc("confirmConnection")
+
+    # same signature as airsim.MultirotorClient.simGetImage. Returns the next frame as compressed PNG bytes
+    def simGetImage(self, camera_name, image_type, vehicle_name = '', external = False):
+        self._rpc("simGetImage")
+        return self.encoded_frames[next(self._frame_cycle)]
+
+    # same signature as airsim.MultirotorClient.simGetImages. Every request in the call gets the same frame,
+    # uncompressed (raw BGR bytes) or PNG depending on the request's compress flag
+    def simGetImages(self, requests, vehicle_name = '', external = False):
+        self._rpc("simGetImages")
+        if self._decoded_frames is None:
+            self._decoded_frames = [cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR) for frame in self.encoded_frames]
+
+        frameIndex = next(self._frame_cycle)
+        image = self._decoded_frames[frameIndex]
+        timeStamp = time.time_ns()
+
+        responses = []
+        for request in requests:
+            data = self.encoded_frames[frameIndex] if request.compress else image.tobytes()
+            responses.append(FakeImageResponse(data, image.shape[1], image.shape[0], request.compress, request.camera_name, request.image_type, timeStamp))
+        return responses
+
+    def getMultirotorState(self, vehicle_name = ''):
+        self._rpc("getMultirotorState")
+        state = airsim.MultirotorState()
+        state.kinematics_estimated.position = airsim.Vector3r(*self.vehicle_positions.get(vehicle_name, (0, 0, 0)))
+        state.timestamp = time.time_ns()
+        return state
+
+    def getGpsData(self, gps_name = '', vehicle_name = ''):
+        self._rpc("getGpsData")
+        return airsim.GpsData()
+
+    def simPause(self, is_paused):
+        self._rpc("simPause")
+        self.paused = is_paused
+
+    def simIsPause(self):
+        self._rpc("simIsPause")
+        return self.paused
+
+    def simGetVehiclePose(self, vehicle_name = ''):
+        self._rpc("simGetVehiclePose")
+        return airsim.Pose(position_val=airsim.Vector3r(*self.vehicle_positions.get(vehicle_name, (0, 0, 0))))
+
+    # objects are only counted, the name is returned like Unreal would
+    def simSpawnObject(self, object_name, asset_name, pose, scale, physics_enabled = False, is_blueprint = False):
+        self._rpc("simSpawnObject")
+        return f"{object_name}_{self.rpc_counts['simSpawnObject']}"
+
+    def simSetCameraPose(self, camera_name, pose, vehicle_name = '', external = False):
+        self._rpc("simSetCameraPose")
+
+    def simSetCameraFov(self, camera_name, fov_degrees, vehicle_name = '', external = False):
+        self._rpc("simSetCameraFov")
+
+    def simPrintLogMessage(self, message, message_param = "", severity = 0):
+        self._rpc("simPrintLogMessage")
+
+    def simRunConsoleCommand(self, command):
+        self._rpc("simRunConsoleCommand")
+        self.console_commands.append(command)
+
+        if self.read_image_files and command.startswith("ce SetSplitScreenImageFromFile"):
+            fileName = command.split(" ", 3)[3]
+            if cv2.imread(fileName, cv2.IMREAD_COLOR) is None:
+                raise FileNotFoundError(f"Split screen image {fileName} could not be read")
+        return True
@@ -5,99 +5,51 @@ import keyboard
 import airsim_spawn_gunshot
 import asyncio
 from airsim import Vector3r
-from airsim_drone import Drone
+from airsim_drone import Drone, sampleFleet
 import numpy as np
 import airsim_splitscreen
 from airsim_splitscreen import simSplitScreen, simAttachCameraToDrone
 from airsim_texture_replacement import textureReplacePath, textureResize, standardTextureReplacement
+from gunshot_localizer import StreamingGunshotLocalizer, GunshotDispatcher, SensorArrival
+from audio_tdoa import estimate_arrival_times
+from multi_mic_classifier import synthesize_sensor_signals
+from airsim_gunshot_detection import get_classifier
+from tdoa import calcSoundEmitPosition
 
 
-# calculates position of sound based on positions of sensors and time delay between each sensor hearing the sound
-def calcSoundEmitPosition(sensorSpots : list, audioTimes : list, mediumSpeed : float = 343):
-        
-    if(len(audioTimes) != len(sensorSpots)):
-        raise ValueError("The length of audioTimes should be the same as the length of sensor spots. (and directly correspond with indices)")
-
-    size = len(sensorSpots)
-
-    # distances relative to sensor that heard the sound first
-    relativeDists = []
-    for i, audioTime in enumerate(audioTimes):
-        relativeDists.append(audioTime * mediumSpeed)
-        if(audioTime == 0): # for algorithm below, reference sensor can be any one but I'm picking the one thats closest and hears the sound first
-            referenceSensorId = i
-
-    # for this algorithm see https://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=1145216
-
-    # S_j in the paper. N-1x3 matrix of xyz coord of each sensor relative to reference sensor
-    sensorOffsetsToReference = np.zeros((size - 1,3))
-
-    # mu_j in the paper. I don't have an intuitive understanding/name for this. 
-    # Also in the paper the definition of this is slightly misprinted, all values need to be squared
-    mew = np.zeros(size - 1) 
-
-    # rho_j in the paper. Vector of the range differences between each sensor and reference sensor. 
-    # Since the chosen reference sensor has relativeDist 0 as defined above, this is just the relativeDists array
-    rangeDifferences = np.zeros(size - 1)
-    
-    referenceSensorPos = sensorSpots[referenceSensorId]
-
-    for j, sensorSpot in enumerate(sensorSpots):
-        if(j == referenceSensorId):
-            continue
-        
-        rowj = j if j < referenceSensorId else j-1 # lets us skip the reference sensor row in the following matrices
-        
-        sensorOffsetsToReference[rowj] = np.array(
-            (sensorSpot.x_val - referenceSensorPos.x_val,
-            sensorSpot.y_val - referenceSensorPos.y_val,
-            sensorSpot.z_val - referenceSensorPos.z_val)
-        )
-
-        mew[rowj] = (sensorSpot.get_length()**2 - referenceSensorPos.get_length()**2 - relativeDists[j]**2)/2 
-        rangeDifferences[rowj] = relativeDists[j]
-
-
-    # M_j in the paper. called distance remover because this is multiplied by rho_j to always get 0 and 
-    # this removes R_j_s (dist from reference sensor to source, which is what we want to find) from the equation.
-    # leaving x_s (position of source) as the only unknown
-    circularShift = np.roll(np.identity(size - 1), (1, 0), axis=(1, 0))
-    d_j = np.linalg.inv(np.diag(rangeDifferences))
-    distanceRemover = np.matmul((np.identity(size - 1) - (circularShift)), d_j)
-    
-    # compute position of source X_s
-    first_term = np.matmul(np.matmul(np.matmul(np.transpose(sensorOffsetsToReference), np.transpose(distanceRemover)), distanceRemover), sensorOffsetsToReference)
-    x_source = np.matmul(np.matmul(np.matmul(np.matmul(np.linalg.inv(first_term), np.transpose(sensorOffsetsToReference)), np.transpose(distanceRemover)), distanceRemover), mew)
-
-    return Vector3r(x_source[0], x_source[1], x_source[2])
-
 def simSpawnGunshotToFind(client : airsim.MultirotorClient, drone : Drone, pos : Vector3r):
 
     airsim_spawn_gunshot.simSpawnGunshotAtPos(client, pos)
     print(f"spawned gunshot at {pos}")
 
-    timeDiffs = drone.simGetAudioTimes(pos)
+    state = drone.getState()
+    timeDiffs = drone.simGetAudioTimes(pos, state)
     print(f"time difference on arrival vals {timeDiffs}")
     
     # subtracting by lowest value so one time is 0 and the other times are relative to that
     minTime = min(timeDiffs)
     timeDiffs = [audioTime - minTime for audioTime in timeDiffs]
 
-    estimatedSoundPosition = calcSoundEmitPosition([sensorSpot+drone.getWorldPosition() for sensorSpot in drone.sensorSpots], timeDiffs)
+    estimatedSoundPosition = calcSoundEmitPosition(drone.getSensorWorldPos(state), timeDiffs)
     print(f"algo thought gunshot at {estimatedSoundPosition}")
 
     drone.moveToPosition(Vector3r(estimatedSoundPosition.x_val, estimatedSoundPosition.y_val, -20), 10, 60).join()
 
-def simSpawnGunshotToFindMultidrone(client : airsim.MultirotorClient, drones : list, pos : Vector3r):
+# clip = optional waveform (GunshotClassifier.load_waveform) of the gunshot. When given, each sensor's recording of it is simulated
+# and the arrival times are estimated from the recordings instead of taken from the exact distances
+def simSpawnGunshotToFindMultidrone(client : airsim.MultirotorClient, drones : list, pos : Vector3r, clip = None):
 
     airsim_spawn_gunshot.simSpawnGunshotAtPos(client, pos)
     print(f"spawned gunshot at {pos}")
 
-    audioTimes = []
-    sensorPositions = []
-    for drone in drones:
-        audioTimes += drone.simGetAudioTimes(pos)
-        sensorPositions += drone.getSensorWorldPos()
+    # every drone's position is read once, and the same snapshot is used for the audio times and the solve
+    snapshot = sampleFleet(drones)
+    if clip is None:
+        audioTimes = snapshot.audioTimes(pos)
+    else:
+        recordings = synthesize_sensor_signals(clip, snapshot.sensor_positions, [pos.x_val, pos.y_val, pos.z_val])
+        audioTimes = estimate_arrival_times(recordings).tolist()
+    sensorPositions = snapshot.sensorWorldPositions()
     
     # subtracting by lowest value so one time is 0 and the other times are relative to that
     minTime = min(audioTimes)
@@ -110,7 +62,7 @@ def simSpawnGunshotToFindMultidrone(client : airsim.MultirotorClient, drones : l
     closestDrone = None
     closestDist = 100000000000
     for drone in drones:
-        position = drone.getWorldPosition()
+        position = snapshot.world_positions[drone.vehicleName]
         dist = estimatedSoundPosition.distance_to(position)
         if(closestDrone == None or dist < closestDist):
             closestDist = dist
@@ -118,6 +70,50 @@ def simSpawnGunshotToFindMultidrone(client : airsim.MultirotorClient, drones : l
 
     closestDrone.moveToWorldPosition(Vector3r(estimatedSoundPosition.x_val, estimatedSoundPosition.y_val, -5), 7, 60).join()
 
+# fires several gunshots that can overlap in time and localizes them all with the streaming localizer.
+# shots = list of (seconds after the first shot, Vector3r position). Drones are dispatched to each gunshot as soon as
+# its estimate is final, without holding up the next one. dispatchClient = separate client used for moving drones,
+# spawnClient = separate client used for spawning the gunshots
+async def simSpawnGunshotsToFindStreaming(client : airsim.MultirotorClient, drones : list, shots : list, dispatchClient : airsim.MultirotorClient,
+                                          spawnClient : airsim.MultirotorClient):
+    loop = asyncio.get_running_loop()
+
+    sensorCount = sum(len(drone.sensorSpots) for drone in drones)
+    localizer = StreamingGunshotLocalizer(expected_sensors=sensorCount)
+    dispatchDrones = [Drone(dispatchClient, drone.sensorSpots, vehicleName=drone.vehicleName, spawnPosition=drone.startingPosition) for drone in drones]
+    dispatcher = GunshotDispatcher(dispatchDrones)
+
+    localizerTask = asyncio.create_task(localizer.run())
+    dispatcherTask = asyncio.create_task(dispatcher.run(localizer.estimates))
+
+    # every spawn is scheduled up front and runs on the scheduler's own thread, so overlapping shots spawn (and play
+    # their sound) at their own times instead of each waiting for the previous one's sound to arrive
+    scheduler = airsim_spawn_gunshot.makeGunshotScheduler(spawnClient)
+    try:
+        startTime = time.perf_counter()
+        for shotTime, pos in shots:
+            scheduler.schedule(pos, delay=shotTime)
+
+        for shotTime, pos in sorted(shots, key=lambda shot: shot[0]):
+            await asyncio.sleep(max(0, startTime + shotTime - time.perf_counter()))
+
+            # sensors report in the order they hear the sound. Arrivals of overlapping gunshots interleave in the localizer
+            snapshot = sampleFleet(drones)
+            arrivals = [SensorArrival(sensorId, sensorPos, shotTime + audioTime)
+                        for sensorId, sensorPos, audioTime in zip(snapshot.sensor_ids, snapshot.sensor_positions, snapshot.audioTimes(pos))]
+            for arrival in sorted(arrivals, key=lambda arrival: arrival.time):
+                localizer.submit(arrival)
+            print(f"fired gunshot at {pos}")
+
+        localizer.stop()
+
+        await localizerTask
+        await dispatcherTask
+    finally:
+        # waits for the last sounds to play
+        await loop.run_in_executor(None, scheduler.stop)
+        dispatcher.close()
+    localizer.report()
 
 def findGunshotLoop(client : airsim.MultirotorClient):
     
@@ -137,6 +133,13 @@ def findGunshotLoop(client : airsim.MultirotorClient):
 
     drones = [mainDrone, secondDrone]
 
+    # separate connection for moving drones to streamed gunshots while the main one reads sensor positions
+    dispatchClient = airsim.MultirotorClient()
+    dispatchClient.confirmConnection()
+    # and one for spawning them
+    spawnClient = airsim.MultirotorClient()
+    spawnClient.confirmConnection()
+
     mainDrone.changeColor(.1, 0, .3)
     secondDrone.changeColor(.1, .3, .0)
 
@@ -172,6 +175,15 @@ def findGunshotLoop(client : airsim.MultirotorClient):
             simSpawnGunshotToFindMultidrone(client, drones, Vector3r(-10, 12, -2))
             #simSpawnGunshotToFindMultidrone(client, drones, Vector3r(-3, -20, -2))
             #simSpawnGunshotToFindMultidrone(client, drones, Vector3r(-10, 25, -2))
+        if(key == b'\\'):
+            # overlapping gunshots, localized as they stream in
+            shots = [(0, Vector3r(20, 11, -2)), (0.05, Vector3r(-20, -2, -2)), (0.1, Vector3r(15, -10, -2)), (1, Vector3r(-10, 12, -2))]
+            asyncio.run(simSpawnGunshotsToFindStreaming(client, drones, shots, dispatchClient, spawnClient))
+        if(key == b'='):
+            # arrival times estimated from simulated recordings of a real gunshot
+            clip = get_classifier().load_waveform("gunshotaudio/1.wav")
+            simSpawnGunshotToFindMultidrone(client, drones, Vector3r(20, 11, -2), clip)
+            simSpawnGunshotToFindMultidrone(client, drones, Vector3r(-20, -2, -2), clip)
         if(key == b'['):
             print('moving all drones above home')
             futures = [drone.moveToWorldPosition(drone.startingPosition + Vector3r(0, 0, -3)) for drone in drones]
@@ -1,30 +1,34 @@
 import airsim
 import time
-from threading import Thread
+from threading import Thread, Lock
 import winsound
 from pathlib import Path
 import random
 import keyboard
 import os
 
-import tensorflow as tf
-import tensorflow_hub as hub
+import csv
+import glob
+from functools import lru_cache
 import numpy as np
-import librosa
+from gunshot_scheduler import GunshotScheduler, randomNearbyGroundPoint
+from audio_constants import YAMNET_SAMPLE_RATE, YAMNET_WINDOW_SAMPLES, YAMNET_HOP_SAMPLES
 
-# Load YAMNet model at startup
-model = hub.load("https://tfhub.dev/google/yamnet/1")
+# tensorflow, tensorflow_hub and librosa take seconds to import and YAMNet more to load, so they're only loaded the
+# first time a gunshot is classified (or when GunshotClassifier.load is called) instead of when this module is imported
+YAMNET_MODEL_URL = "https://tfhub.dev/google/yamnet/1"
 
 def load_labels():
     try:
         current_dir = os.path.dirname(os.path.abspath(__file__))
         label_file = os.path.join(current_dir, 'gds', 'yamnet_class_map.csv')
         
-        with open(label_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            if len(lines) < 2:
+        with open(label_file, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f))
+            if len(rows) < 2:
                 raise ValueError("Invalid CSV file format")
-            class_names = [line.strip().split(',')[2] for line in lines[1:] if line.strip()]
+            # csv handles display names that contain commas (they're quoted in the class map)
+            class_names = [row[2] for row in rows[1:] if row]
             if not class_names:
                 raise ValueError("No class names found in the CSV file")
             return class_names
@@ -32,31 +36,138 @@ def load_labels():
         print(f"Error loading labels: {str(e)}")
         raise
 
+class GunshotClassifier:
+
+    # waveform_cache_size = how many resampled audio files are kept in memory
+    # warmup = run one inference on silence when loading, so the first real detection doesn't pay for graph tracing
+    def __init__(self, model_url = YAMNET_MODEL_URL, waveform_cache_size = 32, warmup = True):
+        self.model_url = model_url
+        self.warmup = warmup
+
+        self.model = None
+        self.class_names = None
+        # indices of the classes counted as gunshot or explosion sounds
+        self.gunshot_ids = None
+        self.explosion_ids = None
+        self.load_lock = Lock()
+
+        # per-instance LRU of path -> waveform resampled to 16 kHz
+        self.load_waveform = lru_cache(maxsize=waveform_cache_size)(self._read_waveform)
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    # loads the model and labels if they aren't loaded yet. Safe to call from several threads
+    def load(self):
+        if self.model is not None:
+            return self
+        with self.load_lock:
+            if self.model is not None:
+                return self
+            import tensorflow_hub as hub
+
+            start = time.perf_counter()
+            model = hub.load(self.model_url)
+
+            self.class_names = np.array(load_labels())
+            self.gunshot_ids = np.flatnonzero(np.char.find(self.class_names, "Gunshot") >= 0)
+            self.explosion_ids = np.flatnonzero(np.char.find(self.class_names, "Explosion") >= 0)
+
+            if self.warmup:
+                model(np.zeros(YAMNET_SAMPLE_RATE, dtype=np.float32))
+            self.model = model
+            print(f"YAMNet loaded in {time.perf_counter() - start:.1f} s")
+        return self
+
+    # loads the model on a background thread so it's ready by the time the first gunshot is heard. returns the thread
+    def loadInBackground(self):
+        thread = Thread(target=self.load, daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _read_waveform(audio_path):
+        import librosa
+        waveform, sr = librosa.load(audio_path, sr=YAMNET_SAMPLE_RATE)
+        # the cached array is shared by every caller, so it must not be modified
+        waveform.setflags(write=False)
+        return waveform
+
+    # reads and resamples every wav file in a folder into the waveform cache
+    def preloadAudio(self, audio_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunshotaudio')):
+        for audio_path in sorted(glob.glob(os.path.join(audio_dir, '*.wav'))):
+            self.load_waveform(audio_path)
+
+    # scores of every class for each 0.96 s YAMNet frame (hop 0.48 s). audio = path to an audio file or a 16 kHz float32 waveform
+    def frameScores(self, audio):
+        self.load()
+        waveform = self.load_waveform(audio) if isinstance(audio, str) else audio
+        scores, embeddings, spectrogram = self.model(waveform)
+        return scores.numpy()
+
+    # frame scores for several waveforms with a single model call. YAMNet only takes one waveform, but its frames
+    # are independent 0.975 s patches every 0.48 s, so the waveforms are laid end to end on hop boundaries with enough
+    # silence between them that no kept frame mixes two of them. returns a list with a (frames, classes) array per waveform
+    def frameScoresBatch(self, waveforms):
+        self.load()
+        lengths = [max(len(waveform), YAMNET_WINDOW_SAMPLES) for waveform in waveforms]
+        # two extra hops of silence per waveform so its last frame ends before the next waveform starts
+        stride = (-(-max(lengths) // YAMNET_HOP_SAMPLES) + 2) * YAMNET_HOP_SAMPLES
+
+        stacked = np.zeros(stride * len(waveforms), dtype=np.float32)
+        for i, waveform in enumerate(waveforms):
+            stacked[i * stride : i * stride + len(waveform)] = waveform
+
+        scores, embeddings, spectrogram = self.model(stacked)
+        scores = scores.numpy()
+
+        framesPerStride = stride // YAMNET_HOP_SAMPLES
+        result = []
+        for i, length in enumerate(lengths):
+            first = i * framesPerStride
+            # enough frames to cover the whole waveform. The last one may run into the silence after it
+            count = -(-(length - YAMNET_WINDOW_SAMPLES) // YAMNET_HOP_SAMPLES) + 1
+            result.append(scores[first : first + count])
+        return result
+
+    # mean score of every class over the clip
+    def classify(self, audio):
+        return np.mean(self.frameScores(audio), axis=0)
+
+    # same result as detect_gunshot: (top 5 class names, combined gunshot + explosion confidence), or (None, 0) if
+    # gunshot and explosion aren't both in the top 5
+    def detect(self, audio):
+        mean_scores = self.classify(audio)
+
+        # Get top 5 predictions
+        top_indices = np.argsort(mean_scores)[-5:][::-1]
+        top_scores = mean_scores[top_indices]
+        top_classes = self.class_names[top_indices].tolist()
+
+        # like the original loop, the lowest ranked matching class in the top 5 sets each confidence
+        gunshot_matches = np.flatnonzero(np.isin(top_indices, self.gunshot_ids))
+        explosion_matches = np.flatnonzero(np.isin(top_indices, self.explosion_ids))
+        gunshot_confidence = top_scores[gunshot_matches[-1]] if len(gunshot_matches) else 0
+        explosion_confidence = top_scores[explosion_matches[-1]] if len(explosion_matches) else 0
+
+        if gunshot_confidence == 0 or explosion_confidence == 0:
+            return None, 0
+        combined_confidence = min(1.0, gunshot_confidence + explosion_confidence)
+
+        return top_classes, combined_confidence
+
+_classifier = None
+
+# the classifier shared by this process. Created on first use, the model loads on the first detection
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = GunshotClassifier()
+    return _classifier
+
 def detect_gunshot(audio_path):
-    waveform, sr = librosa.load(audio_path, sr=16000)
-    scores, embeddings, spectrogram = model(waveform)
-    class_names = load_labels()
-    mean_scores = np.mean(scores.numpy(), axis=0)
-    
-    # Get top 5 predictions
-    top_indices = np.argsort(mean_scores)[-5:][::-1]
-    top_scores = mean_scores[top_indices]
-    top_classes = [class_names[i] for i in top_indices]
-    
-    # Check if "Gunshot" or "Explosion" is in top 5
-    gunshot_confidence = 0
-    explosion_confidence = 0
-    
-    for i, class_name in enumerate(top_classes):
-        if "Gunshot" in class_name:
-            gunshot_confidence = top_scores[i]
-        if "Explosion" in class_name:
-            explosion_confidence = top_scores[i]
-    if gunshot_confidence == 0 or explosion_confidence == 0:
-        return None, 0
-    combined_confidence = min(1.0, gunshot_confidence + explosion_confidence)
-    
-    return top_classes, combined_confidence
+    return get_classifier().detect(audio_path)
 
 def simSpawnGunshotAtPos(client : airsim.MultirotorClient, pos : airsim.Vector3r):
     playableAudioNums = [1, 2, 4]
@@ -84,26 +195,45 @@ def simSpawnGunshotAtPos(client : airsim.MultirotorClient, pos : airsim.Vector3r
 
 
 def simSpawnGunshotFromRandomNearbyGroundPoint(client : airsim.MultirotorClient):
-    dronePose = client.simGetVehiclePose()
-    gunshotPos = airsim.Vector3r(dronePose.position.x_val, dronePose.position.y_val, -3)
-    
-    droneHeight = dronePose.position.z_val
-    randSpawnRangeFactor = (droneHeight / 2) + 5
+    simSpawnGunshotAtPos(client, randomNearbyGroundPoint(client))
 
-    gunshotPos += airsim.Vector3r(random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-2, 2))
-    simSpawnGunshotAtPos(client, gunshotPos)
+def printDetection(shot):
+    top_classes, combined_confidence = shot.result
+    if combined_confidence > 0:
+        print(f"Gunshot Sound Detected confidence: {combined_confidence*100+random.uniform(-10, 10):.2f}%")
+
+# scheduler that spawns gunshots, plays their sound when it reaches the drone and classifies it on a worker thread,
+# without blocking the caller
+def makeGunshotScheduler(client : airsim.MultirotorClient, classify_workers = 2):
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    audio_paths = [os.path.join(current_dir, 'gds', f'{audioNum}.wav') for audioNum in [1, 2, 4]]
+    return GunshotScheduler(client, audio_paths,
+                            play=lambda audio_path: winsound.PlaySound(audio_path, winsound.SND_FILENAME | winsound.SND_ASYNC),
+                            classify=detect_gunshot, on_result=printDetection, classify_workers=classify_workers)
 
-def spawnGunshotsOnTimer(client : airsim.MultirotorClient, n : int):
-    for i in range(n):
-        simSpawnGunshotFromRandomNearbyGroundPoint(client)
-        time.sleep(2)
+# schedules n gunshots 2 seconds apart and returns their ScheduledShots.
+# scheduler = a running GunshotScheduler to put the shots on, returning right away (the caller stops it). Without
+#             one, a scheduler is made for these shots and this blocks until they're done and it's stopped
+def spawnGunshotsOnTimer(client : airsim.MultirotorClient, n : int, scheduler : GunshotScheduler = None):
+    if scheduler is not None:
+        return scheduler.scheduleEvery(randomNearbyGroundPoint, n, interval=2)
+    scheduler = makeGunshotScheduler(client)
+    try:
+        return scheduler.scheduleEvery(randomNearbyGroundPoint, n, interval=2)
+    finally:
+        scheduler.stop()
 
 def spawnGunshotsFromInput(client : airsim.MultirotorClient):
-    keyboard.add_hotkey(']', simSpawnGunshotFromRandomNearbyGroundPoint, args=[client], timeout=0.5)
-    keyboard.wait('esc')
+    with makeGunshotScheduler(client) as scheduler:
+        keyboard.add_hotkey(']', scheduler.schedule, args=[randomNearbyGroundPoint], timeout=0.5)
+        keyboard.wait('esc')
 
 if __name__ == '__main__':
     client = airsim.MultirotorClient()
     client.confirmConnection()
     print("Starting Muti-target detection & gunshot detection...")
+    # load the model and audio in the background so the first gunshot doesn't wait for them
+    classifier = get_classifier()
+    classifier.loadInBackground()
+    classifier.preloadAudio(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gds'))
     spawnGunshotsFromInput(client)
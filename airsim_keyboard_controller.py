@@ -9,6 +9,7 @@ from time import sleep
 import airsim_splitscreen
 import airsim_minimap
 from airsim_drone import Drone
+from fleet_state import FleetStateCache
 import os 
 from typing import Dict
 from collections.abc import Callable
@@ -142,29 +143,35 @@ def controlDroneLoop(client : airsim.MultirotorClient):
 
     input_rate = 0.016
 
-    startingDroneHeightMeters = client.getGpsData().gnss.geo_point.altitude
+    # GPS is polled in the background on its own connection instead of twice per loop
+    stateCache = FleetStateCache(airsim.MultirotorClient(), [""], rate=1/input_rate, poll_state=False).start()
+    try:
+        startingDroneHeightMeters = stateCache.getGpsData().gnss.geo_point.altitude
 
-    defaultDrone = Drone(client)
-    controller = DroneKeyboardController(defaultDrone)
+        defaultDrone = Drone(client)
+        controller = DroneKeyboardController(defaultDrone)
 
-    while True:
-        
-        futures = controller.process()
-        
-        trueVel = client.getGpsData().gnss.velocity
+        while True:
 
-        client.simPrintLogMessage("Approximate flight Velocity (NED): ", ", ".join([str(round(v, 2)) for v in trueVel]))
- 
-        droneHeightMeters = client.getGpsData().gnss.geo_point.altitude - startingDroneHeightMeters
-        droneHeightFeet = droneHeightMeters * 3.28084
-        client.simPrintLogMessage("Approximate height off ground: ", f"{round(droneHeightMeters, 2)} meters ({round(droneHeightFeet, 2)} feet)")
+            futures = controller.process()
 
-        # disable script
-        if(keyboard.is_pressed('esc')):
-            break
+            gps = stateCache.getGpsData()
+            trueVel = gps.gnss.velocity
 
-        for future in futures : future.join()
+            client.simPrintLogMessage("Approximate flight Velocity (NED): ", ", ".join([str(round(v, 2)) for v in trueVel]))
 
+            droneHeightMeters = gps.gnss.geo_point.altitude - startingDroneHeightMeters
+            droneHeightFeet = droneHeightMeters * 3.28084
+            client.simPrintLogMessage("Approximate height off ground: ", f"{round(droneHeightMeters, 2)} meters ({round(droneHeightFeet, 2)} feet)")
+
+            # disable script
+            if(keyboard.is_pressed('esc')):
+                break
+
+            for future in futures : future.join()
+    finally:
+        stateCache.stop()
+        stateCache.report()
     print("Drone keyboard control deactivated")
     client.enableApiControl(False)
 
@@ -243,39 +250,47 @@ def controlDroneSwappableCameraLoop(client : airsim.MultirotorClient):
 
     for drone in drones : client.enableApiControl(True, drone.vehicleName) 
 
-    controllers = []
-    for drone in drones:
-        controllers.append(DroneKeyboardController(drone, input_rate=1/10))
-
-    controlledIndex = 0
-    lastControlledIndex = -1
-
-    updateCameraFollow()
-
-    hotkeynext = keyboard.add_hotkey("9", incControlledDrone)
-    hotkeyprev = keyboard.add_hotkey("8", decControlledDrone)  
-
-    while True:
-        futures = []
-        currentController = controllers[controlledIndex]
-        #for currentController in controllers:
-        futures += currentController.process()
-
-        if(lastControlledIndex != controlledIndex):
-            lastControlledIndex = controlledIndex
-            updateCameraFollow()
-            currentDrone = drones[controlledIndex]
-            for listener in _droneswappedlisteners:
-                listener(currentDrone)
-
-        airsim_minimap.simUpdateMinimapWidthToKeepDronesVis(client, drones, drones[controlledIndex], buffer=1000)
-        if(keyboard.is_pressed("esc")):
-            break
-
-        for future in futures: future.join()
-
-    keyboard.remove_hotkey(hotkeynext)
-    keyboard.remove_hotkey(hotkeyprev)
+    # the minimap needs every drone's position each loop, read from memory instead of an RPC per drone
+    stateCache = FleetStateCache(airsim.MultirotorClient(), vehicleNames, rate=10, poll_gps=False).start()
+    for drone in drones : drone.useStateCache(stateCache)
+    try:
+        controllers = []
+        for drone in drones:
+            controllers.append(DroneKeyboardController(drone, input_rate=1/10))
+
+        controlledIndex = 0
+        lastControlledIndex = -1
+
+        updateCameraFollow()
+
+        hotkeynext = keyboard.add_hotkey("9", incControlledDrone)
+        hotkeyprev = keyboard.add_hotkey("8", decControlledDrone)  
+
+        while True:
+            futures = []
+            currentController = controllers[controlledIndex]
+            #for currentController in controllers:
+            futures += currentController.process()
+
+            if(lastControlledIndex != controlledIndex):
+                lastControlledIndex = controlledIndex
+                updateCameraFollow()
+                currentDrone = drones[controlledIndex]
+                for listener in _droneswappedlisteners:
+                    listener(currentDrone)
+
+            airsim_minimap.simUpdateMinimapWidthToKeepDronesVis(client, drones, drones[controlledIndex], buffer=1000)
+            if(keyboard.is_pressed("esc")):
+                break
+
+            for future in futures: future.join()
+
+        keyboard.remove_hotkey(hotkeynext)
+        keyboard.remove_hotkey(hotkeyprev)
+    finally:
+        stateCache.stop()
+        stateCache.report()
+        for drone in drones : drone.useStateCache(None)
         
     for drone in drones : client.enableApiControl(False, drone.vehicleName) 
 
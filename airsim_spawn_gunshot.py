@@ -6,6 +6,10 @@ from pathlib import Path
 import random
 import keyboard
 import asyncio
+from gunshot_scheduler import GunshotScheduler, randomNearbyGroundPoint
+
+audioDir = "C:\\Users\\sirun\\Documents\\grad school stuff\\Research Assistant Work\\dronesim_research\\gunshotaudio"
+playableAudioNums = [1, 2, 5]
 
 def simSpawnGunshotAtPos(client : airsim.MultirotorClient, pos : airsim.Vector3r):
     pose = airsim.Pose(position_val=pos)
@@ -18,28 +22,33 @@ def simSpawnGunshotAtPos(client : airsim.MultirotorClient, pos : airsim.Vector3r
     soundTime = dist/343
     client.simPrintLogMessage(f"Spawned gunshot!", f"   Distance: {round(dist,2)} meters away. Should play sound after {round(soundTime,2)} seconds")
     time.sleep(soundTime)
-    playableAudioNums = [1, 2, 5]
     audioToPlay = random.choice(playableAudioNums)
-    playsound(f"C:\\Users\\sirun\\Documents\\grad school stuff\\Research Assistant Work\\dronesim_research\\gunshotaudio\\{audioToPlay}.wav", block=False)
+    playsound(f"{audioDir}\\{audioToPlay}.wav", block=False)
 
 def simSpawnGunshotFromRandomNearbyGroundPoint(client : airsim.MultirotorClient):
-    dronePose = client.simGetVehiclePose()
-    gunshotPos = airsim.Vector3r(dronePose.position.x_val, dronePose.position.y_val, -3)
-    
-    droneHeight = dronePose.position.z_val
-    randSpawnRangeFactor = (droneHeight / 2) + 5
-
-    gunshotPos += airsim.Vector3r(random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-2, 2))
-    simSpawnGunshotAtPos(client, gunshotPos)
-
-def spawnGunshotsOnTimer(client : airsim.MultirotorClient, n : int):
-    for i in range(n):
-        simSpawnGunshotFromRandomNearbyGroundPoint(client)
-        time.sleep(2)
+    simSpawnGunshotAtPos(client, randomNearbyGroundPoint(client))
+
+# scheduler that spawns gunshots and plays their sound when it reaches the drone, without blocking the caller
+def makeGunshotScheduler(client : airsim.MultirotorClient):
+    return GunshotScheduler(client, [f"{audioDir}\\{audioNum}.wav" for audioNum in playableAudioNums],
+                            play=lambda audioPath: playsound(audioPath, block=False))
+
+# schedules n gunshots 2 seconds apart and returns their ScheduledShots.
+# scheduler = a running GunshotScheduler to put the shots on, returning right away (the caller stops it). Without
+#             one, a scheduler is made for these shots and this blocks until they're done and it's stopped
+def spawnGunshotsOnTimer(client : airsim.MultirotorClient, n : int, scheduler : GunshotScheduler = None):
+    if scheduler is not None:
+        return scheduler.scheduleEvery(randomNearbyGroundPoint, n, interval=2)
+    scheduler = makeGunshotScheduler(client)
+    try:
+        return scheduler.scheduleEvery(randomNearbyGroundPoint, n, interval=2)
+    finally:
+        scheduler.stop()
 
 def spawnGunshotsFromInput(client : airsim.MultirotorClient):
-    keyboard.add_hotkey(']', simSpawnGunshotFromRandomNearbyGroundPoint, args=[client], timeout=0.5)
-    keyboard.wait('esc')
+    with makeGunshotScheduler(client) as scheduler:
+        keyboard.add_hotkey(']', scheduler.schedule, args=[randomNearbyGroundPoint], timeout=0.5)
+        keyboard.wait('esc')
 
 if __name__ == '__main__':
     client = airsim.MultirotorClient()
@@ -6,12 +6,20 @@ from airsim_drone import Drone
 from airsim import Vector3r
 from airsim_texture_replacement import textureReplacePath, textureResize, standardTextureReplacement
 import airsim_minimap
+import airsim_camera
+from detection_scheduler import MultiDroneDetectionScheduler
+from detector_service import get_detector
+from fleet_state import FleetStateCache
 import time
 import os 
 import cv2
 import numpy as np
 import keyboard
 import random
+import mmap
+import struct
+import tempfile
+import zlib
 
 screenSplit = False
 
@@ -38,6 +46,125 @@ def simAttachCameraToDrone(client : airsim.MultirotorClient, droneName = "", cam
 def simSetSplitScreenToImageFile(client : airsim.MultirotorClient, fileName = "", rightSide = True):
     client.simRunConsoleCommand(f"ce SetSplitScreenImageFromFile {rightSide} {fileName}")
 
+# BMP file that stays memory-mapped so new frames can be written straight into its pixel rows.
+# BMP is uncompressed, so pushing a frame is just a memcpy instead of a PNG encode plus a file write
+class MappedBitmapFile:
+
+    HEADER_SIZE = 54
+
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+
+        # BMP rows are padded to a multiple of 4 bytes
+        rowSize = (width * 3 + 3) & ~3
+        imageSize = rowSize * height
+        fileSize = self.HEADER_SIZE + imageSize
+
+        header = struct.pack('<2sIHHI', b'BM', fileSize, 0, 0, self.HEADER_SIZE)
+        # 24 bit, uncompressed, positive height (rows stored bottom-up, which every loader supports)
+        header += struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, imageSize, 2835, 2835, 0, 0)
+
+        with open(path, 'wb') as bmpfile:
+            bmpfile.write(header)
+            bmpfile.truncate(fileSize)
+
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), fileSize)
+
+        rows = np.ndarray((height, rowSize), np.uint8, buffer=self.map, offset=self.HEADER_SIZE)
+        # flipped view so row 0 of an image lands on the last row of the file
+        self.pixels = rows[::-1, :width * 3].reshape(height, width, 3)
+
+    def write(self, image):
+        np.copyto(self.pixels, image)
+
+    def close(self):
+        del self.pixels
+        self.map.close()
+        self.file.close()
+
+# shows images on half of the split screen without a PNG encode or a disk round-trip per frame.
+# frames are written into memory-mapped BMP files, rotating between bufferCount buffers. Frames identical to the
+# last pushed one are skipped.
+# Unreal doesn't report when it has finished loading a file, so a buffer is only rewritten once reuseDelay seconds
+# have passed since Unreal was told to load it (push waits if frames come faster). That assumes Unreal loads a
+# frame within reuseDelay of the console command, which holds easily at the default of 3 buffers and 0.1 s pacing.
+# On Windows the buffers are in the temp folder (written back to disk lazily, pushes only touch the page cache),
+# elsewhere in /dev/shm when it exists
+class SplitScreenImageSink:
+
+    def __init__(self, client : airsim.MultirotorClient, rightSide = True, directory = None, bufferCount = 3, reuseDelay = 0.2):
+        self.client = client
+        self.rightSide = rightSide
+        self.bufferCount = max(bufferCount, 2)
+        self.reuseDelay = reuseDelay
+
+        if directory is None:
+            if os.name != "nt" and os.path.isdir("/dev/shm"):
+                directory = "/dev/shm"
+            else:
+                directory = tempfile.gettempdir()
+        self.directory = directory
+
+        self.buffers = []
+        # time.monotonic() when each buffer was last handed to Unreal
+        self.pushTimes = []
+        self.nextBuffer = 0
+        self.lastChecksum = None
+
+        self.pushedCount = 0
+        self.skippedCount = 0
+        self.waitTime = 0.0
+
+    def _makeBuffers(self, width, height):
+        self.close()
+        side = "right" if self.rightSide else "left"
+        self.buffers = [MappedBitmapFile(os.path.abspath(os.path.join(self.directory, f"splitscreen_{side}_{i}.bmp")), width, height)
+                        for i in range(self.bufferCount)]
+        self.pushTimes = [None] * self.bufferCount
+
+    # pushes an image to the screen. returns False if it was skipped because nothing changed
+    def push(self, image):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+        checksum = zlib.crc32(np.ascontiguousarray(image))
+        if checksum == self.lastChecksum:
+            self.skippedCount += 1
+            return False
+
+        height, width = image.shape[:2]
+        if not self.buffers or self.buffers[0].width != width or self.buffers[0].height != height:
+            self._makeBuffers(width, height)
+
+        index = self.nextBuffer
+        buffer = self.buffers[index]
+        self.nextBuffer = (index + 1) % len(self.buffers)
+
+        # don't overwrite a buffer Unreal may still be loading
+        if self.pushTimes[index] is not None:
+            wait = self.pushTimes[index] + self.reuseDelay - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+                self.waitTime += wait
+
+        buffer.write(image)
+        simSetSplitScreenToImageFile(self.client, buffer.path, self.rightSide)
+        self.pushTimes[index] = time.monotonic()
+
+        self.lastChecksum = checksum
+        self.pushedCount += 1
+        return True
+
+    def close(self):
+        for buffer in self.buffers:
+            buffer.close()
+        self.buffers = []
+
 # sets the future offset of camera from drone (as in it'll only take effect when you attach a camera
 # to a drone. Also this uses Unreal's coordinate system rather than AirSim's so be careful)
 # default value is -300 0 250
@@ -102,16 +229,15 @@ def splitScreenDemo(client : airsim.MultirotorClient):
     airsim.wait_key("press any key to show custom images on half")
 
     future1 = mainDrone.moveToWorldPosition(Vector3r(0, -100, -80), 7, 20)
+    sink = SplitScreenImageSink(client, rightSide=False)
 
     time.sleep(0.1)
 
     # while drone is moving, take images
     while client.simGetGroundTruthKinematics(mainDrone.vehicleName).linear_velocity.get_length() > 0.1:
 
-        raw_image = client.simGetImage(camera_name="bottom_center", image_type=airsim.ImageType.Scene, vehicle_name=mainDrone.vehicleName)
-
         # padding image so it is not stretched
-        image = cv2.imdecode(airsim.string_to_uint8_array(raw_image), cv2.IMREAD_COLOR)
+        image = airsim_camera.grab(client, camera_name="bottom_center", vehicle_name=mainDrone.vehicleName)
 
         image = cv2.copyMakeBorder(image, 66, 66, 0, 0, cv2.BORDER_CONSTANT, value=(0, 0, 0))
 
@@ -123,19 +249,12 @@ def splitScreenDemo(client : airsim.MultirotorClient):
         #image = cv2.putText(img=image, text="pretend image detection", org=(256, 296), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.4, color=somewhat_light_red)
         image = cv2.rectangle(img=image, pt1=(256, 296), pt2=(186, 226), color=somewhat_light_red, thickness=2)
 
-        # save image to file
-        img_path = "demo_image.png"
-        cv2.imwrite(img_path, image)
-
-        # displaying image (needs to get image from file, which is why we have to save it above)
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-
-        absolute_img_path = dir_path + "\\" + img_path
-
-        simSetSplitScreenToImageFile(client, absolute_img_path, rightSide=False)
+        # displaying image (written to a memory-mapped file Unreal reads from, skipped if nothing changed)
+        sink.push(image)
         time.sleep(0.1)
 
     future1.join()
+    sink.close()
 
     
     airsim.wait_key("press any key to disable api control")
@@ -168,17 +287,24 @@ def splitScreenKeyboardDemo(client : airsim.MultirotorClient):
     controller1 = airsim_keyboard_controller.DroneKeyboardController(mainDrone, {})
     controller2 = airsim_keyboard_controller.DroneKeyboardController(secondDrone, {"forward": "i", "back": "k", "left" : "j", "right" : "l", "up": ".", "down": ","})
 
-    while True:
-        controller1.process()
-        controller2.process()
-
-        airsim_minimap.simUpdateMinimapWidthToKeepDronesVis(client, drones, mainDrone, buffer=1000)
+    # the minimap reads both drones' positions every loop from memory instead of an RPC each
+    stateCache = FleetStateCache(airsim.MultirotorClient(), [drone.vehicleName for drone in drones], rate=1/controller1.input_rate, poll_gps=False).start()
+    [drone.useStateCache(stateCache) for drone in drones]
+    try:
+        while True:
+            controller1.process()
+            controller2.process()
 
-        if(keyboard.is_pressed("esc")):
-            break
+            airsim_minimap.simUpdateMinimapWidthToKeepDronesVis(client, drones, mainDrone, buffer=1000)
 
-        time.sleep(controller1.input_rate)
+            if(keyboard.is_pressed("esc")):
+                break
 
+            time.sleep(controller1.input_rate)
+    finally:
+        stateCache.stop()
+        stateCache.report()
+        [drone.useStateCache(None) for drone in drones]
     [client.enableApiControl(False, drone.vehicleName) for drone in drones]
 
 def splitScreenKeyboardSwappableDemo(client : airsim.MultirotorClient):
@@ -224,7 +350,8 @@ def splitScreenKeyboardSwappableDemo(client : airsim.MultirotorClient):
 #     simSetSplitScreenToImageFile(currentDrone.client, absolute_img_path, rightSide=True)
 
 # Demonstrates oop that lets you control many drones with the keyboard, swapping which drone you're controlling and following with a hotkey
-def splitScreenKeyboardCameraSwappableDemo(client : airsim.MultirotorClient):
+# if detectionModelPaths is given, detection runs on every drone's bottom camera in the background, prioritising the controlled drone
+def splitScreenKeyboardCameraSwappableDemo(client : airsim.MultirotorClient, detectionModelPaths = None):
 
     # set up
     client.simRunConsoleCommand("DisableAllScreenMessages")
@@ -251,9 +378,24 @@ def splitScreenKeyboardCameraSwappableDemo(client : airsim.MultirotorClient):
 
     airsim_keyboard_controller.AddDroneSwappedListener(SwapMinimapToDrone)
 
+    scheduler = None
+    if detectionModelPaths is not None:
+        # the scheduler gets its own client since the control loop keeps using this one on the main thread
+        detectionClient = airsim.MultirotorClient()
+        detectionClient.confirmConnection()
+        scheduler = MultiDroneDetectionScheduler(detectionClient, drones, get_detector(detectionModelPaths))
+        scheduler.setPriorityDrone(mainDrone)
+        airsim_keyboard_controller.AddDroneSwappedListener(scheduler.setPriorityDrone)
+        schedulerThread = scheduler.start()
+
     # activating control scheme
     airsim_keyboard_controller.controlDroneSwappableCameraLoop(client)
 
+    if scheduler is not None:
+        # run() prints the throughput report when it finishes
+        scheduler.stop()
+        schedulerThread.join()
+
     # returning home
     print("Manual control disabled, returning drones home.")
     for drone in drones : client.enableApiControl(True, drone.vehicleName) 
@@ -3,26 +3,39 @@ import cv2
 import keyboard
 import time
 import numpy as np
-from yolo import YOLODetector
+from yolo import DetectionRenderer
+from detector_service import get_detector
+from airsim_camera import CameraCapture
+from detection_cache import DetectionCache, CachedDetector
+from fleet_state import FleetStateCache
 import msgpack
 
 unpacker = msgpack.Unpacker(max_bin_len=31457280) 
-def is_drone_moving(client, threshold=0.1):
-    """Check if the drone is moving based on its velocity"""
-    state = client.getMultirotorState()
+def is_drone_moving(client, threshold=0.1, state=None):
+    """Check if the drone is moving based on its velocity (pass state to reuse an already fetched getMultirotorState)"""
+    if state is None:
+        state = client.getMultirotorState()
     velocity = state.kinematics_estimated.linear_velocity
     speed = np.sqrt(velocity.x_val**2 + velocity.y_val**2 + velocity.z_val**2)
     return speed > threshold
 
-def detect(client, model_paths):
+# display = False runs headless: detections are still computed but nothing is drawn or shown
+# cache = DetectionCache used to reuse detections of near-identical frames while hovering (None to disable)
+# state_cache = FleetStateCache polling the drone. If None, one is started on its own connection for this loop
+def detect(client, model_paths, display=True, cache=None, state_cache=None):
+    ownsStateCache = state_cache is None
     try:
-        # Initialize multiple YOLO detectors
-        detectors = [YOLODetector(path) for path in model_paths]
+        # the drone's state is polled in the background instead of a getMultirotorState RPC before every frame
+        if ownsStateCache:
+            state_cache = FleetStateCache(airsim.MultirotorClient(), [""], rate=10, poll_gps=False).start()
+
+        # One engine that runs all YOLO models on each frame, shared through the detector service if it's running
+        # Frames that match a recent one (same scene, same pose) reuse its detections instead of running predict
+        detector = CachedDetector(get_detector(model_paths), cache if cache is not None else DetectionCache())
+        renderer = DetectionRenderer()
         
-        # Set camera resolution using ImageRequest
-        responses = client.simGetImages([
-            airsim.ImageRequest("bottom_center", airsim.ImageType.Scene, False, False)
-        ])
+        # Grab uncompressed frames so there is no PNG encode/decode per frame
+        capture = CameraCapture(client, [("bottom_center", "")])
         
         camera_pose = airsim.Pose()
         camera_pose.position = airsim.Vector3r(0, 0, -1)
@@ -39,46 +52,36 @@ def detect(client, model_paths):
         client.simSetCameraFov(camera_name="bottom_center", fov_degrees=90)
 
         while True:
-            # Check if drone is moving
-            if not is_drone_moving(client):
+            # Check if drone is moving (the state is kept to key the detection cache on the drone's pose)
+            state = state_cache.getMultirotorState()
+            if not is_drone_moving(client, state=state):
                 # print("Drone is stationary, waiting for movement...")
                 time.sleep(0.1)  # Small delay to prevent CPU overuse
                 continue
 
-            rawImage = client.simGetImage("bottom_center", airsim.ImageType.Scene)
-            if rawImage is None:
-                print("Failed to get image")
-                break
-
-            png = cv2.imdecode(airsim.string_to_uint8_array(rawImage), cv2.IMREAD_UNCHANGED)
+            png = capture.grabOne()
             if png is None:
-                print("Failed to decode image")
+                print("Failed to get image")
                 break
 
-            # Create a copy for detection results
-            detection_image = png.copy()
-            
             # Resize images to 1024x1024 for better visibility
             png = cv2.resize(png, (1024, 1024))
-            detection_image = cv2.resize(detection_image, (1024, 1024))
             
-            # Process image with all YOLO detectors
-            for detector in detectors:
-                # Get detection results and update the same image
-                _, results = detector.process_image(png)
-                # Draw detections on the detection_image
-                detection_image = detector.draw_detections(detection_image, results)
+            # Process image with all YOLO detectors, converting the frame only once
+            frame = detector.prepare_image(png)
+            detections = detector.detect(frame, pose=state.kinematics_estimated)
 
-            # Resize images to 2x for display
-            display_png = cv2.resize(png, (png.shape[1], png.shape[0]))
-            display_detection = cv2.resize(detection_image, (detection_image.shape[1], detection_image.shape[0]))
+            if display:
+                # frame is not used after this, so draw on it directly instead of copying
+                detection_image = renderer.render(frame, detections, copy=False)
 
-            # Show both windows with enlarged images
-            # cv2.imshow("Original Video", display_png)
-            cv2.imshow("Detection Video", display_detection)
-        
-                
-            key = cv2.waitKey(1) & 0xFF
+                # Show detection window
+                # cv2.imshow("Original Video", png)
+                cv2.imshow("Detection Video", detection_image)
+
+                key = cv2.waitKey(1) & 0xFF
+            else:
+                key = -1
             
             if key == 27 or keyboard.is_pressed('esc'): 
                 break
@@ -86,6 +89,12 @@ def detect(client, model_paths):
     except Exception as e:
         print(f"Error occurred: {str(e)}")
     finally:
+        if 'detector' in locals():
+            print(f"Detection cache: {detector.cache.stats()}")
+            detector.close()
+        if ownsStateCache and state_cache is not None:
+            state_cache.stop()
+            state_cache.report()
         cv2.destroyAllWindows()
 
 if __name__ == '__main__':
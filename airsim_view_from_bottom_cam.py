@@ -3,15 +3,13 @@ import cv2
 import keyboard
 import time
 import numpy
+from airsim_camera import CameraCapture
 
 def viewLoop(client : airsim.MultirotorClient):
-    while True:
-        rawBottomImage = client.simGetImage("bottom_center", airsim.ImageType.Scene, vehicle_name="MainDrone")
-        rawBottomImage2 = client.simGetImage("bottom_center", airsim.ImageType.Scene, vehicle_name="Drone2")
-
-        rawImages = [rawBottomImage, rawBottomImage2]
+    capture = CameraCapture(client, [("bottom_center", "MainDrone"), ("bottom_center", "Drone2")])
 
-        pngs = [cv2.imdecode(airsim.string_to_uint8_array(rawImage), cv2.IMREAD_COLOR) for rawImage in rawImages]
+    while True:
+        pngs = capture.grab()
 
         pngs = [cv2.resize(png, (256, 256)) for png in pngs]
 
@@ -2,6 +2,7 @@ import airsim
 import time
 import keyboard
 from airsim import Pose, Vector3r
+from fleet_state import FleetStateCache
 
 
 def saveImage(client : airsim.MultirotorClient, cameraId = "bottom_center", img_path = "test_image.png"):
@@ -47,72 +48,78 @@ def controlDroneLoop(client : airsim.MultirotorClient):
     
     imageTaken = False
     input_rate = 0.016
-    startingDroneHeightMeters = client.getGpsData().gnss.geo_point.altitude
-
-    while True:
-        # Set flight direction
-        vel = [0, 0, 0]
-        
-        # Vertical movement
-        if(keyboard.is_pressed('space')):
-            vel[2] += -10
-        if(keyboard.is_pressed('ctrl')):
-            vel[2] += 10
-
-        # Forward/backward movement
-        if(keyboard.is_pressed('w')):
-            vel[0] += 10
-        if(keyboard.is_pressed('s')):
-            vel[0] += -10
-
-        # Left/right movement
-        if(keyboard.is_pressed('d')):
-            vel[1] += 10
-        if(keyboard.is_pressed('a')):
-            vel[1] += -10
-        
-        # Control drone flight
-        client.moveByVelocityBodyFrameAsync(*vel, input_rate)
-
-        # Rotation control
-        rot = [0, 0, 0]
-        shouldRot = False
-        if(keyboard.is_pressed('q')):
-            rot[2] += 1
-            shouldRot = True
-        if(keyboard.is_pressed('e')):
-            rot[2] += -1
-            shouldRot = True
-
-        if(shouldRot):
-            client.moveByAngleRatesThrottleAsync(*rot, throttle=10, duration=input_rate)
-        
-        # Update camera pose
-        updateCameraPose(client)
-        
-        # Display current speed
-        trueVel = client.getGpsData().gnss.velocity
-        client.simPrintLogMessage("Approximate flight Velocity (NED): ", ", ".join([str(round(v, 2)) for v in trueVel]))
- 
-        # Display height information
-        droneHeightMeters = client.getGpsData().gnss.geo_point.altitude - startingDroneHeightMeters
-        droneHeightFeet = droneHeightMeters * 3.28084
-        client.simPrintLogMessage("Approximate height off ground: ", f"{round(droneHeightMeters, 2)} meters ({round(droneHeightFeet, 2)} feet)")
-
-        # Photo capture functionality
-        if(keyboard.is_pressed('.') and not imageTaken):
-            imageTaken = True
-            saveImage(client)
-        
-        if(not keyboard.is_pressed('.')):
-            imageTaken = False
-
-        # Exit control
-        if(keyboard.is_pressed('esc')):
-            break
-
-        time.sleep(input_rate)
+    # GPS is polled in the background on its own connection instead of twice per loop
+    stateCache = FleetStateCache(airsim.MultirotorClient(), [""], rate=1/input_rate, poll_state=False).start()
+    try:
+        startingDroneHeightMeters = stateCache.getGpsData().gnss.geo_point.altitude
 
+        while True:
+            # Set flight direction
+            vel = [0, 0, 0]
+
+            # Vertical movement
+            if(keyboard.is_pressed('space')):
+                vel[2] += -10
+            if(keyboard.is_pressed('ctrl')):
+                vel[2] += 10
+
+            # Forward/backward movement
+            if(keyboard.is_pressed('w')):
+                vel[0] += 10
+            if(keyboard.is_pressed('s')):
+                vel[0] += -10
+
+            # Left/right movement
+            if(keyboard.is_pressed('d')):
+                vel[1] += 10
+            if(keyboard.is_pressed('a')):
+                vel[1] += -10
+
+            # Control drone flight
+            client.moveByVelocityBodyFrameAsync(*vel, input_rate)
+
+            # Rotation control
+            rot = [0, 0, 0]
+            shouldRot = False
+            if(keyboard.is_pressed('q')):
+                rot[2] += 1
+                shouldRot = True
+            if(keyboard.is_pressed('e')):
+                rot[2] += -1
+                shouldRot = True
+
+            if(shouldRot):
+                client.moveByAngleRatesThrottleAsync(*rot, throttle=10, duration=input_rate)
+
+            # Update camera pose
+            updateCameraPose(client)
+
+            # Display current speed
+            gps = stateCache.getGpsData()
+            trueVel = gps.gnss.velocity
+            client.simPrintLogMessage("Approximate flight Velocity (NED): ", ", ".join([str(round(v, 2)) for v in trueVel]))
+
+            # Display height information
+            droneHeightMeters = gps.gnss.geo_point.altitude - startingDroneHeightMeters
+            droneHeightFeet = droneHeightMeters * 3.28084
+            client.simPrintLogMessage("Approximate height off ground: ", f"{round(droneHeightMeters, 2)} meters ({round(droneHeightFeet, 2)} feet)")
+
+            # Photo capture functionality
+            if(keyboard.is_pressed('.') and not imageTaken):
+                imageTaken = True
+                saveImage(client)
+
+            if(not keyboard.is_pressed('.')):
+                imageTaken = False
+
+            # Exit control
+            if(keyboard.is_pressed('esc')):
+                break
+
+            time.sleep(input_rate)
+    finally:
+        stateCache.stop()
+        stateCache.report()
     print("Drone keyboard control deactivated")
     client.enableApiControl(False)
 
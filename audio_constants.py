@@ -0,0 +1,6 @@
+#this file provides the YAMNet audio constants, kept free of imports so the signal processing modules stay light
+
+YAMNET_SAMPLE_RATE = 16000
+# samples in one YAMNet frame (a 0.96 s patch plus the 25 ms STFT window) and between frames
+YAMNET_WINDOW_SAMPLES = 15600
+YAMNET_HOP_SAMPLES = 7680
@@ -0,0 +1,152 @@
+#this file provides a streaming gunshot detector that scores the newest YAMNet window of live audio every hop
+
+import os
+import glob
+import time
+import numpy as np
+from audio_constants import YAMNET_SAMPLE_RATE as SAMPLE_RATE, YAMNET_WINDOW_SAMPLES as WINDOW_SAMPLES
+
+class AudioRingBuffer:
+    """
+    Fixed-size float32 buffer holding the most recent samples of a stream
+    """
+
+    def __init__(self, capacity):
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        # samples written since the stream started
+        self.total_written = 0
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        written = len(samples)
+        # only the newest capacity samples fit, but every sample still counts towards the stream position
+        samples = samples[-self.capacity:]
+        start = (self.total_written + written - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start : start + first] = samples[:first]
+        self.buffer[: len(samples) - first] = samples[first:]
+        self.total_written += written
+
+    # copy of length samples starting at absolute sample index start (which must still be in the buffer)
+    def read(self, start, length):
+        if start < self.total_written - self.capacity or start + length > self.total_written:
+            raise IndexError("Requested samples are not in the ring buffer")
+        offset = start % self.capacity
+        if offset + length <= self.capacity:
+            return self.buffer[offset : offset + length].copy()
+        return np.concatenate((self.buffer[offset:], self.buffer[: offset + length - self.capacity]))
+
+
+class AudioEvent:
+    """
+    A detected gunshot or explosion. onset_time is seconds since the stream started, detected_time is the stream
+    time when it was reported (so detected_time - onset_time is the detection latency in stream time)
+    """
+    __slots__ = ("kind", "onset_time", "detected_time", "confidence")
+
+    def __init__(self, kind, onset_time, detected_time, confidence):
+        self.kind = kind
+        self.onset_time = onset_time
+        self.detected_time = detected_time
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"AudioEvent({self.kind}, onset={self.onset_time:.3f} s, confidence={self.confidence:.2f})"
+
+
+class StreamingGunshotDetector:
+
+    # classifier = GunshotClassifier to score windows with (the shared one from airsim_gunshot_detection if None)
+    # hop_seconds = how often a new window is scored. Events are reported at most one hop after the window holding them fills
+    # threshold = score of the best matching gunshot or explosion class needed to report an event
+    # buffer_seconds = audio kept in the ring buffer
+    def __init__(self, classifier = None, hop_seconds = 0.24, threshold = 0.2, buffer_seconds = 5.0):
+        if classifier is None:
+            from airsim_gunshot_detection import get_classifier
+            classifier = get_classifier()
+        self.classifier = classifier.load()
+        self.hop = int(hop_seconds * SAMPLE_RATE)
+        self.threshold = threshold
+        self.ring = AudioRingBuffer(max(int(buffer_seconds * SAMPLE_RATE), WINDOW_SAMPLES + self.hop))
+
+        self.kinds = {"gunshot" : self.classifier.gunshot_ids, "explosion" : self.classifier.explosion_ids}
+        # kinds whose score was above threshold in the last window. One loud bang spans several overlapping windows
+        # and should only be reported once
+        self.active = set()
+
+        self.next_window_start = 0
+        self.window_count = 0
+        self.inference_time = 0.0
+
+    def _score_window(self, start):
+        window = self.ring.read(start, WINDOW_SAMPLES)
+
+        inferenceStart = time.perf_counter()
+        # max over frames, so a short impulse isn't averaged away by the quiet around it
+        scores = self.classifier.frameScores(window).max(axis=0)
+        self.inference_time += time.perf_counter() - inferenceStart
+        self.window_count += 1
+
+        events = []
+        detectedTime = (start + WINDOW_SAMPLES) / SAMPLE_RATE
+        for kind, classIds in self.kinds.items():
+            confidence = float(scores[classIds].max()) if len(classIds) else 0.0
+            if confidence < self.threshold:
+                self.active.discard(kind)
+                continue
+            if kind in self.active:
+                continue
+            self.active.add(kind)
+
+            # the window only says the sound is somewhere in the last 0.96 s, the first loud sample says where
+            loudness = np.abs(window)
+            onset = start + int(np.argmax(loudness >= 0.5 * loudness.max()))
+            events.append(AudioEvent(kind, onset / SAMPLE_RATE, detectedTime, confidence))
+        return events
+
+    # adds a chunk of 16 kHz mono float samples to the stream. returns the events detected in windows it completed
+    def push(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        events = []
+        # written a hop at a time so a big chunk can't push unscored windows out of the ring buffer
+        for pieceStart in range(0, len(samples), self.hop):
+            self.ring.write(samples[pieceStart : pieceStart + self.hop])
+            while self.next_window_start + WINDOW_SAMPLES <= self.ring.total_written:
+                events += self._score_window(self.next_window_start)
+                self.next_window_start += self.hop
+        return events
+
+    @property
+    def stream_time(self):
+        return self.ring.total_written / SAMPLE_RATE
+
+    @property
+    def mean_inference_time(self):
+        return self.inference_time / self.window_count if self.window_count > 0 else 0.0
+
+# streams every wav file in a folder through a fresh detector in chunk_seconds pieces, like a live microphone would
+# deliver them. returns {file name : list of AudioEvent}
+def evaluate_files(audio_dir = "gunshotaudio", chunk_seconds = 0.05, classifier = None, **detector_args):
+    results = {}
+    for audio_path in sorted(glob.glob(os.path.join(audio_dir, "*.wav"))):
+        detector = StreamingGunshotDetector(classifier, **detector_args)
+        waveform = detector.classifier.load_waveform(audio_path)
+        # a second of silence after the file so windows covering its end get scored
+        waveform = np.concatenate((waveform, np.zeros(SAMPLE_RATE, dtype=np.float32)))
+
+        chunk = int(chunk_seconds * SAMPLE_RATE)
+        events = []
+        for start in range(0, len(waveform), chunk):
+            events += detector.push(waveform[start : start + chunk])
+        results[os.path.basename(audio_path)] = events
+
+        latencies = [event.detected_time - event.onset_time for event in events]
+        print(f"{os.path.basename(audio_path)}: {events}"
+              + (f", latency {max(latencies)*1000:.0f} ms" if latencies else "")
+              + f", {detector.mean_inference_time*1000:.1f} ms per window")
+    return results
+
+
+if __name__ == '__main__':
+    evaluate_files()
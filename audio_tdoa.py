@@ -0,0 +1,79 @@
+#this file estimates when each sensor heard a sound from the sensors' recordings, with batched GCC-PHAT
+
+import numpy as np
+from itertools import combinations
+from audio_constants import YAMNET_SAMPLE_RATE as SAMPLE_RATE
+
+# delays between sensor pairs with GCC-PHAT.
+# signals = (..., N, L) recordings (any leading dimensions, e.g. events). pairs = list of (i, j), defaults to all pairs
+# max_delay = largest possible delay in seconds (sensor distance / speed of sound). Limits the peak search
+# upsample = the cross-correlation around the peak is computed this many times finer than the sample rate
+# returns (..., P) delays in seconds, positive when sensor j hears the sound after sensor i
+def gcc_phat_delays(signals, pairs = None, sample_rate = SAMPLE_RATE, max_delay = None, upsample = 4):
+    signals = np.asarray(signals, dtype=np.float32)
+    sensorCount, length = signals.shape[-2:]
+    pairs = list(combinations(range(sensorCount), 2)) if pairs is None else list(pairs)
+    first = np.array([i for i, j in pairs])
+    second = np.array([j for i, j in pairs])
+
+    nfft = 1 << int(np.ceil(np.log2(2 * length)))
+    # one FFT per sensor, shared by every pair it's in
+    spectra = np.fft.rfft(signals, n=nfft, axis=-1)
+    cross = spectra[..., second, :] * np.conj(spectra[..., first, :])
+    cross /= np.maximum(np.abs(cross), 1e-12)
+
+    # whole-sample cross-correlation to find the peak
+    correlation = np.fft.irfft(cross, n=nfft, axis=-1)
+    maxShift = nfft // 2 - 1
+    if max_delay is not None:
+        maxShift = min(maxShift, int(np.ceil(max_delay * sample_rate)) + 1)
+    # lags -maxShift..maxShift in order (negative lags are at the end of the circular correlation)
+    window = np.concatenate((correlation[..., -maxShift:], correlation[..., : maxShift + 1]), axis=-1)
+    peak = np.argmax(window, axis=-1) - maxShift
+
+    # the correlation upsample times finer, but only within a sample of the peak. Evaluating the inverse DFT at
+    # those few lags is much cheaper than an upsampled inverse FFT of the whole correlation
+    fineLags = np.arange(-upsample, upsample + 1) / upsample
+    bins = np.arange(cross.shape[-1])
+    # irfft counts every bin except DC and Nyquist twice
+    weights = np.full(len(bins), 2.0, dtype=np.float32)
+    weights[0] = 1.0
+    weights[-1] = 1.0
+    # shift each pair's spectrum so its peak is at lag 0. exp(2 pi i k peak / nfft) only takes nfft values, so they're looked up
+    twiddles = np.exp(2j * np.pi * np.arange(nfft) / nfft).astype(np.complex64)
+    atPeak = cross * weights * twiddles[(bins * peak[..., None]) % nfft]
+    fine = (atPeak @ np.exp(2j * np.pi * np.outer(bins, fineLags) / nfft).astype(np.complex64)).real
+
+    finePeak = np.argmax(fine, axis=-1)
+    # parabola through the fine peak and its neighbours for the delay between correlation samples
+    inner = np.clip(finePeak, 1, fine.shape[-1] - 2)
+    left = np.take_along_axis(fine, (inner - 1)[..., None], axis=-1)[..., 0]
+    center = np.take_along_axis(fine, inner[..., None], axis=-1)[..., 0]
+    right = np.take_along_axis(fine, (inner + 1)[..., None], axis=-1)[..., 0]
+    curvature = left - 2 * center + right
+    offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, 1), 0.0)
+    offset = np.where(finePeak == inner, offset, 0.0)
+
+    return (peak + fineLags[inner] + offset / upsample) / sample_rate
+
+# arrival time of the sound at each sensor, relative to the first sensor to hear it (so the earliest is 0, as
+# calcSoundEmitPosition expects). Every pair's delay is used: the times are the least squares fit to all of them,
+# which averages out a bad peak on any one pair. signals = (..., N, L), returns (..., N)
+def estimate_arrival_times(signals, sample_rate = SAMPLE_RATE, max_delay = None, upsample = 4):
+    sensorCount = np.shape(signals)[-2]
+    pairs = list(combinations(range(sensorCount), 2))
+    delays = gcc_phat_delays(signals, pairs, sample_rate, max_delay, upsample)
+
+    # t_j - t_i = delay for each pair. With every pair measured the least squares solution is A^T d / N
+    incidence = np.zeros((len(pairs), sensorCount))
+    for row, (i, j) in enumerate(pairs):
+        incidence[row, i] = -1
+        incidence[row, j] = 1
+    times = delays @ incidence / sensorCount
+    return times - times.min(axis=-1, keepdims=True)
+
+# arrival times for many events, a chunk of events at a time so the upsampled correlations fit in memory.
+# signals = (E, N, L)
+def estimate_arrival_times_batch(signals, sample_rate = SAMPLE_RATE, max_delay = None, upsample = 4, chunk_size = 64):
+    return np.concatenate([estimate_arrival_times(signals[start : start + chunk_size], sample_rate, max_delay, upsample)
+                           for start in range(0, len(signals), chunk_size)])
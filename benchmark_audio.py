@@ -0,0 +1,123 @@
+# Offline benchmarks for the gunshot audio classifier. These run on the wav files in gunshotaudio, so AirSim does not
+# need to be running (airsim_gunshot_detection still imports airsim, keyboard and winsound, so run this on Windows).
+
+import os
+import sys
+import glob
+import time
+import subprocess
+import numpy as np
+from airsim_gunshot_detection import YAMNET_MODEL_URL
+
+# === Configuration ===
+audio_dir = "gunshotaudio"
+iterations = 20
+
+# seconds for a fresh python process to run code (imports included)
+def time_in_subprocess(code):
+    script = f"import time\nstart = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return float(output.strip().splitlines()[-1])
+
+# startup: importing the module no longer loads YAMNet, that now happens on first use (or in the background)
+def benchmark_import():
+    import_time = time_in_subprocess("import airsim_gunshot_detection")
+    # the libraries the module used to import at the top, timed on their own so there's a number even when
+    # tfhub.dev can't be reached
+    library_time = time_in_subprocess("import airsim_gunshot_detection\nimport tensorflow_hub, librosa")
+    print(f"Import with tensorflow_hub + librosa: {library_time:.2f} s")
+    print(f"Import with lazy model:               {import_time:.2f} s")
+
+    # what importing cost before: the module import plus tensorflow_hub and hub.load
+    try:
+        eager_time = time_in_subprocess("import airsim_gunshot_detection\nairsim_gunshot_detection.GunshotClassifier(warmup=False).load()")
+    except subprocess.CalledProcessError:
+        print(f"Couldn't load YAMNet from {YAMNET_MODEL_URL}, startup saving is at least {library_time - import_time:.2f} s")
+        return library_time, import_time
+    print(f"Import with model loaded at import:   {eager_time:.2f} s")
+    print(f"Startup saving: {eager_time - import_time:.2f} s")
+    return eager_time, import_time
+
+# repeated detections: the old detect_gunshot re-read the labels and the wav file every call
+def benchmark_detection(audio_dir=audio_dir, iterations=iterations):
+    import librosa
+    from airsim_gunshot_detection import GunshotClassifier, load_labels
+
+    audio_paths = sorted(glob.glob(os.path.join(audio_dir, "*.wav")))
+    if not audio_paths:
+        raise FileNotFoundError(f"No wav files in {audio_dir}")
+
+    start = time.perf_counter()
+    classifier = GunshotClassifier().load()
+    load_time = time.perf_counter() - start
+
+    def uncached_step(audio_path):
+        waveform, sr = librosa.load(audio_path, sr=16000)
+        scores, embeddings, spectrogram = classifier.model(waveform)
+        class_names = load_labels()
+        return np.mean(scores.numpy(), axis=0), class_names
+
+    results = {}
+    for name, step in (("labels + wav reloaded every call", uncached_step), ("GunshotClassifier", classifier.detect)):
+        # first pass over the files fills the waveform cache
+        for audio_path in audio_paths:
+            step(audio_path)
+        start = time.perf_counter()
+        for i in range(iterations):
+            step(audio_paths[i % len(audio_paths)])
+        results[name] = (time.perf_counter() - start) / iterations
+
+    print(f"Model load + warm-up: {load_time:.2f} s")
+    for name, seconds in results.items():
+        print(f"{name + ':':35} {seconds*1000:.1f} ms/detection")
+    return results
+
+# streams the files through StreamingGunshotDetector. Whole-file detection can only answer once the file has ended,
+# the streaming detector answers within a hop of the window holding the bang filling up
+def benchmark_streaming(audio_dir=audio_dir, hop_seconds=0.24):
+    from audio_stream_detector import evaluate_files
+    results = evaluate_files(audio_dir, hop_seconds=hop_seconds)
+
+    detected = sum(1 for events in results.values() if events)
+    print(f"Streaming detector found events in {detected}/{len(results)} files")
+    return results
+
+# classifying every microphone of a fleet: one YAMNet call per sensor against one batched call for all of them.
+# sensor signals are synthesized from the gunshot clips for a fleet like the one in findGunshotLoop
+def benchmark_multi_mic(audio_dir=audio_dir, drone_counts=(1, 2, 5), iterations=iterations):
+    from airsim_gunshot_detection import GunshotClassifier
+    from multi_mic_classifier import MultiMicClassifier, synthesize_sensor_signals
+
+    classifier = GunshotClassifier().load()
+    multiMic = MultiMicClassifier(classifier)
+    sensorSpots = np.array([(0, 0.5, 0.1), (0.5, 0, 0.1), (0, 0, 0.3)])
+    audio_paths = sorted(glob.glob(os.path.join(audio_dir, "*.wav")))
+    rng = np.random.default_rng(0)
+
+    for drone_count in drone_counts:
+        sensorPositions = np.concatenate([sensorSpots + (5.0 * i, -5.0 * i, -20.0) for i in range(drone_count)])
+        signals = [synthesize_sensor_signals(classifier.load_waveform(path), sensorPositions, (20, 11, -2), rng=rng) for path in audio_paths]
+
+        def per_sensor_step(i):
+            return [classifier.frameScores(waveform) for waveform in signals[i % len(signals)]]
+
+        def batched_step(i):
+            return multiMic.classify(signals[i % len(signals)])
+
+        times = {}
+        for name, step in (("per sensor", per_sensor_step), ("batched", batched_step)):
+            step(0)
+            start = time.perf_counter()
+            for i in range(iterations):
+                step(i)
+            times[name] = (time.perf_counter() - start) / iterations
+
+        print(f"{len(sensorPositions)} microphones: {len(sensorPositions)} calls {times['per sensor']*1000:.1f} ms, "
+              f"1 batched call {times['batched']*1000:.1f} ms per event. Fused confidence {batched_step(0).fused_confidence:.2f}")
+
+if __name__ == '__main__':
+    benchmark_import()
+    benchmark_detection()
+    benchmark_streaming()
+    benchmark_multi_mic()
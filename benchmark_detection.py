@@ -0,0 +1,168 @@
+# Offline benchmarks for the detection code. These run on images from disk, so AirSim does not need to be running.
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+import cv2
+import numpy as np
+from types import SimpleNamespace
+from yolo import YOLODetector, MultiModelDetector, DetectionRenderer
+from airsim_fake_client import FakeMultirotorClient
+from airsim_camera import CameraCapture
+from detection_scheduler import MultiDroneDetectionScheduler
+import detector_service
+from tiled_detection import TiledDetector, open_mapped_image
+
+# === Configuration ===
+model_paths = [
+    "./model/best_pool.pt",
+    "./model/best_car.pt",
+]
+image_path = "sat_testimage_1.png"
+iterations = 50
+warmup_iterations = 5
+
+def load_test_image(path=image_path, size=(1024, 1024)):
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise FileNotFoundError(f"Could not read test image {path}")
+    return cv2.resize(image, size)
+
+def time_loop(step, iterations=iterations, warmup_iterations=warmup_iterations):
+    """
+    Run step() a few times to warm up, then return the mean seconds per call
+    """
+    for i in range(warmup_iterations):
+        step()
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        step()
+    return (time.perf_counter() - start) / iterations
+
+# compares the old one-detector-after-another loop from airsim_target_detection.detect against MultiModelDetector
+def benchmark_multi_model(model_paths=model_paths, image_path=image_path, device="cuda"):
+    png = load_test_image(image_path)
+
+    detectors = [YOLODetector(path, device=device) for path in model_paths]
+
+    def sequential_step():
+        detection_image = png.copy()
+        for detector in detectors:
+            _, results = detector.process_image(png)
+            detection_image = detector.draw_detections(detection_image, results)
+        return detection_image
+
+    multi_detector = MultiModelDetector(model_paths, device=device)
+    renderer = DetectionRenderer()
+
+    def multi_model_step():
+        frame = multi_detector.prepare_image(png)
+        detections = multi_detector.detect(frame)
+        return renderer.render(frame, detections)
+
+    sequential_time = time_loop(sequential_step)
+    multi_model_time = time_loop(multi_model_step)
+    multi_detector.close()
+
+    print(f"Sequential detectors:  {sequential_time*1000:.1f} ms/frame ({1/sequential_time:.1f} FPS)")
+    print(f"MultiModelDetector:    {multi_model_time*1000:.1f} ms/frame ({1/multi_model_time:.1f} FPS)")
+    print(f"Speedup: {sequential_time/multi_model_time:.2f}x")
+
+    return sequential_time, multi_model_time
+
+# compares one detector per drone, each run one after another, against one batched MultiDroneDetectionScheduler
+def benchmark_multi_drone(drone_counts=(1, 2, 5), model_paths=model_paths, device="cuda", batch_size=5, duration=10):
+    client = FakeMultirotorClient()
+    scheduler_detector = MultiModelDetector(model_paths, device=device)
+
+    for drone_count in drone_counts:
+        drones = [SimpleNamespace(vehicleName=f"Drone{i+1}") for i in range(drone_count)]
+
+        # the old way: each drone gets its own detector and its own inference call per frame
+        per_drone = [(CameraCapture(client, [("bottom_center", drone.vehicleName)]), MultiModelDetector(model_paths, device=device)) for drone in drones]
+        def per_drone_step():
+            for capture, detector in per_drone:
+                detector.detect(capture.grabOne())
+        per_drone_fps = drone_count / time_loop(per_drone_step, iterations=iterations // drone_count + 1)
+        for capture, detector in per_drone:
+            detector.close()
+
+        scheduler = MultiDroneDetectionScheduler(client, drones, scheduler_detector, batch_size=batch_size)
+        report = scheduler.run(duration=duration)
+
+        print(f"{drone_count} drones: per-drone detectors {per_drone_fps:.1f} FPS total, scheduler {report['fps']:.1f} FPS total")
+
+    scheduler_detector.close()
+
+# seconds from launching a new python process until its first detection is back, with the detector made by detector_expression
+def time_first_detection(detector_expression, image_path=image_path):
+    script = (
+        "import cv2, yolo, detector_service\n"
+        f"image = cv2.resize(cv2.imread({image_path!r}, cv2.IMREAD_UNCHANGED), (1024, 1024))\n"
+        f"detector = {detector_expression}\n"
+        "detector.detect(detector.prepare_image(image))\n"
+        "detector.close()\n"
+    )
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+# compares how long a freshly launched detection script takes to get its first detection when it loads the models
+# itself against when it uses an already running detector service
+def benchmark_startup(model_paths=model_paths, image_path=image_path, device="cuda", launches=3):
+    local_times = [time_first_detection(f"yolo.MultiModelDetector({model_paths!r}, device={device!r})", image_path) for i in range(launches)]
+
+    # the service is started once and stays up, its own start-up is paid on the first launch only
+    start = time.perf_counter()
+    service_process = detector_service.start_service_process(model_paths, device=device)
+    service_start_time = time.perf_counter() - start
+    try:
+        # RemoteDetector rather than get_detector, so a service that can't be reached fails instead of timing a local load
+        service_times = [time_first_detection(f"detector_service.RemoteDetector({model_paths!r})", image_path) for i in range(launches)]
+    finally:
+        if service_process is not None:
+            detector_service.stop_service()
+            service_process.join(timeout=5.0)
+
+    local_time = sum(local_times) / launches
+    service_time = sum(service_times) / launches
+    print(f"Loading models locally:  {local_time:.2f} s to first detection")
+    print(f"Detector service:        {service_time:.2f} s to first detection (service start-up {service_start_time:.2f} s, once)")
+    print(f"Speedup: {local_time/service_time:.2f}x")
+
+    return local_time, service_time, service_start_time
+
+# tiles/s of TiledDetector over a map_size x map_size map made by repeating the test image, read through a memory map
+# like scan_map does, with one window per inference call against batch_size windows per call
+def benchmark_tiled(model_paths=model_paths, image_path=image_path, device="cuda", map_size=4096, window_size=1024, overlap=128, batch_size=8):
+    tile = load_test_image(image_path, (window_size, window_size))[:, :, :3]
+    repeats = map_size // window_size + 1
+    with tempfile.TemporaryDirectory() as directory:
+        map_path = os.path.join(directory, "map.png")
+        cv2.imwrite(map_path, np.tile(tile, (repeats, repeats, 1))[:map_size, :map_size])
+        image = open_mapped_image(map_path)
+
+        detector = MultiModelDetector(model_paths, device=device)
+        # warm up so the first timed batch doesn't pay for CUDA initialization
+        detector.detect_batch([np.ascontiguousarray(image[:window_size, :window_size])] * batch_size)
+
+        results = {}
+        for size in (1, batch_size):
+            tiled = TiledDetector(detector, window_size=window_size, overlap=overlap, batch_size=size)
+            detections = tiled.detect(image)
+            results[size] = tiled.tiles_per_second
+            print(f"Batch size {size}: {tiled.tile_count} tiles in {tiled.elapsed:.2f} s ({tiled.tiles_per_second:.2f} tiles/s), {len(detections)} objects")
+        detector.close()
+        del image
+
+    print(f"Speedup: {results[batch_size]/results[1]:.2f}x")
+    return results
+
+if __name__ == '__main__':
+    benchmark_multi_model()
+    benchmark_multi_drone()
+    benchmark_startup()
+    benchmark_tiled()
@@ -0,0 +1,62 @@
+# Offline benchmark for pushing frames to the split screen. Runs against FakeMultirotorClient, which counts the
+# console commands and reads each image file back the way Unreal would, so AirSim does not need to be running.
+
+import os
+import time
+import cv2
+import airsim_splitscreen
+from airsim_fake_client import FakeMultirotorClient
+
+# === Configuration ===
+frame_size = (512, 564)
+frame_count = 200
+# every n-th frame repeats the previous one, like a hovering drone
+repeat_every = 4
+
+def make_frames(frame_count=frame_count, frame_size=frame_size, repeat_every=repeat_every):
+    baseImage = cv2.resize(cv2.imread("sat_testimage_1.png", cv2.IMREAD_COLOR), frame_size)
+    frames = []
+    for i in range(frame_count):
+        if repeat_every and i % repeat_every == repeat_every - 1:
+            frames.append(frames[-1])
+            continue
+        # draw a moving box so consecutive frames differ
+        image = baseImage.copy()
+        cv2.rectangle(image, (i % 400, 100), (i % 400 + 50, 150), (50, 50, 255), 2)
+        frames.append(image)
+    return frames
+
+# the old way: PNG to disk then tell Unreal to load it
+def push_png(client, image, img_path="demo_image.png"):
+    cv2.imwrite(img_path, image)
+    airsim_splitscreen.simSetSplitScreenToImageFile(client, os.path.abspath(img_path), rightSide=True)
+
+def benchmark_split_screen_sink(frames=None):
+    if frames is None:
+        frames = make_frames()
+
+    client = FakeMultirotorClient(read_image_files=True)
+    start = time.perf_counter()
+    for image in frames:
+        push_png(client, image)
+    png_time = time.perf_counter() - start
+    png_commands = len(client.console_commands)
+    os.remove("demo_image.png")
+
+    client = FakeMultirotorClient(read_image_files=True)
+    # no reuse delay: this measures the cost of a push, not the pacing that protects buffers Unreal is loading
+    sink = airsim_splitscreen.SplitScreenImageSink(client, rightSide=True, reuseDelay=0)
+    start = time.perf_counter()
+    for image in frames:
+        sink.push(image)
+    sink_time = time.perf_counter() - start
+    sink_commands = len(client.console_commands)
+    sink.close()
+
+    print(f"PNG file:  {len(frames)/png_time:.1f} FPS, {png_commands} console commands")
+    print(f"Sink:      {len(frames)/sink_time:.1f} FPS, {sink_commands} console commands ({sink.skippedCount} unchanged frames skipped)")
+
+    return len(frames)/png_time, len(frames)/sink_time
+
+if __name__ == '__main__':
+    benchmark_split_screen_sink()
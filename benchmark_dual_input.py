@@ -0,0 +1,283 @@
+# Benchmarks for training DualInputModel on the satellite + streetview pairs in Original/NASA_Datasets.csv. The images
+# are random (only the speed is measured), so the image folders aren't needed.
+
+import os
+import sys
+import csv
+import time
+import tempfile
+import subprocess
+import torch
+import numpy as np
+import torch.nn as nn
+from PIL import Image
+from model import DualInputModel, FeatureCache, precompute_features, NASAPairDataset, PrefetchLoader, make_loader
+from model import DualInputInference, compare_outputs, export_model, normalize_images
+from dual_input_runtime import DualInputRuntime
+
+# === Configuration ===
+csv_path = "Original/NASA_Datasets.csv"
+model_name = "microsoft/swin-tiny-patch4-window7-224"
+model_type = "swin"
+fusion_type = "concat"
+batch_size = 16
+steps = 20
+warmup_steps = 3
+image_size = 224
+device = "cuda" if torch.cuda.is_available() else "cpu"
+loader_pairs = 256          # rows of the CSV the loader benchmark writes images for
+source_image_size = 640     # size of the written png files
+num_workers = 4
+# pretrained weights for each model_type in the inference benchmark
+inference_models = {
+    "swin" : "microsoft/swin-tiny-patch4-window7-224",
+    "convnext" : "facebook/convnext-tiny-224",
+    "resnet" : "resnet50",
+    "deit" : "facebook/deit-tiny-patch16-224",
+    "vit" : "google/vit-base-patch16-224",
+}
+inference_fusions = ["concat", "weighted_sum", "diff_mul", "self_attention", "gated", "cross_attention"]
+inference_iterations = 10
+import_time_target = 3.0    # seconds importing the model package may take (torch alone is most of it)
+heavy_modules = ["transformers", "timm", "torchvision", "matplotlib", "PIL"]
+
+# (satellite image name, streetview image name, label) for every row, label 1 for abandoned
+def load_pairs(csv_path=csv_path):
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        return [(row["Sitelite_img_name"], row["Streetview_img_name"], int(row["Status"] == "Abandoned")) for row in csv.DictReader(f)]
+
+# the same random image for a name every time it's loaded
+def load_images(names):
+    images = []
+    for name in names:
+        generator = torch.Generator().manual_seed(hash(name) % (2 ** 31))
+        images.append(torch.randn(3, image_size, image_size, generator=generator))
+    return torch.stack(images)
+
+def make_model(batch_inputs):
+    model = DualInputModel(model_name, model_type, fusion_type=fusion_type, num_inputs=2, batch_inputs=batch_inputs).to(device)
+    for parameter in model.backbone.parameters():
+        parameter.requires_grad = False
+    model.backbone.eval()
+    return model
+
+def time_steps(step, batches):
+    for batch in batches[:warmup_steps]:
+        step(batch)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for batch in batches[warmup_steps:]:
+        step(batch)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / (len(batches) - warmup_steps)
+
+# training step time of the fusion heads: backbone run per input, backbone run once on both inputs, and features
+# read from the cache
+def benchmark_training_step(batch_size=batch_size, steps=steps):
+    pairs = load_pairs()[: batch_size * (steps + warmup_steps)]
+    batches = [pairs[i : i + batch_size] for i in range(0, len(pairs), batch_size)]
+    loss_fn = nn.CrossEntropyLoss()
+
+    def backbone_step(model, optimizer):
+        def step(batch):
+            satellite = load_images([pair[0] for pair in batch]).to(device)
+            streetview = load_images([pair[1] for pair in batch]).to(device)
+            labels = torch.tensor([pair[2] for pair in batch], device=device)
+            # frozen backbone, so no graph is kept for it
+            with torch.no_grad():
+                features = model.extract_features(satellite, streetview)
+            loss = loss_fn(model.fuse(features), labels)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        return step
+
+    results = {}
+    for name, batch_inputs in (("per input", False), ("batched", True)):
+        model = make_model(batch_inputs)
+        optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=1e-4)
+        results[name] = time_steps(backbone_step(model, optimizer), batches)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        names = [name for pair in pairs for name in pair[:2]]
+        cache = FeatureCache(os.path.join(cache_dir, "features.f16"), model.feature_dim, names)
+        start = time.perf_counter()
+        precompute_features(model, cache, names, load_images, batch_size=batch_size * 2, device=device)
+        precompute_time = time.perf_counter() - start
+
+        def cached_step(batch):
+            features = [cache.get([pair[0] for pair in batch], device), cache.get([pair[1] for pair in batch], device)]
+            labels = torch.tensor([pair[2] for pair in batch], device=device)
+            loss = loss_fn(model.fuse(features), labels)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+        results["cached"] = time_steps(cached_step, batches)
+        del cache
+
+    print(f"{model_type} on {device}, batch of {batch_size} pairs:")
+    for name, step_time in results.items():
+        print(f"  {name:10s} {step_time*1000:8.1f} ms per step ({batch_size / step_time:,.0f} pairs/s)")
+    print(f"  cache built in {precompute_time:.1f} s for {len(names)} images")
+    return results
+
+# images/s delivered by NASAPairDataset: decoding in the main process every epoch (the old way of loading), then
+# worker processes on the first epoch (decoding into the shard) and on later epochs (reading the shard)
+def benchmark_loader(pair_count=loader_pairs, batch_size=32, num_workers=num_workers, epochs=3):
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))[:pair_count]
+        subset_csv = os.path.join(data_dir, "pairs.csv")
+        with open(subset_csv, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=rows[0].keys())
+            writer.writeheader()
+            writer.writerows(rows)
+
+        rng = np.random.default_rng(0)
+        for folder, column in (("satellite_images", "Sitelite_img_name"), ("streetview_images", "Streetview_img_name")):
+            os.makedirs(os.path.join(data_dir, folder))
+            for row in rows:
+                pixels = rng.integers(0, 256, size=(source_image_size, source_image_size, 3), dtype=np.uint8)
+                Image.fromarray(pixels).save(os.path.join(data_dir, folder, row[column] + ".png"))
+
+        def make_dataset(shard_name):
+            return NASAPairDataset(subset_csv, os.path.join(data_dir, "satellite_images"), os.path.join(data_dir, "streetview_images"),
+                                   image_size, shard_path=os.path.join(data_dir, shard_name))
+
+        # no shard reuse: a fresh shard every epoch means every image is decoded again, in the main process
+        start = time.perf_counter()
+        for epoch in range(epochs):
+            dataset = make_dataset(f"uncached_{epoch}.u8")
+            for batch in PrefetchLoader(make_loader(dataset, batch_size, num_workers=0), device):
+                pass
+        baseline = 2 * len(dataset) * epochs / (time.perf_counter() - start)
+        print(f"Main process, decoding every epoch: {baseline:,.0f} images/s")
+
+        dataset = make_dataset("shard.u8")
+        loader = make_loader(dataset, batch_size, num_workers=num_workers)
+        for epoch in range(epochs):
+            prefetch = PrefetchLoader(loader, device)
+            for batch in prefetch:
+                pass
+            report = prefetch.report(print_report=False)
+            print(f"{num_workers} workers, epoch {epoch + 1}: {report['images_per_second']:,.0f} images/s, "
+                  f"{report['wait_seconds']:.2f} s waiting ({dataset})")
+        return report
+
+def time_inference(model, inputs, iterations=inference_iterations):
+    for i in range(2):
+        model(*inputs)
+    start = time.perf_counter()
+    for i in range(iterations):
+        model(*inputs)
+    return (time.perf_counter() - start) / iterations
+
+# CPU latency (one pair) and throughput (a batch of pairs) of fp32 eager against DualInputInference for every
+# model_type and fusion_type, with the accuracy delta of the optimized outputs
+def benchmark_inference(models=inference_models, fusions=inference_fusions, batch_size=batch_size, compile=False):
+    torch.manual_seed(0)
+    single = [torch.randn(1, 3, image_size, image_size) for i in range(2)]
+    batch = [torch.randn(batch_size, 3, image_size, image_size) for i in range(2)]
+
+    results = []
+    for model_type, name in models.items():
+        for fusion in fusions:
+            model = DualInputModel(name, model_type, fusion_type=fusion, num_inputs=2).eval()
+            optimized = DualInputInference(model, bf16=True, compile=compile, quantize_heads=True)
+
+            with torch.inference_mode():
+                fp32_latency = time_inference(model, single)
+                fp32_throughput = batch_size / time_inference(model, batch)
+            latency = time_inference(optimized, single)
+            throughput = batch_size / time_inference(optimized, batch)
+            delta = compare_outputs(model, optimized, *batch)
+
+            results.append({"model_type" : model_type, "fusion_type" : fusion,
+                            "fp32_latency_ms" : fp32_latency * 1000, "latency_ms" : latency * 1000,
+                            "fp32_pairs_per_second" : fp32_throughput, "pairs_per_second" : throughput, **delta})
+            print(f"{model_type:9s} {fusion:16s} latency {fp32_latency*1000:7.1f} -> {latency*1000:7.1f} ms, "
+                  f"throughput {fp32_throughput:6.1f} -> {throughput:6.1f} pairs/s, max logit delta {delta['max_logit_delta']:.4f}, "
+                  f"{delta['prediction_agreement']:.0%} same predictions")
+    return results
+
+# seconds for a fresh python process to run code (imports included)
+def time_in_subprocess(code):
+    script = f"import time\nstart = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return float(output.strip().splitlines()[-1])
+
+# cold start (new process to first prediction) and per-sample latency of the eager model loaded the usual way
+# (from_pretrained plus a saved state_dict) against the ONNX and TorchScript exports in DualInputRuntime
+def benchmark_export(model_name=model_name, model_type=model_type, fusion_type=fusion_type, iterations=inference_iterations):
+    model = DualInputModel(model_name, model_type, fusion_type=fusion_type, num_inputs=2).eval()
+    pair = [np.random.default_rng(i).integers(0, 256, size=(image_size, image_size, 3), dtype=np.uint8) for i in range(2)]
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        state_path = os.path.join(export_dir, "model.pth")
+        torch.save(model.state_dict(), state_path)
+        np.save(os.path.join(export_dir, "pair.npy"), np.stack(pair))
+
+        eager_code = (f"import torch, numpy as np\nfrom model import DualInputModel, normalize_images\n"
+                      f"model = DualInputModel({model_name!r}, {model_type!r}, fusion_type={fusion_type!r}, num_inputs=2).eval()\n"
+                      f"model.load_state_dict(torch.load({state_path!r}))\n"
+                      f"pair = torch.from_numpy(np.load({os.path.join(export_dir, 'pair.npy')!r})).permute(0, 3, 1, 2)\n"
+                      f"with torch.inference_mode(): model(normalize_images(pair[:1]), normalize_images(pair[1:]))")
+        results = {"eager" : {"cold_start_s" : time_in_subprocess(eager_code)}}
+        with torch.inference_mode():
+            inputs = [torch.from_numpy(image).permute(2, 0, 1)[None] for image in pair]
+            results["eager"]["latency_ms"] = time_inference(model, [normalize_images(x) for x in inputs], iterations) * 1000
+
+        for name, extension in (("onnx", ".onnx"), ("torchscript", ".pt")):
+            path = export_model(model, os.path.join(export_dir, "model" + extension), num_inputs=2, image_size=image_size)
+            runtime_code = (f"import numpy as np\nfrom dual_input_runtime import DualInputRuntime\n"
+                            f"runtime = DualInputRuntime({path!r})\n"
+                            f"runtime.predict(*np.load({os.path.join(export_dir, 'pair.npy')!r}))")
+            runtime = DualInputRuntime(path)
+            with torch.inference_mode():
+                expected = torch.softmax(model(*[normalize_images(x) for x in inputs]), dim=1).numpy()
+            results[name] = {
+                "cold_start_s" : time_in_subprocess(runtime_code),
+                "latency_ms" : time_inference(lambda *images: runtime.predict(*images), pair, iterations) * 1000,
+                "max_probability_delta" : float(np.abs(runtime.predict(*pair) - expected).max()),
+            }
+
+    for name, result in results.items():
+        print(f"{name:12s} cold start {result['cold_start_s']:6.2f} s, latency {result['latency_ms']:7.1f} ms"
+              + (f", max probability delta vs eager {result['max_probability_delta']:.2e}" if "max_probability_delta" in result else ""))
+    return results
+
+# -X importtime report of importing the model package in a fresh process: total time, the slowest top-level
+# imports, and any heavy optional library that got imported anyway. Fails if the import is slower than the target
+def benchmark_import(module="model", target=import_time_target, top=10):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             f"import sys, {module}\nprint([name for name in {heavy_modules!r} if name in sys.modules])"],
+                            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    loaded_heavy = result.stdout.strip().splitlines()[-1]
+
+    # lines look like "import time:   self [us] |   cumulative | imported package", nesting shown by indentation
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us), name.rstrip()))
+    top_level = [(cumulative_us, name.strip()) for cumulative_us, name in imports if not name.startswith("  ")]
+    total = sum(cumulative_us for cumulative_us, name in top_level) / 1e6
+
+    print(f"import {module}: {total:.2f} s (target {target:.2f} s), heavy modules loaded: {loaded_heavy}")
+    for cumulative_us, name in sorted(top_level, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1e6:6.3f} s  {name}")
+    if total > target:
+        raise RuntimeError(f"Importing {module} took {total:.2f} s, over the {target:.2f} s target")
+    return total
+
+
+if __name__ == '__main__':
+    benchmark_import()
+    benchmark_training_step()
+    benchmark_loader()
+    benchmark_inference()
+    benchmark_export()
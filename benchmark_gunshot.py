@@ -0,0 +1,221 @@
+# Offline benchmark for the gunshot localization math. Gunshots and arrival times are simulated, so AirSim does not
+# need to be running.
+
+import time
+import asyncio
+import numpy as np
+from airsim import Vector3r, Pose
+from airsim_drone import Drone, sampleFleet
+from airsim_fake_client import FakeMultirotorClient
+from tdoa import solve_tdoa_batch, simulate_arrival_times, localize_one_by_one, SPEED_OF_SOUND_MPS
+from gunshot_localizer import StreamingGunshotLocalizer, simulate_arrival_stream
+from gunshot_scheduler import GunshotScheduler
+from audio_tdoa import estimate_arrival_times, estimate_arrival_times_batch
+from multi_mic_classifier import synthesize_sensor_signals
+
+# === Configuration ===
+# same sensor layout as findGunshotLoop, on two drones flying at different heights (if every sensor is at the same
+# height relative to its drone and the drones fly level with each other, the sensors are coplanar and height can't be solved)
+sensor_spots = np.array([(0, 0.5, 0.1), (0.5, 0, 0.1), (0, 0, 0.3)])
+drone_positions = np.array([(0, 0, -20), (5, -5, -15)])
+event_count = 5000
+drift = 3.0            # meters each drone wanders from its spot between gunshots
+source_range = 30.0    # gunshots are spawned within this many meters of the origin, on the ground
+
+def simulate_events(event_count=event_count, seed=0):
+    rng = np.random.default_rng(seed)
+    drones = drone_positions[None, :, :] + rng.normal(0.0, drift, size=(event_count, len(drone_positions), 3))
+    sensors = (drones[:, :, None, :] + sensor_spots[None, None, :, :]).reshape(event_count, -1, 3)
+
+    sources = np.column_stack([rng.uniform(-source_range, source_range, size=(event_count, 2)), np.full(event_count, -0.5)])
+    return sensors, simulate_arrival_times(sources, sensors), sources
+
+def benchmark_tdoa(event_count=event_count):
+    sensors, times, sources = simulate_events(event_count)
+
+    start = time.perf_counter()
+    # relative to the first arrival, like the callers of calcSoundEmitPosition do
+    loop_positions = localize_one_by_one(sensors, times - times.min(axis=1, keepdims=True))
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_positions = solve_tdoa_batch(sensors, times)
+    batch_time = time.perf_counter() - start
+
+    # the arrival times are exact, so any error is numerical
+    for name, positions, elapsed in (("calcSoundEmitPosition", loop_positions, loop_time), ("solve_tdoa_batch", batch_positions, batch_time)):
+        solved = np.isfinite(positions).all(axis=1)
+        error = np.linalg.norm(positions[solved] - sources[solved], axis=1)
+        print(f"{name + ':':23}{event_count / elapsed:10,.0f} events/s, solved {solved.sum()}/{event_count}, "
+              f"median error {np.median(error):.1e} m, max error {error.max():.1e} m")
+    print(f"Speedup: {loop_time / batch_time:.1f}x")
+
+    return loop_time, batch_time
+
+# streams overlapping gunshots through StreamingGunshotLocalizer and checks every gunshot got its own accurate estimate.
+# shot_interval = mean seconds between gunshots (shorter than the time sound takes to cross the fleet, so they overlap)
+# match_distance = meters an estimate may be from a gunshot's source to count as that gunshot
+def benchmark_streaming(shot_count=1000, shot_interval=0.05, noise_std=1e-6, match_distance=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    sensors = [((f"Drone{d+1}", i), drone + spot) for d, drone in enumerate(drone_positions) for i, spot in enumerate(sensor_spots)]
+    sources = np.column_stack([rng.uniform(-source_range, source_range, size=(shot_count, 2)), np.full(shot_count, -0.5)])
+    shotTimes = np.cumsum(rng.exponential(shot_interval, size=shot_count))
+    arrivals = simulate_arrival_stream(sources, shotTimes, sensors, noise_std=noise_std, rng=rng)
+
+    localizer = StreamingGunshotLocalizer(expected_sensors=len(sensors), max_sensor_distance=20)
+
+    async def stream():
+        task = asyncio.create_task(localizer.run())
+        for arrival in arrivals:
+            localizer.submit(arrival)
+            # let the localizer run between arrivals like it would with a live feed
+            await asyncio.sleep(0)
+        localizer.stop()
+        await task
+
+        estimates = []
+        while not localizer.estimates.empty():
+            estimate = localizer.estimates.get_nowait()
+            if estimate is not None and estimate.final:
+                estimates.append(estimate)
+        return estimates
+
+    start = time.perf_counter()
+    estimates = asyncio.run(stream())
+    elapsed = time.perf_counter() - start
+
+    # an estimate matches a gunshot when it's within match_distance of the source and was first heard within the
+    # localizer's window of when that gunshot was first heard. Grouped right = it matches exactly one gunshot
+    sensorPositions = np.array([position for sensorId, position in sensors])
+    firstArrivals = shotTimes + np.linalg.norm(sensorPositions[None, :, :] - sources[:, None, :], axis=2).min(axis=1) / SPEED_OF_SOUND_MPS
+    positions = np.array([estimate.position for estimate in estimates]).reshape(-1, 3)
+    estimateTimes = np.array([estimate.first_arrival_time for estimate in estimates])
+    distances = np.linalg.norm(positions[:, None, :] - sources[None, :, :], axis=2)
+    matches = (distances <= match_distance) & (np.abs(estimateTimes[:, None] - firstArrivals[None, :]) <= localizer.window)
+    grouped = matches.sum(axis=1) == 1
+    nearest = distances.min(axis=1) if len(estimates) else np.zeros(0)
+    localized = np.unique(np.argmax(matches[grouped], axis=1))
+
+    report = localizer.report()
+    report["grouping_accuracy"] = float(np.mean(grouped)) if len(estimates) else 0.0
+    report["localized_shots"] = len(localized)
+    print(f"{shot_count} overlapping gunshots, {len(arrivals)} arrivals in {elapsed:.2f} s ({len(arrivals) / elapsed:,.0f} arrivals/s). "
+          f"{len(estimates)} final estimates, {report['grouping_accuracy']:.1%} matching exactly one gunshot, "
+          f"{np.mean(nearest > 5):.1%} over 5 m from every gunshot, median error {np.median(nearest):.2f} m. "
+          f"{len(localized)}/{shot_count} gunshots localized")
+    return report
+
+# counts the getMultirotorState RPCs needed to read every sensor position and audio time for one gunshot.
+# rpc_delay = simulated round trip of each RPC
+def benchmark_sensor_sampling(drone_counts=(1, 2, 5), rpc_delay=0.002, gunshots=50):
+    pos = Vector3r(20, 11, -2)
+    sensorSpots = [Vector3r(*spot) for spot in sensor_spots.tolist()]
+
+    for drone_count in drone_counts:
+        vehiclePositions = {f"Drone{i+1}" : (5.0 * i, -5.0 * i, -20.0 + i) for i in range(drone_count)}
+        client = FakeMultirotorClient(rpc_delay=rpc_delay, vehicle_positions=vehiclePositions)
+        drones = [Drone(client, sensorSpots, vehicleName=name) for name in vehiclePositions]
+
+        # how simSpawnGunshotToFindMultidrone used to read them: a state RPC for every sensor, once for the audio times
+        # and again for the positions
+        def per_sensor_step():
+            audioTimes = []
+            sensorPositions = []
+            for drone in drones:
+                spots = [sensorSpot + drone.getWorldPosition() for sensorSpot in drone.sensorSpots]
+                audioTimes += [pos.distance_to(spot) / drone.speed_of_sound_mps for spot in spots]
+                sensorPositions += [sensorSpot + drone.getWorldPosition() for sensorSpot in drone.sensorSpots]
+            return audioTimes, sensorPositions
+
+        def snapshot_step():
+            snapshot = sampleFleet(drones)
+            return snapshot.audioTimes(pos), snapshot.sensorWorldPositions()
+
+        results = {}
+        for name, step in (("per sensor", per_sensor_step), ("snapshot", snapshot_step)):
+            client.rpc_counts.clear()
+            start = time.perf_counter()
+            for i in range(gunshots):
+                step()
+            elapsed = time.perf_counter() - start
+            results[name] = (client.rpc_counts["getMultirotorState"] / gunshots, elapsed / gunshots)
+
+        print(f"{drone_count} drones: per sensor {results['per sensor'][0]:.0f} RPCs ({results['per sensor'][1]*1000:.1f} ms), "
+              f"snapshot {results['snapshot'][0]:.0f} RPCs ({results['snapshot'][1]*1000:.1f} ms) per gunshot")
+
+# arrival times from simulated recordings with GCC-PHAT instead of exact distances, then localized.
+# segment = samples of each recording used (starting just before the bang), noise_std = microphone noise
+def benchmark_gcc_phat(event_count=500, clip_path="gunshotaudio/1.wav", segment=4096, noise_std=0.002, upsample=4, seed=0):
+    rng = np.random.default_rng(seed)
+    sensors, exactTimes, sources = simulate_events(event_count, seed)
+
+    # imported here, airsim_gunshot_detection needs winsound and keyboard that the other benchmarks don't
+    from airsim_gunshot_detection import get_classifier
+    clip = get_classifier().load_waveform(clip_path)
+    onset = int(np.argmax(np.abs(clip) >= 0.3 * np.abs(clip).max()))
+    clip = clip[max(0, onset - 256):]
+    recordings = np.stack([np.stack(synthesize_sensor_signals(clip, eventSensors, source, noise_std, rng))[:, :segment]
+                           for eventSensors, source in zip(sensors, sources)])
+
+    # sounds can't arrive further apart than the sensors are
+    maxDelay = (np.linalg.norm(drone_positions[0] - drone_positions[1]) + 2 * drift * 3 + 1) / SPEED_OF_SOUND_MPS
+
+    start = time.perf_counter()
+    for eventRecordings in recordings[:50]:
+        estimate_arrival_times(eventRecordings, max_delay=maxDelay, upsample=upsample)
+    loopRate = 50 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    times = estimate_arrival_times_batch(recordings, max_delay=maxDelay, upsample=upsample)
+    batchRate = event_count / (time.perf_counter() - start)
+
+    exactTimes = exactTimes - exactTimes.min(axis=1, keepdims=True)
+    timingError = np.abs(times - exactTimes)
+    positions = solve_tdoa_batch(sensors, times)
+    solved = np.isfinite(positions).all(axis=1)
+    error = np.linalg.norm(positions[solved] - sources[solved], axis=1)
+
+    print(f"GCC-PHAT with {sensors.shape[1]} sensors, {segment} samples: {loopRate:,.0f} events/s one at a time, "
+          f"{batchRate:,.0f} events/s batched")
+    print(f"Timing error median {np.median(timingError)*1e6:.2f} us, max {timingError.max()*1e6:.1f} us. "
+          f"Localization error median {np.median(error):.2f} m, {np.mean(error > 5):.1%} over 5 m")
+    return batchRate
+
+# scheduling many gunshots against blocking on each one. classify_time stands in for a YAMNet call, rpc_delay for the
+# simulator round trip. The old way slept until the sound arrived and classified inline, shot after shot
+def benchmark_scheduler(shot_count=500, spread=2.0, rpc_delay=0.002, classify_time=0.05, classify_workers=4, seed=0):
+    rng = np.random.default_rng(seed)
+    client = FakeMultirotorClient(rpc_delay=rpc_delay, vehicle_positions={'' : (0.0, 0.0, -20.0)})
+    positions = [Vector3r(*position) for position in np.column_stack([rng.uniform(-source_range, source_range, size=(shot_count, 2)), np.full(shot_count, -3.0)]).tolist()]
+    classify = lambda audio_path: (time.sleep(classify_time), ([], 0.5))[1]
+
+    # blocking: rpcs, the sound travel time and classification for every shot in turn
+    blockingShots = 10
+    start = time.perf_counter()
+    for pos in positions[:blockingShots]:
+        client.simSpawnObject("GunshotLight", "GunshotLightBase2", Pose(position_val=pos), Vector3r(1, 1, 1), False, True)
+        dist = pos.distance_to(client.simGetVehiclePose().position)
+        time.sleep(dist / SPEED_OF_SOUND_MPS)
+        classify(None)
+    blockingPerShot = (time.perf_counter() - start) / blockingShots
+
+    with GunshotScheduler(client, ["gunshot.wav"], classify=classify, classify_workers=classify_workers) as scheduler:
+        start = time.perf_counter()
+        for pos, delay in zip(positions, rng.uniform(0, spread, size=shot_count)):
+            scheduler.schedule(pos, delay)
+        callerTime = time.perf_counter() - start
+        scheduler.join()
+        totalTime = time.perf_counter() - start
+        report = scheduler.report(print_report=False)
+
+    print(f"Blocking spawn: caller stalled {blockingPerShot*1000:.1f} ms per shot, {shot_count} shots would take {blockingPerShot*shot_count:.1f} s")
+    print(f"Scheduled: caller stalled {callerTime/shot_count*1e6:.0f} us per shot, {shot_count} shots over {spread} s done in {totalTime:.2f} s, "
+          f"up to {report['max_in_flight']} in flight, fired late by p99 {report['fire_lateness_ms_p99']:.2f} ms")
+    return report
+
+if __name__ == '__main__':
+    benchmark_tdoa()
+    benchmark_streaming()
+    benchmark_sensor_sampling()
+    benchmark_gcc_phat()
+    benchmark_scheduler()
@@ -0,0 +1,199 @@
+# Monte Carlo accuracy benchmark for gunshot localization, run on simulated gunshots so AirSim does not need to be
+# running. Results are saved to a json file and compared against the previous run to catch regressions.
+
+import os
+import json
+import time
+import numpy as np
+from collections import Counter
+from multiprocessing import Pool
+from tdoa import solve_tdoa_batch, simulate_arrival_times, localize_one_by_one
+
+# === Configuration ===
+# drones = drones listening for each gunshot, sensors_per_drone = how many sensorSpots each drone has
+# spot_radius = sensorSpots are sampled within this many meters of the drone center (the real drones use 0.5)
+# noise_std = gaussian timing noise on each sensor in seconds (1e-5 s is about 3.4 mm of sound travel)
+scenarios = [
+    {"name" : "2 drones x 3 sensors, exact",       "drones" : 2, "sensors_per_drone" : 3, "spot_radius" : 0.5, "noise_std" : 0.0},
+    {"name" : "2 drones x 3 sensors, 1us noise",   "drones" : 2, "sensors_per_drone" : 3, "spot_radius" : 0.5, "noise_std" : 1e-6},
+    {"name" : "2 drones x 3 sensors, 10us noise",  "drones" : 2, "sensors_per_drone" : 3, "spot_radius" : 0.5, "noise_std" : 1e-5},
+    {"name" : "3 drones x 3 sensors, 10us noise",  "drones" : 3, "sensors_per_drone" : 3, "spot_radius" : 0.5, "noise_std" : 1e-5},
+    {"name" : "3 drones x 3 sensors, 100us noise", "drones" : 3, "sensors_per_drone" : 3, "spot_radius" : 0.5, "noise_std" : 1e-4},
+    {"name" : "1 drone x 5 sensors, 10us noise",   "drones" : 1, "sensors_per_drone" : 5, "spot_radius" : 0.5, "noise_std" : 1e-5},
+]
+trials = 1_000_000          # trials per scenario for solve_tdoa_batch
+loop_trials = 1_000_000     # trials per scenario for the one-event-at-a-time calcSoundEmitPosition (0 to skip)
+chunk_size = 25_000         # trials per worker task
+drone_area = 20.0           # drones are placed within this many meters of the origin
+drone_heights = (10.0, 25.0)
+source_range = 35.0         # gunshots are spawned within this many meters of the origin, near the ground
+outlier_distance = 5.0      # estimates further than this from the gunshot count as outliers
+results_path = "gunshot_accuracy_results.json"
+seed = 0
+
+# a result is flagged as a regression if it gets this much worse than the previous results file
+throughput_tolerance = 0.2  # fraction of events/s
+error_tolerance = 0.1       # fraction of the error percentile
+rate_tolerance = 0.002      # absolute change of a failure or outlier rate
+
+# random gunshots heard by a random fleet. Every drone in a trial carries the same sensorSpots, like in findGunshotLoop.
+# returns (count, N, 3) sensor positions, (count, N) arrival times with noise and (count, 3) gunshot positions
+def sample_trials(scenario, count, rng):
+    drones = scenario["drones"]
+    sensorsPerDrone = scenario["sensors_per_drone"]
+
+    dronePositions = np.empty((count, drones, 3))
+    dronePositions[:, :, :2] = rng.uniform(-drone_area, drone_area, size=(count, drones, 2))
+    # airsim is NED, so up is negative z
+    dronePositions[:, :, 2] = -rng.uniform(*drone_heights, size=(count, drones))
+
+    sensorSpots = rng.uniform(-scenario["spot_radius"], scenario["spot_radius"], size=(count, 1, sensorsPerDrone, 3))
+    sensors = (dronePositions[:, :, None, :] + sensorSpots).reshape(count, drones * sensorsPerDrone, 3)
+
+    sources = np.empty((count, 3))
+    sources[:, :2] = rng.uniform(-source_range, source_range, size=(count, 2))
+    sources[:, 2] = -rng.uniform(0.0, 2.0, size=count)
+
+    times = simulate_arrival_times(sources, sensors, noise_std=scenario["noise_std"], rng=rng)
+    return sensors, times, sources
+
+# runs one chunk of trials in a worker. returns the errors of the solved trials, failure counts and solver time
+def run_chunk(task):
+    scenario, count, seedSequence, solver = task
+    rng = np.random.default_rng(seedSequence)
+    sensors, times, sources = sample_trials(scenario, count, rng)
+
+    failures = Counter()
+    # two sensors hearing the first sound at the same instant makes a zero range difference (diag(rho) singular)
+    tied = np.sum(times == times.min(axis=1, keepdims=True), axis=1) > 1
+
+    start = time.perf_counter()
+    if solver == "batch":
+        positions = solve_tdoa_batch(sensors, times)
+    else:
+        # relative to the first arrival, like the callers of calcSoundEmitPosition do
+        positions = localize_one_by_one(sensors, times - times.min(axis=1, keepdims=True), failures)
+    elapsed = time.perf_counter() - start
+
+    solved = np.isfinite(positions).all(axis=1)
+    if solver == "batch":
+        failures["zero_range_difference"] += int(np.sum(~solved & tied))
+        failures["singular"] += int(np.sum(~solved & ~tied))
+    else:
+        # calcSoundEmitPosition doesn't always raise on a singular system, sometimes it returns inf/nan instead
+        failures["singular"] += int(np.sum(~solved)) - sum(failures.values())
+
+    errors = np.linalg.norm(positions[solved] - sources[solved], axis=1).astype(np.float32)
+    return errors, failures, elapsed
+
+def summarize(errors, failures, count, solverTime, wallTime):
+    summary = {
+        "trials" : count,
+        "events_per_second" : count / wallTime if wallTime > 0 else 0.0,
+        "events_per_second_per_core" : count / solverTime if solverTime > 0 else 0.0,
+        "failure_rate" : sum(failures.values()) / count,
+        "failures" : {reason : failures[reason] / count for reason in sorted(failures)},
+    }
+    if len(errors) > 0:
+        summary["error_m"] = {
+            "mean" : float(np.mean(errors)),
+            "p50" : float(np.percentile(errors, 50)),
+            "p90" : float(np.percentile(errors, 90)),
+            "p99" : float(np.percentile(errors, 99)),
+            "p99.9" : float(np.percentile(errors, 99.9)),
+            "max" : float(np.max(errors)),
+        }
+        summary["outlier_rate"] = float(np.sum(errors > outlier_distance)) / count
+    return summary
+
+# runs count trials of a scenario with the given solver ("batch" for solve_tdoa_batch, "loop" for calcSoundEmitPosition)
+def run_scenario(pool, scenario, count, solver, seedSequence):
+    chunkCounts = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+    tasks = [(scenario, chunkCount, chunkSeed, solver) for chunkCount, chunkSeed in zip(chunkCounts, seedSequence.spawn(len(chunkCounts)))]
+
+    start = time.perf_counter()
+    errors = []
+    failures = Counter()
+    solverTime = 0.0
+    for chunkErrors, chunkFailures, elapsed in pool.imap_unordered(run_chunk, tasks):
+        errors.append(chunkErrors)
+        failures.update(chunkFailures)
+        solverTime += elapsed
+    wallTime = time.perf_counter() - start
+
+    return summarize(np.concatenate(errors), failures, count, solverTime, wallTime)
+
+def print_summary(name, solver, summary):
+    line = (f"{name:36} {solver:5} {summary['events_per_second']:>12,.0f} events/s  "
+            f"failed {summary['failure_rate']:.2%}")
+    if "error_m" in summary:
+        error = summary["error_m"]
+        line += (f"  error p50 {error['p50']:.2e} p99 {error['p99']:.2e} max {error['max']:.2e} m"
+                 f"  outliers {summary['outlier_rate']:.2%}")
+    print(line)
+
+# prints every metric that got noticeably worse compared to previous results. returns the list of regressions
+def compare_results(previous, current):
+    regressions = []
+    for name, solvers in current["scenarios"].items():
+        for solver, summary in solvers.items():
+            if solver == "config":
+                continue
+            old = previous.get("scenarios", {}).get(name, {}).get(solver)
+            if old is None:
+                continue
+            label = f"{name} [{solver}]"
+
+            if summary["events_per_second_per_core"] < old["events_per_second_per_core"] * (1 - throughput_tolerance):
+                regressions.append(f"{label}: throughput {old['events_per_second_per_core']:,.0f} -> {summary['events_per_second_per_core']:,.0f} events/s per core")
+            for key in ("failure_rate", "outlier_rate"):
+                if key in old and key in summary and summary[key] > old[key] + rate_tolerance:
+                    regressions.append(f"{label}: {key} {old[key]:.3%} -> {summary[key]:.3%}")
+            for percentile in ("p50", "p99"):
+                if "error_m" in old and "error_m" in summary:
+                    before, after = old["error_m"][percentile], summary["error_m"][percentile]
+                    # tiny numerical errors (exact timing) jump around, only flag changes above a micrometer
+                    if after > before * (1 + error_tolerance) and after - before > 1e-6:
+                        regressions.append(f"{label}: {percentile} error {before:.2e} -> {after:.2e} m")
+
+    if regressions:
+        print("Regressions compared to previous results:")
+        for regression in regressions:
+            print(f"  {regression}")
+    else:
+        print("No regressions compared to previous results")
+    return regressions
+
+def run_benchmark(scenarios = scenarios, trials = trials, loop_trials = loop_trials, results_path = results_path, processes = None):
+    seedSequences = np.random.SeedSequence(seed).spawn(len(scenarios))
+
+    results = {
+        "created" : time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cores" : processes or os.cpu_count(),
+        "outlier_distance_m" : outlier_distance,
+        "scenarios" : {},
+    }
+    with Pool(processes) as pool:
+        for scenario, seedSequence in zip(scenarios, seedSequences):
+            batchSeed, loopSeed = seedSequence.spawn(2)
+            solvers = {"batch" : run_scenario(pool, scenario, trials, "batch", batchSeed)}
+            print_summary(scenario["name"], "batch", solvers["batch"])
+            if loop_trials > 0:
+                solvers["loop"] = run_scenario(pool, scenario, loop_trials, "loop", loopSeed)
+                print_summary(scenario["name"], "loop", solvers["loop"])
+
+            results["scenarios"][scenario["name"]] = {**solvers, "config" : scenario}
+
+    if results_path is not None:
+        if os.path.exists(results_path):
+            with open(results_path) as file:
+                compare_results(json.load(file), results)
+        with open(results_path, 'w') as file:
+            json.dump(results, file, indent=1)
+        print(f"Results saved to {results_path}")
+
+    return results
+
+
+if __name__ == '__main__':
+    run_benchmark()
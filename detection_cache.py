@@ -0,0 +1,156 @@
+#this file provides a cache that reuses detections of near-duplicate frames while a drone hovers
+
+import cv2
+import numpy as np
+from collections import OrderedDict
+from yolo import Detections
+
+# 64 bit difference hash of an image: downscale to 9x8 grayscale and compare each pixel with its right neighbour.
+# near-identical frames give hashes only a few bits apart
+def difference_hash(image):
+    gray = image if image.ndim == 2 else cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+# camera pose as a flat array (position xyz followed by orientation quaternion wxyz) from an airsim Pose
+# or a kinematics state (anything with .position and .orientation)
+def pose_to_array(pose):
+    if pose is None:
+        return None
+    return np.array([pose.position.x_val, pose.position.y_val, pose.position.z_val,
+                     pose.orientation.w_val, pose.orientation.x_val, pose.orientation.y_val, pose.orientation.z_val])
+
+
+class CacheEntry:
+    __slots__ = ("frame_hash", "pose", "thumbnail", "detections")
+
+    def __init__(self, frame_hash, pose, thumbnail, detections):
+        self.frame_hash = frame_hash
+        self.pose = pose
+        self.thumbnail = thumbnail
+        self.detections = detections
+
+
+class DetectionCache:
+
+    # capacity = how many frames are remembered before the least recently used one is evicted
+    # max_hash_distance = how many of the 64 hash bits may differ for a frame to count as the same scene
+    # max_position_change = meters the camera may have moved from the cached frame
+    # max_orientation_change = allowed difference of the orientation quaternions (roughly radians/2 for small turns)
+    # motion_compensate = shift reused boxes by the image motion between the cached frame and the new one
+    # thumbnail_size = size of the grayscale thumbnail used to estimate that motion
+    def __init__(self, capacity = 32, max_hash_distance = 4, max_position_change = 0.5, max_orientation_change = 0.02,
+                 motion_compensate = True, thumbnail_size = 128):
+        self.capacity = capacity
+        self.max_hash_distance = max_hash_distance
+        self.max_position_change = max_position_change
+        self.max_orientation_change = max_orientation_change
+        self.motion_compensate = motion_compensate
+        self.thumbnail_size = thumbnail_size
+
+        self.entries = OrderedDict()
+        self.next_key = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.motion_updates = 0
+        self.evictions = 0
+
+    def _thumbnail(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (self.thumbnail_size, self.thumbnail_size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def _pose_matches(self, cached, pose):
+        if cached is None or pose is None:
+            return cached is None and pose is None
+        if np.linalg.norm(cached[:3] - pose[:3]) > self.max_position_change:
+            return False
+        # q and -q are the same rotation
+        return min(np.linalg.norm(cached[3:] - pose[3:]), np.linalg.norm(cached[3:] + pose[3:])) <= self.max_orientation_change
+
+    def _shift_detections(self, entry, thumbnail, image_shape):
+        (dx, dy), response = cv2.phaseCorrelate(entry.thumbnail, thumbnail)
+        height, width = image_shape[:2]
+        shift = np.rint([dx * width / self.thumbnail_size, dy * height / self.thumbnail_size]).astype(np.int32)
+        if not shift.any():
+            return entry.detections
+
+        self.motion_updates += 1
+        array = entry.detections.array.copy()
+        array["box"] += np.array([shift[0], shift[1], shift[0], shift[1]], dtype=np.int32)
+        return Detections(array)
+
+    # returns cached Detections for a frame that matches a remembered one, or None on a miss.
+    # pose = the camera (or vehicle) pose the frame was taken from, or None to match on content only
+    def lookup(self, image, pose = None):
+        frameHash = difference_hash(image)
+        poseArray = pose_to_array(pose)
+
+        for key, entry in reversed(self.entries.items()):
+            if hamming_distance(entry.frame_hash, frameHash) > self.max_hash_distance:
+                continue
+            if not self._pose_matches(entry.pose, poseArray):
+                continue
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if self.motion_compensate:
+                return self._shift_detections(entry, self._thumbnail(image), image.shape)
+            return entry.detections
+
+        self.misses += 1
+        return None
+
+    def store(self, image, detections, pose = None):
+        thumbnail = self._thumbnail(image) if self.motion_compensate else None
+        self.entries[self.next_key] = CacheEntry(difference_hash(image), pose_to_array(pose), thumbnail, detections)
+        self.next_key += 1
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def stats(self):
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "hit_rate" : self.hit_rate,
+            "motion_updates" : self.motion_updates,
+            "evictions" : self.evictions,
+            "size" : len(self.entries),
+        }
+
+
+class CachedDetector:
+    """
+    Wraps a detector so near-duplicate frames reuse earlier detections instead of running predict again
+    """
+
+    def __init__(self, detector, cache = None):
+        self.detector = detector
+        self.cache = cache if cache is not None else DetectionCache()
+
+    def prepare_image(self, image):
+        return self.detector.prepare_image(image)
+
+    def detect(self, image, pose = None):
+        detections = self.cache.lookup(image, pose)
+        if detections is None:
+            detections = self.detector.detect(image)
+            self.cache.store(image, detections, pose)
+        return detections
+
+    def close(self):
+        self.detector.close()
@@ -0,0 +1,315 @@
+#this file provides a threaded capture -> decode -> infer -> display pipeline for the drone cameras
+
+import airsim
+import cv2
+import keyboard
+import threading
+import time
+import numpy as np
+from collections import deque
+from yolo import DetectionRenderer
+from airsim_camera import CameraCapture
+
+class LatestFrameQueue:
+    """
+    Bounded queue with a latest-frame-wins drop policy: putting into a full queue
+    discards the oldest item instead of blocking the producer.
+    """
+
+    def __init__(self, maxsize=1):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns the oldest queued item, or None if the queue was closed or the timeout ran out
+        """
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class PipelineFrame:
+    """
+    A frame travelling through the pipeline together with its timing information
+    """
+    __slots__ = ("frame_id", "capture_time", "data", "image", "detections")
+
+    def __init__(self, frame_id, capture_time, data):
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        self.data = data
+        self.image = None
+        self.detections = None
+
+
+class StageStats:
+    """
+    Running per-stage latency numbers
+    """
+    __slots__ = ("name", "count", "total_time", "max_time")
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total_time += seconds
+        if seconds > self.max_time:
+            self.max_time = seconds
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count > 0 else 0.0
+
+
+class DetectionPipeline:
+
+    STAGES = ("capture", "decode", "infer", "display")
+
+    # client = airsim client (or FakeMultirotorClient) to pull frames from
+    # detector = anything with a detect(image) method returning Detections (YOLODetector, MultiModelDetector)
+    # compressed = capture PNGs through simGetImage and decode them, instead of uncompressed frames through simGetImages
+    # resize = optional (width, height) every decoded frame is resized to before inference
+    # display = whether to draw and show the detections. With display off the pipeline only records the latest detections
+    # show_raw = also show the undecorated camera frame in its own window
+    # queue_size = how many frames each queue keeps before dropping the oldest
+    # max_capture_failures = failed grabs in a row (e.g. a dropped connection) before the pipeline stops itself
+    def __init__(self, client, detector, camera_name = "bottom_center", vehicle_name = "", compressed = False, resize = None,
+                 display = True, show_raw = False, queue_size = 1, renderer = None, max_capture_failures = 20):
+        self.client = client
+        self.detector = detector
+        self.camera_name = camera_name
+        self.vehicle_name = vehicle_name
+        self.compressed = compressed
+        self.capture = CameraCapture(client, [(camera_name, vehicle_name)])
+        self.resize = resize
+        self.display = display
+        self.show_raw = show_raw
+        self.renderer = renderer if renderer is not None else DetectionRenderer()
+        self.max_capture_failures = max_capture_failures
+
+        self.raw_window = "Bottom Camera View"
+        self.detection_window = "Detection Results"
+
+        self.decode_queue = LatestFrameQueue(queue_size)
+        self.infer_queue = LatestFrameQueue(queue_size)
+        self.display_queue = LatestFrameQueue(queue_size)
+
+        self.stats = {name : StageStats(name) for name in self.STAGES}
+        self.end_to_end = StageStats("end_to_end")
+
+        self.latest = None
+        self.stop_flag = threading.Event()
+        self.threads = []
+        self.start_time = None
+        self.stop_time = None
+
+    # --- stages ---
+
+    def _capture_loop(self):
+        frame_id = 0
+        failures = 0
+        while not self.stop_flag.is_set():
+            start = time.perf_counter()
+            try:
+                if self.compressed:
+                    rawImage = self.client.simGetImage(self.camera_name, airsim.ImageType.Scene, vehicle_name=self.vehicle_name)
+                else:
+                    rawImage = self.capture.grabOne()
+            except Exception as e:
+                print(f"Error in capture stage: {str(e)}")
+                rawImage = None
+            if rawImage is None or len(rawImage) == 0:
+                failures += 1
+                if failures == 1:
+                    print("Failed to get image")
+                if failures >= self.max_capture_failures:
+                    print(f"Failed to get an image {failures} times in a row, stopping")
+                    self.stop_flag.set()
+                    break
+                # back off so a dropped connection doesn't spin a core: 0.05 s doubling up to 1 s
+                self.stop_flag.wait(min(0.05 * 2 ** (failures - 1), 1.0))
+                continue
+            failures = 0
+            self.stats["capture"].add(time.perf_counter() - start)
+
+            frame = PipelineFrame(frame_id, start, rawImage)
+            if not self.compressed:
+                # uncompressed frames arrive as images already, the decode stage only resizes them
+                frame.image = rawImage
+                frame.data = None
+            self.decode_queue.put(frame)
+            frame_id += 1
+        self.decode_queue.close()
+
+    def _decode(self, frame):
+        image = frame.image
+        if image is None:
+            # np.frombuffer is what airsim.string_to_uint8_array does, without the extra call
+            image = cv2.imdecode(np.frombuffer(frame.data, np.uint8), cv2.IMREAD_UNCHANGED)
+            if image is None:
+                print("Failed to decode image")
+                return None
+        if self.resize is not None:
+            image = cv2.resize(image, self.resize)
+        frame.image = image
+        frame.data = None
+        return frame
+
+    def _infer(self, frame):
+        frame.detections = self.detector.detect(frame.image)
+        return frame
+
+    def _stage_loop(self, name, process, in_queue, out_queue):
+        while True:
+            frame = in_queue.get()
+            if frame is None:
+                break
+            start = time.perf_counter()
+            try:
+                frame = process(frame)
+            except Exception as e:
+                print(f"Error in {name} stage: {str(e)}")
+                continue
+            if frame is None:
+                continue
+            self.stats[name].add(time.perf_counter() - start)
+            out_queue.put(frame)
+        out_queue.close()
+
+    def _show(self, frame):
+        """
+        Show a finished frame. Returns False once the user asked to stop
+        """
+        if self.show_raw:
+            cv2.imshow(self.raw_window, frame.image)
+
+        detection_image = self.renderer.render(frame.image, frame.detections, copy=self.show_raw)
+        cv2.imshow(self.detection_window, detection_image)
+
+        # Check if windows are closed
+        if cv2.getWindowProperty(self.detection_window, cv2.WND_PROP_VISIBLE) < 1 or \
+           (self.show_raw and cv2.getWindowProperty(self.raw_window, cv2.WND_PROP_VISIBLE) < 1):
+            return False
+
+        key = cv2.waitKey(1) & 0xFF
+        return key != 27
+
+    # --- control ---
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._stage_loop, args=("decode", self._decode, self.decode_queue, self.infer_queue), daemon=True),
+            threading.Thread(target=self._stage_loop, args=("infer", self._infer, self.infer_queue, self.display_queue), daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_flag.set()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        if self.stop_time is None:
+            self.stop_time = time.perf_counter()
+
+    # runs the pipeline, doing the display stage on the calling thread (OpenCV windows want to live on one thread)
+    # stops on ESC, when a window is closed, when stop_event is set or after max_frames/duration if given
+    def run(self, stop_event = None, max_frames = None, duration = None):
+        self.start()
+        try:
+            while not self.stop_flag.is_set():
+                if stop_event is not None and stop_event.is_set():
+                    break
+                if duration is not None and time.perf_counter() - self.start_time > duration:
+                    break
+                if max_frames is not None and self.end_to_end.count >= max_frames:
+                    break
+                if keyboard.is_pressed('esc'):
+                    break
+
+                frame = self.display_queue.get(timeout=0.1)
+                if frame is None:
+                    if self.display_queue.closed:
+                        break
+                    continue
+
+                start = time.perf_counter()
+                keep_running = self._show(frame) if self.display else True
+                self.stats["display"].add(time.perf_counter() - start)
+
+                self.latest = frame
+                self.end_to_end.add(time.perf_counter() - frame.capture_time)
+
+                if not keep_running:
+                    break
+        finally:
+            self.stop()
+            if self.display:
+                cv2.destroyAllWindows()
+
+        return self.report()
+
+    @property
+    def fps(self):
+        end = self.stop_time if self.stop_time is not None else time.perf_counter()
+        elapsed = end - self.start_time if self.start_time is not None else 0.0
+        return self.end_to_end.count / elapsed if elapsed > 0 else 0.0
+
+    def report(self, print_report = True):
+        """
+        Per-stage mean latency (ms), end-to-end latency and FPS, and how many frames each queue dropped
+        """
+        report = {f"{name}_ms" : stats.mean_time * 1000 for name, stats in self.stats.items()}
+        report["end_to_end_ms"] = self.end_to_end.mean_time * 1000
+        report["frames"] = self.end_to_end.count
+        report["fps"] = self.fps
+        report["dropped"] = {
+            "decode" : self.decode_queue.dropped,
+            "infer" : self.infer_queue.dropped,
+            "display" : self.display_queue.dropped,
+        }
+
+        if print_report:
+            stage_text = ", ".join([f"{name} {report[f'{name}_ms']:.1f} ms" for name in self.STAGES])
+            print(f"Pipeline: {report['frames']} frames at {report['fps']:.1f} FPS, end-to-end {report['end_to_end_ms']:.1f} ms")
+            print(f"  stage latency: {stage_text}")
+            print(f"  dropped frames: {report['dropped']}")
+
+        return report
+
+
+if __name__ == '__main__':
+    # runs the pipeline against frames from disk so it can be timed without the simulator
+    from airsim_fake_client import FakeMultirotorClient
+    from yolo import MultiModelDetector
+
+    client = FakeMultirotorClient(rpc_delay=0.02)
+    detector = MultiModelDetector(["./model/best_pool.pt", "./model/best_car.pt"])
+    pipeline = DetectionPipeline(client, detector, resize=(1024, 1024), display=False)
+    pipeline.run(duration=20)
+    detector.close()
@@ -0,0 +1,149 @@
+# this file provides a scheduler that runs one batched detector over the cameras of many drones
+
+import time
+import threading
+import airsim
+from airsim_camera import CameraCapture
+
+class DroneDetectionResult:
+    """
+    Latest detections for one drone
+    """
+    __slots__ = ("vehicle_name", "detections", "image", "capture_time", "frame_count")
+
+    def __init__(self, vehicle_name):
+        self.vehicle_name = vehicle_name
+        self.detections = None
+        self.image = None
+        self.capture_time = None
+        self.frame_count = 0
+
+
+class MultiDroneDetectionScheduler:
+
+    # client = airsim client used to grab frames (its own client if it runs on a thread, see Drone)
+    # drones = list of Drone objects (anything with a vehicleName) to run detection for
+    # detector = anything with detect_batch(images) -> list of Detections (MultiModelDetector, YOLODetector, RemoteDetector)
+    # batch_size = how many drones' frames go into each inference call
+    # keep_images = keep the last frame of each drone in its result (for display)
+    # max_idle_backoff = longest wait (seconds) between batches while no drone returns a frame
+    def __init__(self, client : airsim.MultirotorClient, drones, detector, batch_size = 4, camera_name = "bottom_center", keep_images = False, max_idle_backoff = 1.0):
+        self.client = client
+        self.drones = list(drones)
+        self.detector = detector
+        self.batch_size = max(1, batch_size)
+        self.keep_images = keep_images
+        self.max_idle_backoff = max_idle_backoff
+
+        self.captures = {drone.vehicleName : CameraCapture(client, [(camera_name, drone.vehicleName)]) for drone in self.drones}
+        self.results = {drone.vehicleName : DroneDetectionResult(drone.vehicleName) for drone in self.drones}
+
+        # drone that is included in every batch, e.g. the one currently being controlled
+        self.priority_drone = None
+        # where round-robin picks up for the next batch
+        self.next_index = 0
+
+        self.batch_count = 0
+        self.frame_count = 0
+        self.start_time = None
+        self.stop_flag = threading.Event()
+
+    # drone can be any object with a vehicleName (e.g. the Drone passed to keyboard controller swap listeners). None clears it
+    def setPriorityDrone(self, drone):
+        if drone is None:
+            self.priority_drone = None
+            return
+        self.priority_drone = next((scheduled for scheduled in self.drones if scheduled.vehicleName == drone.vehicleName), None)
+
+    # drones for the next batch: the priority drone always, then the others in round-robin order so every drone gets served
+    def nextBatch(self):
+        batch = []
+        if self.priority_drone is not None and self.priority_drone.vehicleName in self.results:
+            batch.append(self.priority_drone)
+
+        others = [drone for drone in self.drones if drone not in batch]
+        slots = min(self.batch_size - len(batch), len(others))
+        for i in range(slots):
+            batch.append(others[(self.next_index + i) % len(others)])
+        if others:
+            self.next_index = (self.next_index + slots) % len(others)
+
+        return batch
+
+    # grabs a frame from each drone in the next batch, runs one batched inference and stores the per-drone results.
+    # returns {vehicle name : Detections} for the drones in this batch
+    def step(self):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+        drones = []
+        images = []
+        captureTimes = []
+        for drone in self.nextBatch():
+            captureTime = time.perf_counter()
+            image = self.captures[drone.vehicleName].grabOne()
+            if image is None:
+                continue
+            drones.append(drone)
+            images.append(image)
+            captureTimes.append(captureTime)
+
+        if not images:
+            return {}
+
+        detectionsList = self.detector.detect_batch(images)
+
+        batchResults = {}
+        for drone, image, captureTime, detections in zip(drones, images, captureTimes, detectionsList):
+            result = self.results[drone.vehicleName]
+            result.detections = detections
+            result.capture_time = captureTime
+            result.image = image if self.keep_images else None
+            result.frame_count += 1
+            batchResults[drone.vehicleName] = detections
+
+        self.batch_count += 1
+        self.frame_count += len(images)
+        return batchResults
+
+    def run(self, stop_event = None, duration = None):
+        self.start_time = time.perf_counter()
+        # batches in a row where every grab failed (simulator gone or still loading)
+        emptyBatches = 0
+        while not self.stop_flag.is_set():
+            if stop_event is not None and stop_event.is_set():
+                break
+            if duration is not None and time.perf_counter() - self.start_time > duration:
+                break
+            if self.step():
+                emptyBatches = 0
+                continue
+            emptyBatches += 1
+            if emptyBatches == 1:
+                print("No drone returned a frame, backing off")
+            # wait longer each time instead of spinning on failing RPCs
+            self.stop_flag.wait(min(0.05 * 2 ** (emptyBatches - 1), self.max_idle_backoff))
+        return self.report()
+
+    # runs the scheduler on a background thread. returns the thread
+    def start(self):
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_flag.set()
+
+    def report(self, print_report = True):
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        report = {
+            "frames" : self.frame_count,
+            "batches" : self.batch_count,
+            "fps" : self.frame_count / elapsed if elapsed > 0 else 0.0,
+            "per_drone_fps" : {name : result.frame_count / elapsed if elapsed > 0 else 0.0 for name, result in self.results.items()},
+        }
+        if print_report:
+            print(f"Scheduler: {report['frames']} frames in {report['batches']} batches, {report['fps']:.1f} FPS total")
+            for name, fps in report["per_drone_fps"].items():
+                print(f"  {name}: {fps:.1f} FPS")
+        return report
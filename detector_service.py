@@ -0,0 +1,236 @@
+# this file provides a detector service that keeps YOLO models loaded in one process, so detection scripts don't reload the weights
+# on every launch. start it with `python detector_service.py` or start_service_process, then use get_detector(model_paths)
+
+import os
+import secrets
+import threading
+import time
+import numpy as np
+from multiprocessing import Process, AuthenticationError
+from multiprocessing.connection import Listener, Client
+from yolo import YOLODetector, MultiModelDetector, Detections
+
+DEFAULT_ADDRESS = ("localhost", 6001)
+AUTHKEY_ENV = "DRONESIM_DETECTOR_AUTHKEY"
+
+# models loaded when the service is started from the command line
+DEFAULT_MODEL_PATHS = [
+    "./model/best_pool.pt",
+    "./model/best_car.pt",
+]
+
+# key the service and its clients authenticate with. Requests are pickled, so anyone holding the key can run code in
+# the service: it's read from DRONESIM_DETECTOR_AUTHKEY, or generated for this session and put in the environment so
+# processes started from here (start_service_process, os.system launches) share it
+def get_authkey():
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        key = secrets.token_hex(32)
+        os.environ[AUTHKEY_ENV] = key
+    return key.encode()
+
+class DetectorService:
+
+    def __init__(self, address = DEFAULT_ADDRESS, device = "cuda", warmup_size = (640, 640)):
+        self.address = address
+        self.device = device
+        self.warmup_size = warmup_size
+
+        # tuple of model paths -> (MultiModelDetector, lock). The lock keeps one inference per model set at a time
+        self.detectors = {}
+        self.detectors_lock = threading.Lock()
+
+        self.listener = None
+        self.running = False
+        self.request_count = 0
+
+    def get_detector(self, model_paths):
+        """
+        Returns the loaded detector for a set of model paths, loading and warming it up the first time it's asked for
+        """
+        key = tuple(model_paths)
+        with self.detectors_lock:
+            if key not in self.detectors:
+                start = time.perf_counter()
+                detector = MultiModelDetector(list(key), device=self.device)
+                # first inference builds CUDA kernels and allocates buffers, do it now rather than on the first real frame
+                detector.detect(np.zeros((self.warmup_size[1], self.warmup_size[0], 3), np.uint8))
+                self.detectors[key] = (detector, threading.Lock())
+                print(f"Detector service loaded {list(key)} in {time.perf_counter() - start:.1f} s")
+            return self.detectors[key]
+
+    def detect(self, model_paths, image):
+        detector, lock = self.get_detector(model_paths)
+        with lock:
+            detections = detector.detect(image)
+        # mapped class ids only mean something inside this process, so the names travel with them
+        return detections.array, YOLODetector.mapped_class_names
+
+    def detect_batch(self, model_paths, images):
+        detector, lock = self.get_detector(model_paths)
+        with lock:
+            detections_list = detector.detect_batch(images)
+        return [detections.array for detections in detections_list], YOLODetector.mapped_class_names
+
+    def _handle_connection(self, conn):
+        try:
+            while self.running:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    break
+
+                command = request[0]
+                try:
+                    if command == "detect":
+                        reply = self.detect(request[1], request[2])
+                    elif command == "detect_batch":
+                        reply = self.detect_batch(request[1], request[2])
+                    elif command == "load":
+                        self.get_detector(request[1])
+                        reply = None
+                    elif command == "ping":
+                        reply = "pong"
+                    elif command == "shutdown":
+                        conn.send(("ok", None))
+                        self.stop()
+                        break
+                    else:
+                        raise ValueError(f"Unknown detector service command {command}")
+                    self.request_count += 1
+                    conn.send(("ok", reply))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+        finally:
+            conn.close()
+
+    def serve_forever(self, preload_model_paths = None):
+        if preload_model_paths:
+            self.get_detector(preload_model_paths)
+
+        self.listener = Listener(self.address, authkey=get_authkey())
+        self.running = True
+        print(f"Detector service listening on {self.address}")
+
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError:
+                continue
+            if not self.running:
+                conn.close()
+                break
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+        self.listener.close()
+        for detector, lock in self.detectors.values():
+            detector.close()
+        print("Detector service stopped")
+
+    def stop(self):
+        self.running = False
+        # closing the listener doesn't interrupt a blocking accept() on every platform, so wake it with a connection
+        try:
+            Client(self.address, authkey=get_authkey()).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass
+
+
+class RemoteDetector:
+    """
+    Client side of the detector service. Has the same detect(image) -> Detections interface as
+    YOLODetector and MultiModelDetector, so it can be used anywhere they are.
+    """
+
+    def __init__(self, model_paths, address = DEFAULT_ADDRESS):
+        self.model_paths = list(model_paths)
+        self.address = address
+        self.conn = Client(address, authkey=get_authkey())
+        try:
+            self._call("load", self.model_paths)
+        except BaseException:
+            self.conn.close()
+            raise
+
+    def _call(self, *request):
+        self.conn.send(request)
+        status, reply = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Detector service error: {reply}")
+        return reply
+
+    @staticmethod
+    def prepare_image(image):
+        return YOLODetector.prepare_image(image)
+
+    @staticmethod
+    def _to_local_detections(array, class_names):
+        if len(array) > 0:
+            # translate the service's class ids into this process's ids
+            local_ids = np.array([YOLODetector.get_mapped_class_id(name) for name in class_names], dtype=np.int16)
+            array["class_id"] = local_ids[array["class_id"]]
+        return Detections(array)
+
+    def detect(self, image):
+        array, class_names = self._call("detect", self.model_paths, self.prepare_image(image))
+        return self._to_local_detections(array, class_names)
+
+    def detect_batch(self, images):
+        arrays, class_names = self._call("detect_batch", self.model_paths, [self.prepare_image(image) for image in images])
+        return [self._to_local_detections(array, class_names) for array in arrays]
+
+    def close(self):
+        self.conn.close()
+
+
+def is_service_running(address = DEFAULT_ADDRESS):
+    try:
+        conn = Client(address, authkey=get_authkey())
+    except (OSError, EOFError, AuthenticationError):
+        return False
+    conn.close()
+    return True
+
+def run_service(model_paths = DEFAULT_MODEL_PATHS, address = DEFAULT_ADDRESS, device = "cuda"):
+    DetectorService(address, device).serve_forever(model_paths)
+
+# starts the service in its own process (unless one is already running) and waits until it accepts connections.
+# returns the Process, or None if a service was already running
+def start_service_process(model_paths = DEFAULT_MODEL_PATHS, address = DEFAULT_ADDRESS, device = "cuda", timeout = 120):
+    if is_service_running(address):
+        return None
+
+    get_authkey()
+    process = Process(target=run_service, args=(model_paths, address, device), daemon=True)
+    process.start()
+
+    start = time.time()
+    while not is_service_running(address):
+        if not process.is_alive():
+            raise RuntimeError("Detector service process exited before it started listening")
+        if time.time() - start > timeout:
+            raise TimeoutError("Detector service did not start in time")
+        time.sleep(0.2)
+    return process
+
+def stop_service(address = DEFAULT_ADDRESS):
+    conn = Client(address, authkey=get_authkey())
+    conn.send(("shutdown",))
+    conn.recv()
+    conn.close()
+
+# returns a detector for the given models: the shared service if it's running, otherwise models loaded in this process.
+# a service that can't be reached, has a different key or drops the connection (ConnectionError is an OSError) counts as not running
+def get_detector(model_paths, address = DEFAULT_ADDRESS, device = "cuda"):
+    try:
+        return RemoteDetector(model_paths, address)
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"Detector service not available ({type(e).__name__}), loading models locally")
+        return MultiModelDetector(model_paths, device=device)
+
+
+if __name__ == '__main__':
+    if not os.environ.get(AUTHKEY_ENV):
+        print(f"{AUTHKEY_ENV} is not set, using a key for this session only. Set it here and in the detection "
+              f"scripts' environment to share the service between terminals")
+    run_service()
@@ -0,0 +1,65 @@
+#this file runs a DualInputModel exported with model.export_model using only numpy and onnxruntime or torch
+
+import json
+import numpy as np
+
+class DualInputRuntime:
+
+    # path = exported .onnx or .pt file, with its metadata in <path>.json
+    # threads = CPU threads for inference (None for the library default)
+    def __init__(self, path, threads = None):
+        with open(path + ".json", "r") as f:
+            self.metadata = json.load(f)
+        self.format = self.metadata["format"]
+        self.input_names = self.metadata["input_names"]
+        self.image_size = self.metadata["image_size"]
+        self.mean = np.array(self.metadata["mean"], dtype=np.float32).reshape(1, 3, 1, 1)
+        self.std = np.array(self.metadata["std"], dtype=np.float32).reshape(1, 3, 1, 1)
+
+        if self.format == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if threads is not None:
+                options.intra_op_num_threads = threads
+            self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        elif self.format == "torchscript":
+            import torch
+            if threads is not None:
+                torch.set_num_threads(threads)
+            self.torch = torch
+            self.module = torch.jit.load(path, map_location="cpu").eval()
+        else:
+            raise ValueError(f"Unknown export format {self.format}")
+
+    # uint8 images, [H, W, 3] or [B, H, W, 3] already at image_size, to normalized float32 [B, 3, H, W]
+    def preprocess(self, images):
+        images = np.asarray(images)
+        if images.ndim == 3:
+            images = images[None]
+        if images.shape[1:3] != (self.image_size, self.image_size):
+            raise ValueError(f"Images must be {self.image_size}x{self.image_size}, got {images.shape[1]}x{images.shape[2]}")
+        images = images.transpose(0, 3, 1, 2).astype(np.float32) / 255
+        return (images - self.mean) / self.std
+
+    # reads an image file and resizes it to image_size
+    def load_image(self, path):
+        from PIL import Image
+        with Image.open(path) as image:
+            return np.asarray(image.convert("RGB").resize((self.image_size, self.image_size), Image.BILINEAR))
+
+    # logits for one batch of each input. inputs = preprocessed float32 [B, 3, H, W] arrays, in input order
+    def run(self, *inputs):
+        if len(inputs) != len(self.input_names):
+            raise ValueError(f"Model takes {len(self.input_names)} inputs, got {len(inputs)}")
+        if self.format == "onnx":
+            feed = {name : np.ascontiguousarray(x, dtype=np.float32) for name, x in zip(self.input_names, inputs)}
+            return self.session.run(["logits"], feed)[0]
+        with self.torch.inference_mode():
+            return self.module(*[self.torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)) for x in inputs]).numpy()
+
+    # class probabilities for uint8 images (one per input, or a batch of them per input)
+    def predict(self, *images):
+        logits = self.run(*[self.preprocess(image) for image in images])
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
@@ -0,0 +1,174 @@
+# this file provides a cache of vehicle state and GPS that one background thread keeps fresh, so loops don't each make their own RPCs
+
+import time
+import threading
+import airsim
+
+class VehicleState:
+    """
+    One vehicle's state from a single poll. state is the airsim MultirotorState, gps the GpsData (None if they aren't polled)
+    """
+    __slots__ = ("vehicle_name", "state", "gps", "timestamp")
+
+    def __init__(self, vehicle_name, state, gps, timestamp):
+        self.vehicle_name = vehicle_name
+        self.state = state
+        self.gps = gps
+        # time.monotonic() when this was polled
+        self.timestamp = timestamp
+
+    @property
+    def position(self):
+        return self.state.kinematics_estimated.position
+
+    @property
+    def velocity(self):
+        return self.state.kinematics_estimated.linear_velocity
+
+    @property
+    def orientation(self):
+        return self.state.kinematics_estimated.orientation
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+class FleetState:
+    """
+    Every vehicle's state from one poll of the fleet. Never modified after it's made, so readers don't need a lock
+    """
+    __slots__ = ("vehicles", "tick", "timestamp")
+
+    def __init__(self, vehicles, tick, timestamp):
+        self.vehicles = vehicles
+        self.tick = tick
+        self.timestamp = timestamp
+
+    def __getitem__(self, vehicle_name):
+        return self.vehicles[vehicle_name]
+
+    def __contains__(self, vehicle_name):
+        return vehicle_name in self.vehicles
+
+
+class FleetStateCache:
+
+    # client = airsim client used only by the poller thread, give the cache its own connection (see Drone)
+    # vehicle_names = vehicles to poll ('' is the default vehicle)
+    # rate = polls per second. Set it to how often the consumer reads, polling faster only spends RPCs nobody reads
+    # poll_state = poll getMultirotorState (one RPC per vehicle per poll)
+    # poll_gps = poll getGpsData (one RPC per vehicle per poll)
+    def __init__(self, client : airsim.MultirotorClient, vehicle_names, rate = 60, poll_state = True, poll_gps = True):
+        if not poll_state and not poll_gps:
+            raise ValueError("FleetStateCache needs poll_state or poll_gps")
+        self.client = client
+        self.vehicle_names = list(vehicle_names)
+        self.interval = 1 / rate
+        self.poll_state = poll_state
+        self.poll_gps = poll_gps
+
+        # replaced as a whole on every poll. Swapping the reference is atomic, so reads never see a half-updated fleet
+        self.fleet = None
+        self.updated = threading.Condition()
+
+        self.rpc_count = 0
+        self.read_count = 0
+        self.start_time = None
+        self.stop_flag = threading.Event()
+        self.thread = None
+        # exception of the last failed poll, reported if the first poll never arrives
+        self.last_error = None
+
+    def poll(self):
+        vehicles = {}
+        for name in self.vehicle_names:
+            state = self.client.getMultirotorState(vehicle_name=name) if self.poll_state else None
+            gps = self.client.getGpsData(vehicle_name=name) if self.poll_gps else None
+            vehicles[name] = VehicleState(name, state, gps, time.monotonic())
+        self.rpc_count += len(self.vehicle_names) * (int(self.poll_state) + int(self.poll_gps))
+
+        tick = self.fleet.tick + 1 if self.fleet is not None else 0
+        with self.updated:
+            self.fleet = FleetState(vehicles, tick, time.monotonic())
+            self.updated.notify_all()
+
+    def _run(self):
+        nextPoll = time.monotonic()
+        while not self.stop_flag.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.last_error = e
+                print(f"Fleet state poll failed: {e}")
+            nextPoll += self.interval
+            # if a poll took longer than the interval, carry on from now instead of trying to catch up
+            nextPoll = max(nextPoll, time.monotonic())
+            self.stop_flag.wait(nextPoll - time.monotonic())
+
+    # starts polling on a background thread and waits for the first poll so reads can start right away.
+    # raises TimeoutError (and stops polling) if no poll succeeds within timeout seconds
+    def start(self, timeout = 5):
+        self.start_time = time.monotonic()
+        self.stop_flag.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if self.waitForUpdate(timeout=timeout) is None:
+            self.stop()
+            reason = f": {self.last_error}" if self.last_error is not None else ""
+            raise TimeoutError(f"FleetStateCache got no state for {self.vehicle_names} within {timeout} s{reason}")
+        return self
+
+    def stop(self):
+        self.stop_flag.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # blocks until a poll newer than after_tick arrives. returns the FleetState (None on timeout)
+    def waitForUpdate(self, after_tick = -1, timeout = None):
+        with self.updated:
+            self.updated.wait_for(lambda: self.fleet is not None and self.fleet.tick > after_tick, timeout)
+        return self.fleet
+
+    # latest FleetState. Hold on to it to read several vehicles from the same poll
+    def snapshot(self):
+        self.read_count += 1
+        return self.fleet
+
+    def get(self, vehicle_name = ''):
+        self.read_count += 1
+        return self.fleet[vehicle_name]
+
+    # the MultirotorState of a vehicle, as getMultirotorState would return it
+    def getMultirotorState(self, vehicle_name = ''):
+        state = self.get(vehicle_name).state
+        if state is None:
+            raise ValueError("FleetStateCache was created with poll_state=False")
+        return state
+
+    def getGpsData(self, vehicle_name = ''):
+        gps = self.get(vehicle_name).gps
+        if gps is None:
+            raise ValueError("FleetStateCache was created with poll_gps=False")
+        return gps
+
+    # every read would otherwise have been at least one RPC of its own
+    def report(self, print_report = True):
+        elapsed = time.monotonic() - self.start_time if self.start_time is not None else 0.0
+        report = {
+            "polls" : self.fleet.tick + 1 if self.fleet is not None else 0,
+            "rpcs" : self.rpc_count,
+            "reads" : self.read_count,
+            "rpcs_saved_per_second" : (self.read_count - self.rpc_count) / elapsed if elapsed > 0 else 0.0,
+        }
+        if print_report:
+            print(f"Fleet state cache: {report['reads']} reads served by {report['rpcs']} RPCs "
+                  f"({report['rpcs_saved_per_second']:.1f} RPCs saved per second)")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
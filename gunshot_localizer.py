@@ -0,0 +1,351 @@
+# this file provides a streaming gunshot localizer that groups sensor arrival times into gunshot events and solves
+# them as they come in, and a dispatcher that sends drones to the results
+
+import time
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from airsim import Vector3r
+from tdoa import solve_tdoa_batch, SPEED_OF_SOUND_MPS
+
+class SensorArrival:
+    """
+    One sensor hearing a sound. sensor_id is anything hashable that names the sensor, e.g. (vehicle name, sensor index)
+    """
+    __slots__ = ("sensor_id", "position", "time", "received")
+
+    def __init__(self, sensor_id, position, time):
+        self.sensor_id = sensor_id
+        self.position = np.asarray(position, dtype=np.float64)
+        self.time = time
+        # when the localizer got this arrival, for measuring latency
+        self.received = None
+
+
+class GunshotEstimate:
+    """
+    Estimated position of one gunshot. Estimates are published again as more sensors hear the event,
+    final is True for the last one
+    """
+    __slots__ = ("event_id", "position", "sensor_count", "first_arrival_time", "latency", "final")
+
+    def __init__(self, event_id, position, sensor_count, first_arrival_time, latency, final):
+        self.event_id = event_id
+        self.position = position
+        self.sensor_count = sensor_count
+        self.first_arrival_time = first_arrival_time
+        self.latency = latency
+        self.final = final
+
+    def toVector3r(self):
+        return Vector3r(*self.position.tolist())
+
+    def __repr__(self):
+        return (f"GunshotEstimate(event={self.event_id}, position={np.round(self.position, 2).tolist()}, "
+                f"sensors={self.sensor_count}, latency={self.latency*1000:.2f} ms, final={self.final})")
+
+
+class GunshotEvent:
+    __slots__ = ("event_id", "arrivals", "sensor_ids", "positions", "times", "estimate", "emit_time")
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.arrivals = []
+        self.sensor_ids = set()
+        self.positions = []
+        self.times = []
+        self.estimate = None
+        # when the gunshot was fired according to the estimate
+        self.emit_time = None
+
+    @property
+    def first_arrival_time(self):
+        return min(self.times)
+
+    # an arrival fits this event if its sensor hasn't heard the event yet and its time difference to every arrival
+    # already in the event could be a real time difference of arrival
+    def accepts(self, arrival, medium_speed, tolerance):
+        if arrival.sensor_id in self.sensor_ids:
+            return False
+        distances = np.linalg.norm(np.asarray(self.positions) - arrival.position, axis=1)
+        return bool(np.all(np.abs(np.asarray(self.times) - arrival.time) <= distances / medium_speed + tolerance))
+
+    # seconds between an arrival and when the sound of this event should have reached that sensor. None if the arrival
+    # can't belong to the event, inf if the event isn't solved yet (any arrival that passes accepts fits it equally)
+    def residual(self, arrival, medium_speed, tolerance):
+        if not self.accepts(arrival, medium_speed, tolerance):
+            return None
+        if self.estimate is None:
+            return float("inf")
+        return abs(arrival.time - self.emit_time - np.linalg.norm(arrival.position - self.estimate) / medium_speed)
+
+    # largest difference in seconds between when a sensor heard the event and when a sound fired from position at the
+    # best fitting time would have reached it. Arrivals from different gunshots grouped together give a large one
+    def maxResidual(self, position, medium_speed):
+        travelTimes = np.linalg.norm(np.asarray(self.positions) - position, axis=1) / medium_speed
+        emitTimes = np.asarray(self.times) - travelTimes
+        return float(np.max(np.abs(emitTimes - np.mean(emitTimes))))
+
+    def setEstimate(self, position, medium_speed):
+        self.estimate = position
+        travelTimes = np.linalg.norm(np.asarray(self.positions) - position, axis=1) / medium_speed
+        self.emit_time = float(np.mean(np.asarray(self.times) - travelTimes))
+
+    def add(self, arrival):
+        self.arrivals.append(arrival)
+        self.sensor_ids.add(arrival.sensor_id)
+        self.positions.append(arrival.position)
+        self.times.append(arrival.time)
+
+    def remove(self, arrival):
+        index = self.arrivals.index(arrival)
+        del self.arrivals[index], self.positions[index], self.times[index]
+        self.sensor_ids.discard(arrival.sensor_id)
+
+
+class StreamingGunshotLocalizer:
+
+    # min_sensors = arrivals needed before an event is solved. The solver needs at least 5 sensors that aren't coplanar
+    # expected_sensors = total number of sensors. An event heard by all of them is finished right away instead of
+    #                    waiting for its window to pass (None to always wait)
+    # max_sensor_distance = largest distance in meters between any two sensors. Sets how long an event stays open
+    # timing_tolerance = seconds of timing error allowed when deciding whether arrivals belong to the same event, and the
+    #                    largest residual an event may have against its own estimate to be published as final
+    # idle_flush = seconds without any arrivals before all open events are finished
+    def __init__(self, min_sensors = 5, expected_sensors = None, max_sensor_distance = 100.0, timing_tolerance = 1e-4,
+                 idle_flush = 0.5, medium_speed = SPEED_OF_SOUND_MPS):
+        self.min_sensors = min_sensors
+        self.expected_sensors = expected_sensors
+        self.timing_tolerance = timing_tolerance
+        self.idle_flush = idle_flush
+        self.medium_speed = medium_speed
+        # no sensor can hear a sound later than this after the first one did
+        self.window = max_sensor_distance / medium_speed + timing_tolerance
+
+        self.arrivals = asyncio.Queue()
+        self.estimates = asyncio.Queue()
+
+        # open events, oldest first
+        self.events = []
+        self.next_event_id = 0
+        self.latest_time = None
+
+        self.arrival_count = 0
+        self.event_count = 0
+        self.unresolved_count = 0
+        self.latencies = []
+
+    # adds an arrival from code running on the event loop
+    def submit(self, arrival : SensorArrival):
+        arrival.received = time.perf_counter()
+        self.arrivals.put_nowait(arrival)
+
+    # adds an arrival from another thread (e.g. an audio callback)
+    def submitThreadsafe(self, loop : asyncio.AbstractEventLoop, arrival : SensorArrival):
+        loop.call_soon_threadsafe(self.submit, arrival)
+
+    def stop(self):
+        self.arrivals.put_nowait(None)
+
+    def _solve(self, event):
+        positions = solve_tdoa_batch(np.asarray(event.positions)[None], np.asarray(event.times)[None], self.medium_speed)
+        return positions[0] if np.isfinite(positions[0]).all() else None
+
+    def _consistent(self, event, position):
+        return event.maxResidual(position, self.medium_speed) <= self.timing_tolerance
+
+    # the arrival whose removal leaves event consistent with one gunshot (every leave-one-out subset is solved in one
+    # batch), or None if there isn't exactly one such arrival
+    def _findStray(self, event):
+        count = len(event.arrivals)
+        if count - 1 < self.min_sensors:
+            return None
+        keep = ~np.eye(count, dtype=bool)
+        positions = np.broadcast_to(np.asarray(event.positions), (count, count, 3))[keep].reshape(count, count - 1, 3)
+        times = np.broadcast_to(np.asarray(event.times), (count, count))[keep].reshape(count, count - 1)
+        estimates = solve_tdoa_batch(positions, times, self.medium_speed)
+
+        emitTimes = times - np.linalg.norm(positions - estimates[:, None, :], axis=2) / self.medium_speed
+        residuals = np.max(np.abs(emitTimes - np.mean(emitTimes, axis=1, keepdims=True)), axis=1)
+        fits = np.flatnonzero(np.isfinite(residuals) & (residuals <= self.timing_tolerance))
+        return event.arrivals[fits[0]] if len(fits) == 1 else None
+
+    # adds arrival to event if the event can still be one gunshot with it, re-solving the event. When the arrival makes
+    # the event inconsistent because an earlier arrival came from another gunshot, that arrival is taken out and
+    # associated again. returns False (leaving the event as it was) if the arrival doesn't fit
+    def _tryAdd(self, event, arrival, published):
+        event.add(arrival)
+        if len(event.times) < self.min_sensors:
+            return True
+        position = self._solve(event)
+        if position is None:
+            # can't be checked yet, more sensors may make it solvable
+            return True
+        if not self._consistent(event, position):
+            stray = self._findStray(event)
+            if stray is None or stray is arrival:
+                event.remove(arrival)
+                return False
+            event.remove(stray)
+            position = self._solve(event)
+            self._associate(stray, published)
+
+        event.setEstimate(position, self.medium_speed)
+        if self.expected_sensors is not None and len(event.times) >= self.expected_sensors:
+            estimate = self._finish(event, arrival.received)
+            if estimate is not None:
+                published.append(estimate)
+        else:
+            published.append(self._publish(event, position, arrival.received, final=False))
+        return True
+
+    def _publish(self, event, position, received, final):
+        latency = time.perf_counter() - received
+        estimate = GunshotEstimate(event.event_id, position, len(event.times), event.first_arrival_time, latency, final)
+        self.latencies.append(latency)
+        self.estimates.put_nowait(estimate)
+        return estimate
+
+    # an event is only published as final if every arrival in it fits its estimate. Otherwise it counts as unresolved
+    def _finish(self, event, received):
+        self.events.remove(event)
+        if event.estimate is None or not self._consistent(event, event.estimate):
+            self.unresolved_count += 1
+            return None
+        return self._publish(event, event.estimate, received, final=True)
+
+    # puts an arrival in the solved event that predicts it best (within the timing tolerance), otherwise the oldest open
+    # event it can be part of (the one most likely to still be waiting for this sensor), otherwise a new event
+    def _associate(self, arrival, published):
+        candidates = [(candidate.residual(arrival, self.medium_speed, self.timing_tolerance), candidate) for candidate in self.events]
+        candidates = [(residual, candidate) for residual, candidate in candidates if residual is not None]
+        predicted = sorted([fit for fit in candidates if fit[0] <= self.timing_tolerance], key=lambda fit: fit[0])
+        ordered = [candidate for residual, candidate in predicted] + [candidate for residual, candidate in candidates if residual > self.timing_tolerance]
+        for event in ordered:
+            if self._tryAdd(event, arrival, published):
+                return event
+
+        event = GunshotEvent(self.next_event_id)
+        self.next_event_id += 1
+        self.event_count += 1
+        self.events.append(event)
+        self._tryAdd(event, arrival, published)
+        return event
+
+    # associates one arrival with an open event (or starts a new one) and re-solves that event.
+    # returns the estimates published because of this arrival
+    def process(self, arrival : SensorArrival):
+        if arrival.received is None:
+            arrival.received = time.perf_counter()
+        self.arrival_count += 1
+        self.latest_time = arrival.time if self.latest_time is None else max(self.latest_time, arrival.time)
+
+        published = self.flush(self.latest_time, arrival.received)
+        self._associate(arrival, published)
+        return published
+
+    # finishes every event whose window has passed by stream_time (all open events if stream_time is None)
+    def flush(self, stream_time = None, received = None):
+        received = received if received is not None else time.perf_counter()
+        published = []
+        for event in list(self.events):
+            if stream_time is None or stream_time > event.first_arrival_time + self.window:
+                estimate = self._finish(event, received)
+                if estimate is not None:
+                    published.append(estimate)
+        return published
+
+    async def run(self):
+        while True:
+            # only wait (with a timeout) when nothing is queued, so bursts of arrivals are handled back to back
+            try:
+                arrival = self.arrivals.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    arrival = await asyncio.wait_for(self.arrivals.get(), self.idle_flush)
+                except asyncio.TimeoutError:
+                    self.flush()
+                    continue
+            if arrival is None:
+                break
+            self.process(arrival)
+        self.flush()
+        self.estimates.put_nowait(None)
+
+    def report(self, print_report = True):
+        latencies = np.array(self.latencies) * 1000
+        report = {
+            "arrivals" : self.arrival_count,
+            "events" : self.event_count,
+            "unresolved_events" : self.unresolved_count,
+            "latency_ms_p50" : float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "latency_ms_p99" : float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        }
+        if print_report:
+            print(f"Localizer: {report['arrivals']} arrivals, {report['events']} events "
+                  f"({report['unresolved_events']} unresolved), latency p50 {report['latency_ms_p50']:.2f} ms "
+                  f"p99 {report['latency_ms_p99']:.2f} ms")
+        return report
+
+
+class GunshotDispatcher:
+
+    # drones = Drone objects that can be sent to gunshots, using their own client (not the one used to read sensor
+    #          positions, see Drone)
+    # height = z (NED, so negative is up) the drones fly to above each gunshot
+    def __init__(self, drones, height = -5, velocity = 7, duration = 60):
+        self.drones = list(drones)
+        self.height = height
+        self.velocity = velocity
+        self.duration = duration
+
+        # vehicle name -> time.monotonic() when the drone should reach the gunshot it was sent to
+        self.busy_until = {}
+        self.dispatches = []
+        # position lookups and move commands are RPCs, so they run on this thread instead of the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    # sends the closest drone that isn't on its way somewhere else (or the closest drone if all are busy).
+    # doesn't wait for the drone to arrive
+    def dispatch(self, estimate : GunshotEstimate):
+        target = Vector3r(estimate.position[0], estimate.position[1], self.height)
+        now = time.monotonic()
+
+        distances = {drone.vehicleName : target.distance_to(drone.getWorldPosition()) for drone in self.drones}
+        idle = [drone for drone in self.drones if self.busy_until.get(drone.vehicleName, 0) <= now]
+        drone = min(idle or self.drones, key=lambda drone: distances[drone.vehicleName])
+
+        drone.moveToWorldPosition(target, self.velocity, self.duration)
+        self.busy_until[drone.vehicleName] = now + distances[drone.vehicleName] / self.velocity
+        self.dispatches.append((estimate.event_id, drone.vehicleName))
+        print(f"Sending {drone.vehicleName} to gunshot {estimate.event_id} at {target}")
+        return drone
+
+    async def run(self, estimates : asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            estimate = await estimates.get()
+            if estimate is None:
+                break
+            if estimate.final:
+                await loop.run_in_executor(self.executor, self.dispatch, estimate)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+# arrivals of gunshots at every sensor, sorted by time, for feeding the localizer without a real audio front end.
+# sources = (E, 3) gunshot positions, shot_times = (E,) when each gunshot was fired
+# sensors = list of (sensor_id, position) shared by every gunshot
+def simulate_arrival_stream(sources, shot_times, sensors, medium_speed = SPEED_OF_SOUND_MPS, noise_std = 0.0, rng = None):
+    sensorIds = [sensorId for sensorId, position in sensors]
+    sensorPositions = np.array([position for sensorId, position in sensors], dtype=np.float64)
+
+    distances = np.linalg.norm(sensorPositions[None, :, :] - np.asarray(sources, dtype=np.float64)[:, None, :], axis=2)
+    times = np.asarray(shot_times, dtype=np.float64)[:, None] + distances / medium_speed
+    if noise_std > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        times = times + rng.normal(0.0, noise_std, size=times.shape)
+
+    arrivals = [SensorArrival(sensorIds[j], sensorPositions[j], times[i, j]) for i in range(len(times)) for j in range(len(sensorIds))]
+    arrivals.sort(key=lambda arrival: arrival.time)
+    return arrivals
@@ -0,0 +1,202 @@
+#this file provides a scheduler that spawns simulated gunshots on a background event loop so callers don't block
+
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import airsim
+from tdoa import SPEED_OF_SOUND_MPS
+
+class ScheduledShot:
+    """
+    One scheduled gunshot. position is filled in when it fires if it was scheduled with a function choosing it.
+    result is what classify returned ((top classes, confidence) for detect_gunshot), None if it wasn't classified.
+    future is a concurrent.futures.Future that's done when every event of the shot has run
+    """
+    __slots__ = ("shot_id", "position", "audio_path", "due_time", "fire_time", "distance", "arrival_time", "result", "future")
+
+    def __init__(self, shot_id, position, audio_path, due_time):
+        self.shot_id = shot_id
+        self.position = position
+        self.audio_path = audio_path
+        # time.monotonic() times
+        self.due_time = due_time
+        self.fire_time = None
+        self.distance = None
+        self.arrival_time = None
+        self.result = None
+        self.future = None
+
+    # seconds the shot fired after it was due
+    @property
+    def lateness(self):
+        return self.fire_time - self.due_time if self.fire_time is not None else None
+
+    def __repr__(self):
+        return f"ScheduledShot({self.shot_id}, position={self.position}, distance={self.distance}, result={self.result})"
+
+
+class GunshotScheduler:
+
+    # client = airsim client used only by the scheduler's RPC thread. Same rule as Drone's client: give the
+    #          scheduler its own connection if anything else is using the client meanwhile
+    # audio_paths = wav files, one is picked at random for each shot
+    # play = function(audio_path) that starts playing a sound without blocking, called when the sound reaches the
+    #        listener (None for silence)
+    # classify = function(audio_path) run on the worker pool once the sound has reached the listener, e.g.
+    #            detect_gunshot (None to skip classification)
+    # on_result = function(ScheduledShot) called on the worker pool after classification
+    # listener_name = vehicle whose distance to the gunshot sets when the sound arrives
+    # classify_workers = threads running classify
+    def __init__(self, client : airsim.MultirotorClient, audio_paths, play = None, classify = None, on_result = None,
+                 listener_name = '', classify_workers = 2, medium_speed = SPEED_OF_SOUND_MPS):
+        self.client = client
+        self.audio_paths = list(audio_paths)
+        self.play = play
+        self.classify = classify
+        self.on_result = on_result
+        self.listener_name = listener_name
+        self.medium_speed = medium_speed
+
+        self.rpc_executor = ThreadPoolExecutor(max_workers=1)
+        self.classify_executor = ThreadPoolExecutor(max_workers=classify_workers)
+        self.loop = None
+        self.thread = None
+
+        # schedule can be called from any thread while the loop finishes shots
+        self.lock = threading.Lock()
+        self.next_shot_id = 0
+        self.scheduled_count = 0
+        self.completed_count = 0
+        self.failed_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # how late spawns and sound arrivals ran compared to when they were due
+        self.fire_lateness = []
+        self.arrival_lateness = []
+
+    def start(self):
+        # asyncio's default clock is time.monotonic, so due times can be shared with callers
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    # waits for shots in flight to finish (up to timeout seconds) and stops the loop and worker threads
+    def stop(self, timeout = None):
+        if self.loop is None:
+            return
+        self.join(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.rpc_executor.shutdown(wait=False)
+        self.classify_executor.shutdown(wait=False)
+
+    # blocks until every scheduled shot has finished. returns False on timeout
+    def join(self, timeout = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.in_flight > 0:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # schedules a gunshot delay seconds from now and returns right away. Safe to call from any thread.
+    # position = Vector3r, or a function(client) returning one that's called on the RPC thread when the shot fires
+    # (e.g. randomNearbyGroundPoint, so the position is near where the drone is then rather than now)
+    def schedule(self, position, delay = 0.0, audio_path = None):
+        if self.loop is None:
+            self.start()
+        with self.lock:
+            shot = ScheduledShot(self.next_shot_id, position, audio_path or random.choice(self.audio_paths), time.monotonic() + delay)
+            self.next_shot_id += 1
+            self.scheduled_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        shot.future = asyncio.run_coroutine_threadsafe(self._run(shot), self.loop)
+        return shot
+
+    # schedules count shots interval seconds apart
+    def scheduleEvery(self, position, count, interval = 2.0, delay = 0.0):
+        return [self.schedule(position, delay + i * interval) for i in range(count)]
+
+    # runs on the RPC thread: spawns the light and returns the listener's distance to it
+    def _spawn(self, shot):
+        if callable(shot.position):
+            shot.position = shot.position(self.client)
+        pose = airsim.Pose(position_val=shot.position)
+        self.client.simSpawnObject("GunshotLight", "GunshotLightBase2", pose, airsim.Vector3r(1, 1, 1), False, True)
+        listenerPose = self.client.simGetVehiclePose(vehicle_name=self.listener_name)
+        dist = pose.position.distance_to(listenerPose.position)
+        self.client.simPrintLogMessage(f"Spawned gunshot!", f"   Distance: {round(dist,2)} meters away. Should play sound after {round(dist/self.medium_speed,2)} seconds")
+        return dist
+
+    def _classify(self, shot):
+        shot.result = self.classify(shot.audio_path)
+        if self.on_result is not None:
+            self.on_result(shot)
+
+    async def _run(self, shot):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(shot.due_time - loop.time())
+            shot.fire_time = loop.time()
+            self.fire_lateness.append(shot.fire_time - shot.due_time)
+            shot.distance = await loop.run_in_executor(self.rpc_executor, self._spawn, shot)
+
+            # the sound leaves when the shot was due, so a slow spawn RPC doesn't delay it
+            shot.arrival_time = shot.due_time + shot.distance / self.medium_speed
+            await asyncio.sleep(shot.arrival_time - loop.time())
+            self.arrival_lateness.append(loop.time() - shot.arrival_time)
+            if self.play is not None:
+                self.play(shot.audio_path)
+
+            if self.classify is not None:
+                await loop.run_in_executor(self.classify_executor, self._classify, shot)
+            self.completed_count += 1
+        except Exception as e:
+            self.failed_count += 1
+            print(f"Gunshot {shot.shot_id} failed: {e}")
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        return shot
+
+    def report(self, print_report = True):
+        fireLateness = sorted(self.fire_lateness)
+        arrivalLateness = sorted(self.arrival_lateness)
+        percentile = lambda values, p: values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else 0.0
+        report = {
+            "scheduled" : self.scheduled_count,
+            "completed" : self.completed_count,
+            "failed" : self.failed_count,
+            "max_in_flight" : self.max_in_flight,
+            "fire_lateness_ms_p50" : percentile(fireLateness, 0.5),
+            "fire_lateness_ms_p99" : percentile(fireLateness, 0.99),
+            "arrival_lateness_ms_p99" : percentile(arrivalLateness, 0.99),
+        }
+        if print_report:
+            print(f"Gunshot scheduler: {report['completed']}/{report['scheduled']} shots done ({report['failed']} failed), "
+                  f"up to {report['max_in_flight']} in flight, fired late by p50 {report['fire_lateness_ms_p50']:.2f} ms "
+                  f"p99 {report['fire_lateness_ms_p99']:.2f} ms, sound late by p99 {report['arrival_lateness_ms_p99']:.2f} ms")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+# a point near the ground around the default vehicle, spread wider the higher it flies
+def randomNearbyGroundPoint(client : airsim.MultirotorClient):
+    dronePose = client.simGetVehiclePose()
+    gunshotPos = airsim.Vector3r(dronePose.position.x_val, dronePose.position.y_val, -3)
+
+    droneHeight = dronePose.position.z_val
+    randSpawnRangeFactor = (droneHeight / 2) + 5
+
+    gunshotPos += airsim.Vector3r(random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-randSpawnRangeFactor, randSpawnRangeFactor), random.uniform(-2, 2))
+    return gunshotPos
@@ -1,65 +1,74 @@
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
-import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-from transformers import (
-    SwinForImageClassification, 
-    Swinv2ForImageClassification, 
-    ConvNextForImageClassification, 
-    ResNetForImageClassification, 
-    DeiTForImageClassification,
-    ViTForImageClassification,
-)
-import timm  # for additional model support
-import torchvision.models as models  # for torchvision resnet models
+
+# Backbone loaders by model_type. Each one imports its library (transformers, torchvision or timm) only when that
+# model_type is built, since importing all of them takes seconds and only one backbone is ever used.
+def _load_hf(class_name):
+    def load(model_name):
+        import transformers
+        return getattr(transformers, class_name).from_pretrained(model_name)
+    return load
+
+def _load_resnet(model_name):
+    # First try: if model name contains "microsoft", use the transformer variant
+    if "microsoft" in model_name:
+        return _load_hf("ResNetForImageClassification")(model_name)
+    # Second: if model name starts with "resnet", load from torchvision models
+    elif model_name.startswith("resnet"):
+        import torchvision.models as models  # for torchvision resnet models
+        backbone = models.__dict__[model_name](pretrained=True)
+        # Remove the default classification head
+        backbone.fc = nn.Identity()
+        return backbone
+    else:
+        # Fall back to timm for other resnet variants
+        import timm  # for additional model support
+        return timm.create_model(model_name, pretrained=True)
+
+BACKBONE_LOADERS = {
+    "swin": _load_hf("SwinForImageClassification"),
+    "swinv2": _load_hf("Swinv2ForImageClassification"),
+    "convnext": _load_hf("ConvNextForImageClassification"),
+    "resnet": _load_resnet,
+    "deit": _load_hf("DeiTForImageClassification"),
+    "vit": _load_hf("ViTForImageClassification"),
+}
+
+def register_backbone(model_type, loader):
+    """
+    Adds a model_type. loader(model_name) returns the backbone module; import its library inside the loader.
+    """
+    BACKBONE_LOADERS[model_type] = loader
 
 class DualInputModel(nn.Module):
     def __init__(self, model_name="microsoft/swin-tiny-patch4-window7-224", model_type="swin", 
-                 num_classes=2, dropout_rate=0.3, fusion_type="concat", num_inputs=None):
+                 num_classes=2, dropout_rate=0.3, fusion_type="concat", num_inputs=None, batch_inputs=False):
         """
         Dual-input model that supports multiple fusion methods and variable number of inputs.
         
         Parameters:
         - model_name: str, pre-trained model name.
-        - model_type: str, type of backbone model ("swin", "swinv2", "convnext", "resnet", "deit", "vit").
+        - model_type: str, type of backbone model ("swin", "swinv2", "convnext", "resnet", "deit", "vit", or one
+                    added with register_backbone).
         - num_classes: int, number of output classes.
         - dropout_rate: float, dropout probability.
         - fusion_type: str, fusion method ("concat", "weighted_sum", "diff_mul", "self_attention", "gated", "cross_attention").
         - num_inputs: int or None, expected number of inputs for fusion methods that need a fixed number.
                     For fusion types that can handle variable numbers (e.g. weighted_sum, self_attention),
                     this can be left as None.
+        - batch_inputs: bool, opt-in speedup: run all inputs through the backbone in one call (concatenated along
+                    the batch dimension) when their shapes match and the backbone is in eval mode, instead of one
+                    backbone call per input. Mostly helps on a GPU; on a CPU it measured about 12% slower.
         """
         super(DualInputModel, self).__init__()
         self.fusion_type = fusion_type
         self.num_inputs = num_inputs
+        self.batch_inputs = batch_inputs
 
         # --- Load Pretrained Backbone ---
-        if model_type == "swin":
-            self.backbone = SwinForImageClassification.from_pretrained(model_name)
-        elif model_type == "swinv2":
-            self.backbone = Swinv2ForImageClassification.from_pretrained(model_name)
-        elif model_type == "convnext":
-            self.backbone = ConvNextForImageClassification.from_pretrained(model_name)
-        elif model_type == "resnet":
-            # First try: if model name contains "microsoft", use the transformer variant
-            if "microsoft" in model_name:
-                self.backbone = ResNetForImageClassification.from_pretrained(model_name)
-            # Second: if model name starts with "resnet", load from torchvision models
-            elif model_name.startswith("resnet"):
-                self.backbone = models.__dict__[model_name](pretrained=True)
-                # Remove the default classification head
-                self.backbone.fc = nn.Identity()
-            else:
-                # Fall back to timm for other resnet variants
-                self.backbone = timm.create_model(model_name, pretrained=True)
-        elif model_type == "deit":
-            self.backbone = DeiTForImageClassification.from_pretrained(model_name)
-        elif model_type == "vit":
-            self.backbone = ViTForImageClassification.from_pretrained(model_name)
-        else:
-            raise ValueError("Invalid model type. Choose between 'swin', 'swinv2', 'convnext', 'resnet', 'deit', 'vit'.")
+        if model_type not in BACKBONE_LOADERS:
+            raise ValueError(f"Invalid model type. Choose between {', '.join(repr(name) for name in BACKBONE_LOADERS)}.")
+        self.backbone = BACKBONE_LOADERS[model_type](model_name)
 
         # --- Determine input feature dimension ---
         if hasattr(self.backbone, "classifier") and hasattr(self.backbone.classifier, "in_features"):
@@ -72,6 +81,9 @@ class DualInputModel(nn.Module):
             # If unable to determine, require user to provide the expected dimension.
             raise ValueError(f"Unexpected model structure for {model_type}.")
 
+        # Size of the features the backbone produces for each input (what FeatureCache stores)
+        self.feature_dim = in_features
+
         # Remove the default classifier head so we can fuse features
         if hasattr(self.backbone, "classifier"):
             self.backbone.classifier = nn.Identity()
@@ -122,24 +134,42 @@ class DualInputModel(nn.Module):
         else:
             raise ValueError("Invalid fusion type. Choose one of: 'concat', 'weighted_sum', 'diff_mul', 'self_attention', 'gated', 'cross_attention'.")
 
+    def _backbone_features(self, x):
+        out = self.backbone(x)
+        # Some models return an object with a 'logits' attribute.
+        return out.logits if hasattr(out, 'logits') else out
+
+    def extract_features(self, *inputs):
+        """
+        Backbone features of each input, as a list of [batch, feature_dim] tensors.
+
+        With batch_inputs on, inputs of the same shape are concatenated along the batch dimension and go through
+        the backbone in one call, then split back apart. That's only done while the backbone is in eval mode, so a
+        backbone with BatchNorm layers (e.g. ResNet) being trained still normalizes each input on its own.
+        """
+        if len(inputs) == 0:
+            raise ValueError("At least one input is required.")
+
+        if self.batch_inputs and not self.backbone.training and len(inputs) > 1 and all(x.shape == inputs[0].shape for x in inputs):
+            feat = self._backbone_features(torch.cat(inputs, dim=0))
+            # chunk rather than split by batch size, so traced/exported graphs keep a dynamic batch dimension
+            return list(torch.chunk(feat, len(inputs), dim=0))
+
+        return [self._backbone_features(x) for x in inputs]
+
     def forward(self, *inputs):
         """
         Forward pass that accepts a variable number of inputs.
         
-        Each input is processed individually through the backbone.
+        The inputs go through the backbone (one at a time, or together with batch_inputs, see extract_features).
         Fusion is then applied depending on the selected fusion type.
         """
-        if len(inputs) == 0:
-            raise ValueError("At least one input is required.")
-
-        # Process each input through the backbone
-        features = []
-        for x in inputs:
-            out = self.backbone(x)
-            # Some models return an object with a 'logits' attribute.
-            feat = out.logits if hasattr(out, 'logits') else out
-            features.append(feat)
+        return self.fuse(self.extract_features(*inputs))
 
+    def fuse(self, features):
+        """
+        Fusion heads only, on a list of per-input backbone features (from extract_features or a FeatureCache).
+        """
         if self.fusion_type == "concat":
             if self.num_inputs is None or len(features) != self.num_inputs:
                 raise ValueError(f"'concat' fusion expects {self.num_inputs} inputs; got {len(features)}")
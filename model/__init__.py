@@ -1 +1,28 @@
-from .DualInputModel import DualInputModel
+import importlib
+from .DualInputModel import DualInputModel, register_backbone
+
+# the rest of the package is imported the first time one of its names is used, so importing the model only pays
+# for DualInputModel
+_LAZY_NAMES = {
+    "FeatureCache": "feature_cache",
+    "precompute_features": "feature_cache",
+    "NASAPairDataset": "nasa_dataset",
+    "PrefetchLoader": "nasa_dataset",
+    "make_loader": "nasa_dataset",
+    "normalize_images": "nasa_dataset",
+    "DualInputInference": "inference",
+    "compare_outputs": "inference",
+    "export_model": "export",
+}
+
+__all__ = ["DualInputModel", "register_backbone", *_LAZY_NAMES]
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module("." + _LAZY_NAMES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
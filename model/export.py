@@ -0,0 +1,52 @@
+import json
+import torch
+from .nasa_dataset import IMAGENET_MEAN, IMAGENET_STD
+
+def export_model(model, path, num_inputs=2, image_size=224, opset=17):
+    """
+    Exports the backbone and fusion head of a trained DualInputModel as one artifact with num_inputs image
+    inputs, loadable by dual_input_runtime.DualInputRuntime without transformers, timm or torchvision.
+
+    Parameters:
+    - model: DualInputModel.
+    - path: str, ".onnx" exports ONNX, ".pt" TorchScript (traced).
+    - num_inputs: int, number of images per sample (2 for satellite + streetview).
+    - image_size: int, input height and width the model was trained on.
+    - opset: int, ONNX opset.
+
+    The metadata the runtime needs (inputs, image size, normalization) is written to <path>.json.
+    Returns the path.
+    """
+    # forward returns a plain logits tensor (extract_features unwraps HuggingFace outputs), so it traces as is
+    model.eval()
+    example = tuple(torch.randn(1, 3, image_size, image_size) for i in range(num_inputs))
+    input_names = [f"input_{i}" for i in range(num_inputs)]
+
+    if path.endswith(".onnx"):
+        dynamic_axes = {name: {0: "batch"} for name in input_names + ["logits"]}
+        # the TorchScript-based exporter: newer torch defaults to the dynamo one, which needs onnxscript and
+        # doesn't take dynamic_axes
+        with torch.no_grad():
+            torch.onnx.export(model, example, path, input_names=input_names, output_names=["logits"],
+                              dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+        export_format = "onnx"
+    elif path.endswith(".pt"):
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example, strict=False)
+        traced = torch.jit.freeze(traced)
+        traced.save(path)
+        export_format = "torchscript"
+    else:
+        raise ValueError("Export path must end in '.onnx' (ONNX) or '.pt' (TorchScript).")
+
+    metadata = {
+        "format": export_format,
+        "input_names": input_names,
+        "image_size": image_size,
+        "mean": list(IMAGENET_MEAN),
+        "std": list(IMAGENET_STD),
+        "fusion_type": model.fusion_type,
+    }
+    with open(path + ".json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    return path
@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+import torch
+
+class FeatureCache:
+    def __init__(self, path, feature_dim, names):
+        """
+        On-disk cache of backbone features, one float16 row per image name, read through a memory map.
+
+        With a frozen backbone the features of an image never change, so they can be computed once
+        (see precompute_features) and the fusion heads trained on them with DualInputModel.fuse instead of
+        running the backbone on every image every epoch.
+
+        Parameters:
+        - path: str, file the features are stored in. The image names and which rows are filled are
+                stored next to it in <path>.json.
+        - feature_dim: int, size of each feature vector (DualInputModel.feature_dim).
+        - names: iterable of str, every image name the cache holds, e.g. the Sitelite_img_name and
+                Streetview_img_name columns of NASA_Datasets.csv.
+
+        An existing cache at path is reused if it was made with the same feature_dim and names, otherwise
+        it is replaced. Use a different path for each backbone or preprocessing.
+        """
+        self.path = path
+        self.index_path = path + ".json"
+        self.feature_dim = feature_dim
+        self.names = list(dict.fromkeys(names))
+        self.rows = {name: row for row, name in enumerate(self.names)}
+
+        index = None
+        if os.path.exists(self.index_path) and os.path.exists(path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        if index is not None and index["feature_dim"] == feature_dim and index["names"] == self.names:
+            self.filled = np.array(index["filled"], dtype=bool)
+            mode = "r+"
+        else:
+            self.filled = np.zeros(len(self.names), dtype=bool)
+            mode = "w+"
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.features = np.memmap(path, dtype=np.float16, mode=mode, shape=(len(self.names), feature_dim))
+
+    def __contains__(self, name):
+        row = self.rows.get(name)
+        return row is not None and bool(self.filled[row])
+
+    def __len__(self):
+        return int(self.filled.sum())
+
+    def missing(self, names):
+        """
+        The names that don't have features cached yet.
+        """
+        return [name for name in names if name not in self]
+
+    def put(self, names, features):
+        """
+        Stores a [len(names), feature_dim] tensor or array of features.
+        """
+        if isinstance(features, torch.Tensor):
+            features = features.detach().float().cpu().numpy()
+        rows = np.array([self.rows[name] for name in names])
+        self.features[rows] = features.astype(np.float16)
+        self.filled[rows] = True
+
+    def get(self, names, device=None):
+        """
+        Cached features of names as a float32 [len(names), feature_dim] tensor.
+        """
+        rows = np.array([self.rows[name] for name in names])
+        if not self.filled[rows].all():
+            raise KeyError(f"No cached features for {self.missing(names)[:5]}")
+        features = torch.from_numpy(np.asarray(self.features[rows], dtype=np.float32))
+        return features.to(device) if device is not None else features
+
+    def flush(self):
+        """
+        Writes the features and the index to disk.
+        """
+        self.features.flush()
+        with open(self.index_path, "w") as f:
+            json.dump({"feature_dim": self.feature_dim, "names": self.names, "filled": self.filled.tolist()}, f)
+
+
+def precompute_features(model, cache, names, load_images, batch_size=64, device="cpu"):
+    """
+    Fills the cache with the backbone features of every name that isn't cached yet.
+
+    Parameters:
+    - model: DualInputModel whose backbone features are cached.
+    - cache: FeatureCache.
+    - names: iterable of str, image names to cache.
+    - load_images: function(list of names) returning a [len(names), C, H, W] tensor of preprocessed images.
+    - batch_size: int, images per backbone call.
+    - device: torch device the backbone runs on.
+
+    Returns the number of images that were run through the backbone.
+    """
+    missing = cache.missing(dict.fromkeys(names))
+    was_training = model.training
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, len(missing), batch_size):
+            batch_names = missing[start:start + batch_size]
+            features = model.extract_features(load_images(batch_names).to(device))[0]
+            cache.put(batch_names, features)
+    cache.flush()
+    model.train(was_training)
+    return len(missing)
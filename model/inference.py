@@ -0,0 +1,68 @@
+import copy
+import torch
+import torch.nn as nn
+
+# fusion head layers of DualInputModel, whichever of them the fusion type uses
+HEAD_NAMES = ("interaction_layer", "classifier", "gate")
+
+class DualInputInference(nn.Module):
+    def __init__(self, model, bf16=True, compile=False, quantize_heads=True, copy_model=True):
+        """
+        CPU inference mode for a trained DualInputModel.
+
+        Parameters:
+        - model: DualInputModel.
+        - bf16: bool, run the backbone under bfloat16 autocast (fast on CPUs with AVX512-BF16 or AMX, otherwise
+                  mostly saves memory bandwidth).
+        - compile: bool, torch.compile the backbone. The first call is slow while it compiles.
+        - quantize_heads: bool, dynamic int8 quantization of the Linear layers of the fusion heads. The
+                  attention fusions' MultiheadAttention is left in float.
+        - copy_model: bool, convert a copy so the given model can still be trained or compared against.
+
+        Calls run under torch.inference_mode and take the same inputs as DualInputModel.forward.
+        """
+        super(DualInputInference, self).__init__()
+        model = copy.deepcopy(model) if copy_model else model
+        model.eval()
+        self.bf16 = bf16
+
+        if quantize_heads:
+            heads = [name for name in HEAD_NAMES if isinstance(getattr(model, name, None), nn.Module)]
+            # qconfig by module name, so only the heads (and the Linear layers inside them) are converted, not the backbone
+            torch.ao.quantization.quantize_dynamic(
+                model, qconfig_spec={name: torch.ao.quantization.default_dynamic_qconfig for name in heads},
+                dtype=torch.qint8, inplace=True)
+            unconverted = [f"{name}.{child}".rstrip(".") for name in heads
+                           for child, module in getattr(model, name).named_modules() if type(module) is nn.Linear]
+            if unconverted:
+                raise RuntimeError(f"Dynamic quantization left these head layers in float: {unconverted}")
+        if compile:
+            model.backbone = torch.compile(model.backbone)
+
+        self.model = model
+
+    def forward(self, *inputs):
+        with torch.inference_mode():
+            with torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.bf16):
+                features = self.model.extract_features(*inputs)
+            # the heads run in float32 (int8 quantized heads only take float32)
+            return self.model.fuse([feat.float() for feat in features])
+
+
+def compare_outputs(reference, optimized, *inputs):
+    """
+    Accuracy delta of an optimized model against the fp32 model on the same inputs.
+
+    Returns a dict with the largest absolute logit difference, the largest difference in predicted
+    probability, and the fraction of samples whose predicted class agrees.
+    """
+    with torch.inference_mode():
+        reference_logits = reference.eval()(*inputs).float()
+        optimized_logits = optimized(*inputs).float()
+    reference_probs = torch.softmax(reference_logits, dim=1)
+    optimized_probs = torch.softmax(optimized_logits, dim=1)
+    return {
+        "max_logit_delta": float((reference_logits - optimized_logits).abs().max()),
+        "max_probability_delta": float((reference_probs - optimized_probs).abs().max()),
+        "prediction_agreement": float((reference_logits.argmax(dim=1) == optimized_logits.argmax(dim=1)).float().mean()),
+    }
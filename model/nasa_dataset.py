@@ -0,0 +1,231 @@
+import os
+import csv
+import json
+import time
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+
+# ImageNet statistics the pretrained backbones expect
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+def format_image_name(name):
+    """
+    The renamed form Original/fix.py gives a 4 digit name that has no image (s1001 -> s10001).
+    """
+    if name and len(name) > 1 and name[1:].isdigit() and len(name[1:]) == 4:
+        return name[:1] + name[1:2] + "0" + name[2:]
+    return name
+
+
+class NASAPairDataset(Dataset):
+    def __init__(self, csv_file="Original/NASA_Datasets.csv", satellite_folder="Original/satellite_images",
+                 streetview_folder="Original/streetview_images", image_size=224, shard_path=None):
+        """
+        Satellite + streetview image pairs from NASA_Datasets.csv, labelled 1 for abandoned and 0 for owned.
+
+        The CSV is read and both image folders are listed once, here. Rows whose images can't be found (even
+        under the name Original/fix.py would rename them to) are left out and listed in self.missing, so
+        epochs never touch the directories again.
+
+        Images are decoded and resized once. The resized pixels are kept in a memory-mapped uint8 shard file
+        that every DataLoader worker shares, so later epochs (and later runs) only read the shard.
+
+        Parameters:
+        - csv_file: str, path of NASA_Datasets.csv.
+        - satellite_folder, streetview_folder: str, folders of <image name>.png files.
+        - image_size: int, images are resized to image_size x image_size.
+        - shard_path: str or None, shard file. Defaults to nasa_<image_size>.u8 in the satellite folder's parent.
+                      Its index (the image paths) is stored next to it in <shard_path>.json and which images
+                      are filled in <shard_path>.filled.
+
+        Items are (satellite, streetview, label) with the images as uint8 [3, H, W] tensors. Use
+        PrefetchLoader (or normalize_images) to turn batches into normalized float tensors on the device.
+        """
+        self.image_size = image_size
+        self.shard_path = shard_path or os.path.join(os.path.dirname(os.path.abspath(satellite_folder)), f"nasa_{image_size}.u8")
+
+        with open(csv_file, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        existing = {folder: set(os.listdir(folder)) if os.path.isdir(folder) else set()
+                    for folder in (satellite_folder, streetview_folder)}
+
+        def resolve(folder, name):
+            for candidate in (name, format_image_name(name)):
+                if candidate and candidate + ".png" in existing[folder]:
+                    return os.path.join(folder, candidate + ".png")
+            return None
+
+        # every image path once, pairs refer to them by position in the shard
+        self.image_paths = []
+        image_rows = {}
+        def image_row(path):
+            if path not in image_rows:
+                image_rows[path] = len(self.image_paths)
+                self.image_paths.append(path)
+            return image_rows[path]
+
+        self.pairs = []
+        self.missing = []
+        for row in rows:
+            satellite = resolve(satellite_folder, row["Sitelite_img_name"])
+            streetview = resolve(streetview_folder, row["Streetview_img_name"])
+            if satellite is None or streetview is None:
+                self.missing.append(row["ID"])
+                continue
+            self.pairs.append((image_row(satellite), image_row(streetview), int(row["Status"] == "Abandoned")))
+
+        if self.missing:
+            print(f"NASAPairDataset: {len(self.missing)} of {len(rows)} rows skipped for missing images (IDs {self.missing[:10]}...)")
+
+        self._create_shard()
+        # opened lazily in each process, memory maps don't survive being sent to worker processes
+        self._pixels = None
+        self._filled = None
+        self._pid = None
+
+    def _create_shard(self):
+        index_path = self.shard_path + ".json"
+        index = None
+        if os.path.exists(index_path) and os.path.exists(self.shard_path) and os.path.exists(self.shard_path + ".filled"):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        if index is not None and index["image_size"] == self.image_size and index["image_paths"] == self.image_paths:
+            return
+
+        # a different image set or size, start over
+        shape = (max(len(self.image_paths), 1), self.image_size, self.image_size, 3)
+        np.memmap(self.shard_path, dtype=np.uint8, mode="w+", shape=shape).flush()
+        np.memmap(self.shard_path + ".filled", dtype=np.uint8, mode="w+", shape=(shape[0],)).flush()
+        with open(index_path, "w") as f:
+            json.dump({"image_size": self.image_size, "image_paths": self.image_paths}, f)
+
+    def _open_shard(self):
+        if self._pid != os.getpid():
+            shape = (max(len(self.image_paths), 1), self.image_size, self.image_size, 3)
+            self._pixels = np.memmap(self.shard_path, dtype=np.uint8, mode="r+", shape=shape)
+            self._filled = np.memmap(self.shard_path + ".filled", dtype=np.uint8, mode="r+", shape=(shape[0],))
+            self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pixels"] = state["_filled"] = state["_pid"] = None
+        return state
+
+    def _image(self, row):
+        self._open_shard()
+        if not self._filled[row]:
+            from PIL import Image
+            with Image.open(self.image_paths[row]) as image:
+                pixels = np.asarray(image.convert("RGB").resize((self.image_size, self.image_size), Image.BILINEAR))
+            # pixels before the flag, so another worker never reads a half-written image
+            self._pixels[row] = pixels
+            self._filled[row] = 1
+        return torch.from_numpy(np.array(self._pixels[row])).permute(2, 0, 1)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __getitem__(self, idx):
+        satellite, streetview, label = self.pairs[idx]
+        return self._image(satellite), self._image(streetview), label
+
+    @property
+    def cached_fraction(self):
+        self._open_shard()
+        return float(np.mean(self._filled[:len(self.image_paths)])) if self.image_paths else 1.0
+
+    def __repr__(self):
+        return (f"NASAPairDataset({len(self.pairs)} pairs, {len(self.missing)} skipped, "
+                f"{self.cached_fraction:.0%} of {len(self.image_paths)} images in the shard)")
+
+
+def make_loader(dataset, batch_size=32, shuffle=True, num_workers=4, prefetch_factor=4):
+    """
+    DataLoader decoding images in num_workers processes and keeping prefetch_factor batches per worker ready,
+    in pinned memory when CUDA is available so they can be copied to the GPU asynchronously.
+    """
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available(),
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+        persistent_workers=num_workers > 0,
+    )
+
+
+def normalize_images(images, device=None):
+    """
+    uint8 [B, 3, H, W] images to ImageNet-normalized float tensors, converted on device.
+    """
+    images = images.to(device, non_blocking=True) if device is not None else images
+    mean = torch.tensor(IMAGENET_MEAN, device=images.device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=images.device).view(1, 3, 1, 1)
+    return (images.float() / 255 - mean) / std
+
+
+class PrefetchLoader:
+    def __init__(self, loader, device="cuda"):
+        """
+        Iterates a make_loader DataLoader, copying the next batch to device (on a side CUDA stream) while the
+        current one is used. Yields (satellite, streetview, labels) as normalized float tensors on device.
+        """
+        self.loader = loader
+        self.device = torch.device(device)
+        self.image_count = 0
+        self.wait_time = 0.0
+        self.elapsed = 0.0
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _to_device(self, batch):
+        satellite, streetview, labels = batch
+        return (normalize_images(satellite, self.device), normalize_images(streetview, self.device),
+                labels.to(self.device, non_blocking=True))
+
+    def __iter__(self):
+        stream = torch.cuda.Stream() if self.device.type == "cuda" else None
+        start = time.perf_counter()
+        iterator = iter(self.loader)
+
+        def fetch():
+            fetch_start = time.perf_counter()
+            batch = next(iterator, None)
+            self.wait_time += time.perf_counter() - fetch_start
+            if batch is None:
+                return None
+            if stream is None:
+                return self._to_device(batch)
+            with torch.cuda.stream(stream):
+                return self._to_device(batch)
+
+        upcoming = fetch()
+        while upcoming is not None:
+            if stream is not None:
+                torch.cuda.current_stream().wait_stream(stream)
+                for tensor in upcoming:
+                    tensor.record_stream(torch.cuda.current_stream())
+            current = upcoming
+            upcoming = fetch()
+            self.image_count += 2 * len(current[2])
+            yield current
+        self.elapsed += time.perf_counter() - start
+
+    def report(self, print_report=True):
+        """
+        Images per second delivered, and the time spent waiting on the workers (near 0 when loading keeps up).
+        """
+        report = {
+            "images": self.image_count,
+            "images_per_second": self.image_count / self.elapsed if self.elapsed > 0 else 0.0,
+            "wait_seconds": self.wait_time,
+        }
+        if print_report:
+            print(f"Loader: {report['images']} images, {report['images_per_second']:,.0f} images/s, "
+                  f"{report['wait_seconds']:.2f} s waiting for workers")
+        return report
@@ -0,0 +1,79 @@
+#this file classifies every microphone in the fleet with one YAMNet call and fuses their scores
+
+import numpy as np
+from tdoa import SPEED_OF_SOUND_MPS
+from audio_constants import YAMNET_SAMPLE_RATE as SAMPLE_RATE
+
+class MultiMicResult:
+    """
+    Scores of one sound heard by several microphones.
+    confidences = (N,) best gunshot class score per sensor, explosion_confidences the same for explosions
+    fused_confidence = best gunshot class score of the sensors' scores averaged together
+    """
+    __slots__ = ("sensor_ids", "confidences", "explosion_confidences", "fused_confidence", "fused_explosion_confidence")
+
+    def __init__(self, sensor_ids, confidences, explosion_confidences, fused_confidence, fused_explosion_confidence):
+        self.sensor_ids = sensor_ids
+        self.confidences = confidences
+        self.explosion_confidences = explosion_confidences
+        self.fused_confidence = fused_confidence
+        self.fused_explosion_confidence = fused_explosion_confidence
+
+    def __repr__(self):
+        return (f"MultiMicResult(sensors={len(self.confidences)}, fused={self.fused_confidence:.2f}, "
+                f"per sensor={np.round(self.confidences, 2).tolist()})")
+
+
+class MultiMicClassifier:
+
+    # classifier = GunshotClassifier (the shared one from airsim_gunshot_detection if None)
+    def __init__(self, classifier = None):
+        if classifier is None:
+            from airsim_gunshot_detection import get_classifier
+            classifier = get_classifier()
+        self.classifier = classifier.load()
+        self.model_calls = 0
+
+    # waveforms = one 16 kHz float32 waveform per sensor. sensor_ids = names for them (e.g. FleetSnapshot.sensor_ids)
+    def classify(self, waveforms, sensor_ids = None):
+        frameScores = self.classifier.frameScoresBatch(waveforms)
+        self.model_calls += 1
+
+        # max over frames per sensor, so a short bang isn't averaged away by the quiet around it
+        sensorScores = np.stack([scores.max(axis=0) for scores in frameScores])
+        fusedScores = sensorScores.mean(axis=0)
+
+        gunshotIds = self.classifier.gunshot_ids
+        explosionIds = self.classifier.explosion_ids
+        best = lambda scores, ids: scores[..., ids].max(axis=-1) if len(ids) else np.zeros(scores.shape[:-1])
+
+        return MultiMicResult(
+            list(sensor_ids) if sensor_ids is not None else list(range(len(waveforms))),
+            best(sensorScores, gunshotIds),
+            best(sensorScores, explosionIds),
+            float(best(fusedScores, gunshotIds)),
+            float(best(fusedScores, explosionIds)),
+        )
+
+# what each sensor would record of a sound played at source_position: the clip delayed by the travel time (fractional
+# delays, applied as a phase shift so GCC-PHAT can be checked below one sample), attenuated by distance (spherical
+# spreading, 1 at 1 m) and with gaussian noise added. Recording starts when the closest sensor hears it.
+# sensor_positions = (N, 3), e.g. FleetSnapshot.sensor_positions. returns a list of N waveforms of equal length
+def synthesize_sensor_signals(waveform, sensor_positions, source_position, noise_std = 0.01, rng = None,
+                              medium_speed = SPEED_OF_SOUND_MPS, sample_rate = SAMPLE_RATE):
+    distances = np.linalg.norm(np.asarray(sensor_positions, dtype=np.float64) - np.asarray(source_position, dtype=np.float64), axis=1)
+    delays = (distances - distances.min()) / medium_speed
+    gains = 1.0 / np.maximum(distances, 1.0)
+    length = len(waveform) + int(np.ceil(delays.max() * sample_rate)) + 1
+
+    # padding keeps the circular shift from wrapping the end of the clip around to the start
+    nfft = 1 << int(np.ceil(np.log2(length + len(waveform))))
+    spectrum = np.fft.rfft(waveform, n=nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1 / sample_rate)
+    shifted = spectrum[None, :] * np.exp(-2j * np.pi * frequencies[None, :] * delays[:, None]) * gains[:, None]
+    signals = np.fft.irfft(shifted, n=nfft)[:, :length].astype(np.float32)
+
+    if noise_std > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        signals += rng.normal(0.0, noise_std, size=signals.shape).astype(np.float32)
+    return list(signals)
@@ -3,7 +3,9 @@ import cv2
 import keyboard
 import time
 import multiprocessing
-from yolo import YOLODetector
+from yolo import ANNOTATED_RENDERER
+from detector_service import get_detector
+from detection_pipeline import DetectionPipeline
 
 def run_target_detection(stop_event):
     """
@@ -14,8 +16,8 @@ def run_target_detection(stop_event):
         client = airsim.MultirotorClient()
         client.confirmConnection()
         
-        # Initialize YOLO detector
-        detector = YOLODetector("model/best.pt")
+        # Use the shared detector service if it's running, otherwise load the model here
+        detector = get_detector(["model/best.pt"])
         
         # Setup camera
         camera_pose = airsim.Pose()
@@ -35,43 +37,14 @@ def run_target_detection(stop_event):
 
         print("Target detection started")
         
-        while not stop_event.is_set():
-            try:
-                # Get image from camera
-                rawImage = client.simGetImage("bottom_center", airsim.ImageType.Scene)
-                if rawImage is None:
-                    print("Failed to get image")
-                    continue
-
-                # Decode image
-                png = cv2.imdecode(airsim.string_to_uint8_array(rawImage), cv2.IMREAD_UNCHANGED)
-                if png is None:
-                    print("Failed to decode image")
-                    continue
-
-                # Process image with YOLO detector
-                detection_image, targets_found = detector.process_image(png)
-
-                # Show images
-                cv2.imshow("Bottom Camera View", png)
-                cv2.imshow("Detection Results", detection_image)
-                
-                # Check if windows are closed
-                if cv2.getWindowProperty("Bottom Camera View", cv2.WND_PROP_VISIBLE) < 1 or \
-                   cv2.getWindowProperty("Detection Results", cv2.WND_PROP_VISIBLE) < 1:
-                    break
-                
-                # Handle keyboard input
-                key = cv2.waitKey(1) & 0xFF
-                if key == 27 or keyboard.is_pressed('esc'):
-                    break
-
-            except Exception as e:
-                print(f"Error in detection loop: {str(e)}")
-                time.sleep(1)  # Prevent rapid error loops
+        # capture, decode, detection and display each run on their own thread so they overlap
+        pipeline = DetectionPipeline(client, detector, show_raw=True, renderer=ANNOTATED_RENDERER)
+        pipeline.run(stop_event=stop_event)
 
     except Exception as e:
         print(f"Error in target detection process: {str(e)}")
     finally:
+        if 'detector' in locals():
+            detector.close()
         cv2.destroyAllWindows()
         print("Target detection stopped") 
\ No newline at end of file
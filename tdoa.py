@@ -0,0 +1,164 @@
+# this file provides the time-difference-of-arrival (TDOA) gunshot solvers (see https://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=1145216)
+
+import numpy as np
+
+SPEED_OF_SOUND_MPS = 343
+
+# calculates position of sound based on positions of sensors and time delay between each sensor hearing the sound
+def calcSoundEmitPosition(sensorSpots : list, audioTimes : list, mediumSpeed : float = SPEED_OF_SOUND_MPS):
+    # imported here so the batch solver below only needs numpy
+    from airsim import Vector3r
+
+    if(len(audioTimes) != len(sensorSpots)):
+        raise ValueError("The length of audioTimes should be the same as the length of sensor spots. (and directly correspond with indices)")
+
+    size = len(sensorSpots)
+
+    # distances relative to sensor that heard the sound first
+    relativeDists = []
+    for i, audioTime in enumerate(audioTimes):
+        relativeDists.append(audioTime * mediumSpeed)
+        if(audioTime == 0): # for algorithm below, reference sensor can be any one but I'm picking the one thats closest and hears the sound first
+            referenceSensorId = i
+
+    # for this algorithm see https://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=1145216
+
+    # S_j in the paper. N-1x3 matrix of xyz coord of each sensor relative to reference sensor
+    sensorOffsetsToReference = np.zeros((size - 1,3))
+
+    # mu_j in the paper. I don't have an intuitive understanding/name for this. 
+    # Also in the paper the definition of this is slightly misprinted, all values need to be squared
+    mew = np.zeros(size - 1) 
+
+    # rho_j in the paper. Vector of the range differences between each sensor and reference sensor. 
+    # Since the chosen reference sensor has relativeDist 0 as defined above, this is just the relativeDists array
+    rangeDifferences = np.zeros(size - 1)
+    
+    referenceSensorPos = sensorSpots[referenceSensorId]
+
+    for j, sensorSpot in enumerate(sensorSpots):
+        if(j == referenceSensorId):
+            continue
+        
+        rowj = j if j < referenceSensorId else j-1 # lets us skip the reference sensor row in the following matrices
+        
+        sensorOffsetsToReference[rowj] = np.array(
+            (sensorSpot.x_val - referenceSensorPos.x_val,
+            sensorSpot.y_val - referenceSensorPos.y_val,
+            sensorSpot.z_val - referenceSensorPos.z_val)
+        )
+
+        mew[rowj] = (sensorSpot.get_length()**2 - referenceSensorPos.get_length()**2 - relativeDists[j]**2)/2 
+        rangeDifferences[rowj] = relativeDists[j]
+
+
+    # M_j in the paper. called distance remover because this is multiplied by rho_j to always get 0 and 
+    # this removes R_j_s (dist from reference sensor to source, which is what we want to find) from the equation.
+    # leaving x_s (position of source) as the only unknown
+    circularShift = np.roll(np.identity(size - 1), (1, 0), axis=(1, 0))
+    d_j = np.linalg.inv(np.diag(rangeDifferences))
+    distanceRemover = np.matmul((np.identity(size - 1) - (circularShift)), d_j)
+    
+    # compute position of source X_s
+    first_term = np.matmul(np.matmul(np.matmul(np.transpose(sensorOffsetsToReference), np.transpose(distanceRemover)), distanceRemover), sensorOffsetsToReference)
+    x_source = np.matmul(np.matmul(np.matmul(np.matmul(np.linalg.inv(first_term), np.transpose(sensorOffsetsToReference)), np.transpose(distanceRemover)), distanceRemover), mew)
+
+    return Vector3r(x_source[0], x_source[1], x_source[2])
+
+# the one event at a time way: one calcSoundEmitPosition call per event with lists of Vector3r.
+# sensors = (E, N, 3), times = (E, N) passed to calcSoundEmitPosition as they are, so like its other callers they
+# must already be relative to the first arrival (one exact 0 per event)
+# failures = optional Counter that gets the reason each unsolved event failed ("singular" or "no_reference")
+def localize_one_by_one(sensors, times, failures = None):
+    from airsim import Vector3r
+
+    positions = np.full((len(times), 3), np.nan)
+    for i, (eventSensors, eventTimes) in enumerate(zip(sensors, times)):
+        sensorSpots = [Vector3r(*spot) for spot in eventSensors.tolist()]
+        try:
+            estimate = calcSoundEmitPosition(sensorSpots, eventTimes.tolist())
+        except np.linalg.LinAlgError:
+            if failures is not None:
+                failures["singular"] += 1
+            continue
+        except UnboundLocalError:
+            # no time was exactly 0, so referenceSensorId never got set
+            if failures is not None:
+                failures["no_reference"] += 1
+            continue
+        positions[i] = (estimate.x_val, estimate.y_val, estimate.z_val)
+    return positions
+
+# calculates the positions of E sound events at once. Same algorithm as calcSoundEmitPosition, without building
+# the NxN matrices or inverting them
+# sensor_positions = (E, N, 3) array of sensor positions for each event (or (N, 3) if every event uses the same sensors)
+# arrival_times = (E, N) array of the time each sensor heard each event. Only differences matter, so these can be
+#                 absolute times; the sensor that heard the event first is used as the reference sensor
+# returns an (E, 3) array of estimated source positions. Events that can't be solved (a sensor hearing the sound at
+# exactly the same time as the reference, too few sensors, or sensors in a degenerate layout) come back as NaN rows
+def solve_tdoa_batch(sensor_positions, arrival_times, medium_speed = SPEED_OF_SOUND_MPS):
+    arrival_times = np.asarray(arrival_times, dtype=np.float64)
+    if arrival_times.ndim == 1:
+        arrival_times = arrival_times[None, :]
+    eventCount, sensorCount = arrival_times.shape
+
+    sensor_positions = np.asarray(sensor_positions, dtype=np.float64)
+    if sensor_positions.ndim == 2:
+        sensor_positions = np.broadcast_to(sensor_positions, (eventCount, sensorCount, 3))
+    if sensor_positions.shape != (eventCount, sensorCount, 3):
+        raise ValueError("sensor_positions should be (E, N, 3) and arrival_times (E, N), with matching E and N")
+
+    # distances relative to the sensor that heard the sound first
+    referenceIds = np.argmin(arrival_times, axis=1)
+    relativeDists = (arrival_times - arrival_times[np.arange(eventCount), referenceIds][:, None]) * medium_speed
+
+    # indices of every sensor except the reference, in their original order (the non-reference sensors sort first)
+    sensorIndices = np.arange(sensorCount)
+    others = np.argsort(sensorIndices[None, :] == referenceIds[:, None], axis=1, kind='stable')[:, :sensorCount - 1]
+
+    referencePos = sensor_positions[np.arange(eventCount), referenceIds]              # (E, 3)
+    otherPos = np.take_along_axis(sensor_positions, others[:, :, None], axis=1)      # (E, N-1, 3)
+
+    # S_j, rho_j and mu_j in the paper
+    sensorOffsetsToReference = otherPos - referencePos[:, None, :]
+    rangeDifferences = np.take_along_axis(relativeDists, others, axis=1)
+    mew = (np.einsum('ejk,ejk->ej', otherPos, otherPos) - np.einsum('ek,ek->e', referencePos, referencePos)[:, None] - rangeDifferences**2) / 2
+
+    # a zero range difference makes diag(rho) singular, same as in the original function
+    valid = np.all(rangeDifferences != 0, axis=1)
+    rangeDifferences = np.where(valid[:, None], rangeDifferences, 1.0)
+
+    # M_j = (I - circular shift) diag(rho)^-1. Multiplying by it just scales each row by 1/rho_j and subtracts the next
+    # row, so M S and M mu are computed directly instead of building and inverting matrices
+    scaledOffsets = sensorOffsetsToReference / rangeDifferences[:, :, None]
+    scaledMew = mew / rangeDifferences
+    A = scaledOffsets - np.roll(scaledOffsets, -1, axis=1)
+    b = scaledMew - np.roll(scaledMew, -1, axis=1)
+
+    # least squares solution of A x = b through the 3x3 normal equations, solved for all events together
+    normalMatrix = np.einsum('eji,ejk->eik', A, A)
+    normalRhs = np.einsum('eji,ej->ei', A, b)
+
+    # singular normal matrices would make the batched solve fail for every event, so they are swapped for the identity
+    # here and their results thrown away below
+    condition = np.linalg.cond(normalMatrix)
+    solvable = valid & np.isfinite(condition) & (condition < 1 / np.finfo(np.float64).eps)
+    normalMatrix[~solvable] = np.eye(3)
+
+    positions = np.linalg.solve(normalMatrix, normalRhs[:, :, None])[:, :, 0]
+    positions[~solvable] = np.nan
+    return positions
+
+# arrival time of each event at each sensor, for simulating gunshots without the simulator.
+# source_positions = (E, 3), sensor_positions = (E, N, 3) or (N, 3). noise_std adds gaussian timing noise (seconds)
+def simulate_arrival_times(source_positions, sensor_positions, medium_speed = SPEED_OF_SOUND_MPS, noise_std = 0.0, rng = None):
+    source_positions = np.asarray(source_positions, dtype=np.float64)
+    sensor_positions = np.asarray(sensor_positions, dtype=np.float64)
+    if sensor_positions.ndim == 2:
+        sensor_positions = sensor_positions[None, :, :]
+
+    times = np.linalg.norm(sensor_positions - source_positions[:, None, :], axis=2) / medium_speed
+    if noise_std > 0:
+        rng = rng if rng is not None else np.random.default_rng()
+        times = times + rng.normal(0.0, noise_std, size=times.shape)
+    return times
@@ -0,0 +1,187 @@
+# this file runs detection over satellite maps far bigger than the detector input (e.g. the map_output.png stitched by get_map.py)
+
+import os
+import csv
+import time
+import cv2
+import numpy as np
+from yolo import Detections
+
+# returns a read-only memory-mapped HxWx3 array of the image. The PNG is decoded once into a .npy file next to it,
+# later runs map that file directly instead of decoding the whole map again
+def open_mapped_image(image_path, cache_path = None):
+    if cache_path is None:
+        cache_path = os.path.splitext(image_path)[0] + ".npy"
+
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(image_path):
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise FileNotFoundError(f"Could not read map image {image_path}")
+        cached = np.lib.format.open_memmap(cache_path, mode='w+', dtype=np.uint8, shape=image.shape)
+        cached[:] = image
+        cached.flush()
+        del cached, image
+
+    return np.load(cache_path, mmap_mode='r')
+
+# start offsets of windows of window_size with the given overlap along an axis of length size. The last window is
+# moved back to end at the edge so it's full size instead of hanging off the map
+def window_starts(size, window_size, overlap):
+    if size <= window_size:
+        return [0]
+    stride = window_size - overlap
+    starts = list(range(0, size - window_size, stride))
+    starts.append(size - window_size)
+    return starts
+
+# greedy non-maximum suppression. boxes is Nx4 (x1, y1, x2, y2), returns indices of the boxes kept, best first.
+# metric = "iou" (intersection over union) or "ios" (intersection over the smaller box's area, which also suppresses
+#          a box that is mostly inside a bigger one, like an object cut off at a tile edge next to the whole object)
+def nms(boxes, scores, iou_threshold = 0.5, metric = "iou"):
+    boxes = boxes.astype(np.float32)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores, kind='stable')
+
+    keep = []
+    while order.size > 0:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+
+        x1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        if metric == "ios":
+            overlap = intersection / np.maximum(np.minimum(areas[best], areas[rest]), 1e-6)
+        else:
+            overlap = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-6)
+
+        order = rest[overlap <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+# NMS that only suppresses boxes of the same class
+def class_aware_nms(detections, iou_threshold = 0.5, metric = "iou"):
+    if len(detections) == 0:
+        return detections
+    boxes = detections.boxes.astype(np.float32)
+    # shifting each class far away from the others keeps boxes of different classes from overlapping
+    offsets = detections.class_ids.astype(np.float32)[:, None] * (boxes.max() + 1)
+    keep = nms(boxes + offsets, detections.confidences, iou_threshold, metric)
+    return Detections(detections.array[np.sort(keep)])
+
+# Nx4 boxes, Wx4 window interiors (x1, y1, x2, y2) -> NxW bool, whether each box lies inside each interior
+def boxes_inside(boxes, interiors):
+    return ((boxes[:, None, 0] >= interiors[None, :, 0]) & (boxes[:, None, 1] >= interiors[None, :, 1]) &
+            (boxes[:, None, 2] <= interiors[None, :, 2]) & (boxes[:, None, 3] <= interiors[None, :, 3]))
+
+
+class TiledDetector:
+
+    # detector = anything with detect_batch(images) -> list of Detections (MultiModelDetector, YOLODetector, RemoteDetector)
+    # window_size = size of the square windows cut from the map, should be close to what the detector was trained on
+    # overlap = pixels shared by neighbouring windows. Should be at least as big as the largest object so every object
+    #           is whole in some window
+    # batch_size = windows per inference call
+    # edge_margin = a box within this many pixels of a window edge that has a neighbouring window counts as cut off
+    #               by that window, and is dropped if another window sees the whole object
+    # nms_metric = "iou" or "ios", see nms. Merges objects seen whole in more than one window. "ios" also merges
+    #              pieces of objects bigger than the overlap, but suppresses more of a dense cluster of objects
+    def __init__(self, detector, window_size = 1024, overlap = 128, batch_size = 8, nms_iou_threshold = 0.5, edge_margin = 2, nms_metric = "iou"):
+        self.detector = detector
+        self.window_size = window_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.nms_iou_threshold = nms_iou_threshold
+        self.edge_margin = edge_margin
+        self.nms_metric = nms_metric
+
+        self.tile_count = 0
+        self.elapsed = 0.0
+
+    def windows(self, image_shape):
+        height, width = image_shape[:2]
+        return [(x, y) for y in window_starts(height, self.window_size, self.overlap)
+                       for x in window_starts(width, self.window_size, self.overlap)]
+
+    # part of each window a box must be inside to be whole there: the window minus edge_margin on every side that
+    # borders another window. Sides on the map border aren't shrunk, objects there can't be seen whole anywhere else
+    def window_interiors(self, origins, image_shape):
+        height, width = image_shape[:2]
+        interiors = []
+        for x, y in origins:
+            x2, y2 = min(x + self.window_size, width), min(y + self.window_size, height)
+            interiors.append((x + self.edge_margin if x > 0 else x,
+                              y + self.edge_margin if y > 0 else y,
+                              x2 - self.edge_margin if x2 < width else x2,
+                              y2 - self.edge_margin if y2 < height else y2))
+        return np.array(interiors, dtype=np.int32).reshape(-1, 4)
+
+    # drops boxes cut off by their window's edge when some other window saw the whole object.
+    # found = list of (window index, Detections in full-image coordinates)
+    def drop_cut_off(self, found, interiors):
+        kept = []
+        for windowIndex, detections in found:
+            inside = boxes_inside(detections.boxes, interiors)
+            cutOff = ~inside[:, windowIndex] & inside.any(axis=1)
+            kept.append(Detections(detections.array[~cutOff]) if cutOff.any() else detections)
+        return kept
+
+    # runs detection over the whole image (an array or a memory-mapped array from open_mapped_image).
+    # returns Detections with boxes in full-image pixel coordinates
+    def detect(self, image):
+        start = time.perf_counter()
+        origins = self.windows(image.shape)
+        interiors = self.window_interiors(origins, image.shape)
+
+        found = []
+        for batchStart in range(0, len(origins), self.batch_size):
+            batchOrigins = origins[batchStart : batchStart + self.batch_size]
+            # only these windows are read from the memory map, the rest of the map stays on disk
+            windows = [np.ascontiguousarray(image[y : y + self.window_size, x : x + self.window_size]) for x, y in batchOrigins]
+
+            for windowIndex, detections in enumerate(self.detector.detect_batch(windows), batchStart):
+                if len(detections) == 0:
+                    continue
+                x, y = origins[windowIndex]
+                detections.array["box"] += np.array([x, y, x, y], dtype=np.int32)
+                found.append((windowIndex, detections))
+
+        merged = class_aware_nms(Detections.concatenate(self.drop_cut_off(found, interiors)), self.nms_iou_threshold, self.nms_metric)
+
+        self.tile_count += len(origins)
+        self.elapsed += time.perf_counter() - start
+        return merged
+
+    @property
+    def tiles_per_second(self):
+        return self.tile_count / self.elapsed if self.elapsed > 0 else 0.0
+
+# writes detections to a csv file with one row per object in full-map pixel coordinates
+def save_detections_csv(detections, csv_path):
+    with open(csv_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["x1", "y1", "x2", "y2", "confidence", "class"])
+        for class_name, conf, (x1, y1, x2, y2) in detections:
+            writer.writerow([x1, y1, x2, y2, round(conf, 4), class_name])
+
+# scans a whole map image offline and saves the detections next to it
+def scan_map(image_path, model_paths, device = "cuda", window_size = 1024, overlap = 128, batch_size = 8):
+    from yolo import MultiModelDetector
+
+    image = open_mapped_image(image_path)
+    detector = MultiModelDetector(model_paths, device=device)
+    tiled = TiledDetector(detector, window_size=window_size, overlap=overlap, batch_size=batch_size)
+
+    detections = tiled.detect(image)
+    detector.close()
+
+    csv_path = os.path.splitext(image_path)[0] + "_detections.csv"
+    save_detections_csv(detections, csv_path)
+    return detections
+
+
+if __name__ == '__main__':
+    from get_map import output_file
+    scan_map(output_file, ["./model/best_pool.pt", "./model/best_car.pt"])
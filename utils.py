@@ -3,7 +3,9 @@ import numpy as np
 import airsim
 import keyboard
 import time
-from yolo import YOLODetector
+from yolo import ANNOTATED_RENDERER
+from detector_service import get_detector
+from detection_pipeline import DetectionPipeline
 def saveImage(client : airsim.MultirotorClient, cameraId = "bottom_center", img_path = "test_image.png"):
     
     png_image = client.simGetImage(cameraId, airsim.ImageType.Scene)
@@ -90,8 +92,8 @@ def start_keyboard_control(client=get_drone_client()):
 def pool_detection(client=get_drone_client()):
     client.enableApiControl(True)
     try:
-        # Initialize YOLO detector
-        detector = YOLODetector("./model/pool.pt")
+        # Use the shared detector service if it's running, otherwise load the model here
+        detector = get_detector(["./model/pool.pt"])
         
         camera_pose = airsim.Pose()
         camera_pose.position = airsim.Vector3r(0, 0, -1)
@@ -108,34 +110,13 @@ def pool_detection(client=get_drone_client()):
         client.simSetCameraFov(camera_name="bottom_center", fov_degrees=90)
         client.simSetCameraInfo(camera_name="bottom_center", camera_info=camera_info)
 
-        while True:
-            rawImage = client.simGetImage("bottom_center", airsim.ImageType.Scene)
-            if rawImage is None:
-                print("Failed to get image")
-                break
-
-            png = cv2.imdecode(airsim.string_to_uint8_array(rawImage), cv2.IMREAD_UNCHANGED)
-            if png is None:
-                print("Failed to decode image")
-                break
-
-            # Process image with YOLO detector
-            detection_image, _ = detector.process_image(png)
-
-            # Show both windows
-            cv2.imshow("Bottom Camera View", png)
-            cv2.imshow("Detection Results", detection_image)
-            
-            if cv2.getWindowProperty("Bottom Camera View", cv2.WND_PROP_VISIBLE) < 1 or \
-               cv2.getWindowProperty("Detection Results", cv2.WND_PROP_VISIBLE) < 1:
-                break
-                
-            key = cv2.waitKey(1) & 0xFF
-            
-            if key == 27 or keyboard.is_pressed('esc'): 
-                break
+        # capture, decode, detection and display each run on their own thread so they overlap
+        pipeline = DetectionPipeline(client, detector, show_raw=True, renderer=ANNOTATED_RENDERER)
+        pipeline.run()
 
     except Exception as e:
         print(f"Error occurred: {str(e)}")
     finally:
+        if 'detector' in locals():
+            detector.close()
         cv2.destroyAllWindows()
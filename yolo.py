@@ -2,6 +2,70 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 import os.path
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+# Compact detection record shared by all detectors: pixel box (x1, y1, x2, y2), confidence and mapped class id
+# (see YOLODetector.mapped_class_names for the id -> name lookup)
+DETECTION_DTYPE = np.dtype([
+    ("box", np.int32, (4,)),
+    ("conf", np.float32),
+    ("class_id", np.int16),
+])
+
+class Detections:
+    """
+    Array-backed list of detections for one frame. Holds no image data, so
+    headless callers can use it without paying for any drawing or copies.
+    """
+    __slots__ = ("array",)
+    
+    def __init__(self, array=None):
+        self.array = np.empty(0, dtype=DETECTION_DTYPE) if array is None else array
+    
+    @classmethod
+    def from_arrays(cls, xyxy, conf, class_ids):
+        """Pack box, confidence and class id arrays into a Detections object"""
+        array = np.empty(len(conf), dtype=DETECTION_DTYPE)
+        # assigning float coordinates to the int32 field truncates like int() did in the per-box loop
+        array["box"] = xyxy
+        array["conf"] = conf
+        array["class_id"] = class_ids
+        return cls(array)
+    
+    @classmethod
+    def concatenate(cls, detections_list):
+        arrays = [detections.array for detections in detections_list if len(detections) > 0]
+        if not arrays:
+            return cls()
+        return cls(np.concatenate(arrays) if len(arrays) > 1 else arrays[0])
+    
+    @property
+    def boxes(self):
+        return self.array["box"]
+    
+    @property
+    def confidences(self):
+        return self.array["conf"]
+    
+    @property
+    def class_ids(self):
+        return self.array["class_id"]
+    
+    @property
+    def class_names(self):
+        return [YOLODetector.mapped_class_names[class_id] for class_id in self.array["class_id"].tolist()]
+    
+    def __len__(self):
+        return len(self.array)
+    
+    def __iter__(self):
+        """Yields (class_name, conf, (x1, y1, x2, y2)) tuples"""
+        for box, conf, class_id in zip(self.boxes.tolist(), self.confidences.tolist(), self.class_ids.tolist()):
+            yield YOLODetector.mapped_class_names[class_id], conf, tuple(box)
+    
+    def __repr__(self):
+        return f"Detections({list(self)})"
 
 class YOLODetector:
     # Predefined color palette for different classes
@@ -56,6 +120,13 @@ class YOLODetector:
     # List of classes to ignore in detection results
     IGNORE_CLASSES = ["other","camping_car","plane","ship","tractor"]
     
+    # Class-wide registry giving every mapped class name a consistent integer id across all models
+    mapped_class_names = []
+    mapped_class_ids = {}
+    # class_colors and the mapped class registry are shared by every detector, and MultiModelDetector
+    # builds and renders from a thread pool
+    registry_lock = Lock()
+    
     # Dictionary for class-specific confidence thresholds
     CLASS_CONF_THRESHOLDS = {
         "large_vehicle": 0.4,
@@ -66,7 +137,9 @@ class YOLODetector:
     
     def __init__(self, model_path="runs/detect/train3/weights/best.pt", device="cuda"):
         self.model = YOLO(model_path).to(device)
+        self.device = device
         self.model_name = os.path.basename(model_path)
+        self.build_class_lookups()
         
     @staticmethod
     def hex_to_rgb(hex_color):
@@ -80,114 +153,230 @@ class YOLODetector:
         """Get a consistent color for a class name across all models"""
         # First check if the class has a predefined color (after mapping)
         if class_name in cls.PREDEFINED_COLORS:
-
-            print(cls.PREDEFINED_COLORS[class_name])
             return cls.hex_to_rgb(cls.PREDEFINED_COLORS[class_name])
             
         # If not in predefined colors, check if we've already assigned a color
-        if class_name not in cls.class_colors:
-            # Assign a new color from the palette
-            color_index = cls.next_color_index % len(cls.COLOR_PALETTE)
-            cls.class_colors[class_name] = cls.COLOR_PALETTE[color_index]
-            cls.next_color_index += 1
-        return cls.class_colors[class_name]
+        color = cls.class_colors.get(class_name)
+        if color is None:
+            with cls.registry_lock:
+                if class_name not in cls.class_colors:
+                    # Assign a new color from the palette
+                    color_index = cls.next_color_index % len(cls.COLOR_PALETTE)
+                    cls.class_colors[class_name] = cls.COLOR_PALETTE[color_index]
+                    cls.next_color_index += 1
+                color = cls.class_colors[class_name]
+        return color
         
-    def process_image(self, image, conf_threshold=0.2):
+    @classmethod
+    def get_mapped_class_id(cls, class_name):
+        """Get a consistent integer id for a (mapped) class name across all models"""
+        class_id = cls.mapped_class_ids.get(class_name)
+        if class_id is None:
+            with cls.registry_lock:
+                if class_name not in cls.mapped_class_ids:
+                    # append before publishing the id, so a reader never sees an id without its name
+                    cls.mapped_class_names.append(class_name)
+                    cls.mapped_class_ids[class_name] = len(cls.mapped_class_names) - 1
+                class_id = cls.mapped_class_ids[class_name]
+        return class_id
+    
+    def build_class_lookups(self):
         """
-        Process an image using YOLO detection and return both the original and annotated images
+        Precompute per-model lookup arrays indexed by the model's raw class id:
+        the mapped class id (-1 for ignored classes) and the class-specific confidence threshold
         """
-        # Create a copy for detection results
-        detection_image = image.copy()
+        names = self.model.names
+        num_classes = max(names) + 1 if len(names) > 0 else 0
+        self.class_id_to_mapped_id = np.full(num_classes, -1, dtype=np.int16)
+        self.class_id_to_threshold = np.zeros(num_classes, dtype=np.float32)
+        
+        for class_id, class_name in names.items():
+            # Ignored classes keep the -1 id and are masked out
+            if class_name in self.__class__.IGNORE_CLASSES:
+                continue
+            
+            # Apply class name mapping if exists
+            class_name = self.__class__.class_name_mapping.get(class_name, class_name)
+            
+            self.class_id_to_mapped_id[class_id] = self.get_mapped_class_id(class_name)
+            self.class_id_to_threshold[class_id] = self.__class__.CLASS_CONF_THRESHOLDS.get(class_name, 0.0)
         
+    @staticmethod
+    def prepare_image(image):
+        """
+        Convert a frame to the 3 channel layout the models expect
+        """
         # Convert RGBA to RGB if needed
         if image.shape[-1] == 4:
             image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-            detection_image = cv2.cvtColor(detection_image, cv2.COLOR_RGBA2RGB)
-            
-        # Perform YOLO detection
-        results = self.model.predict(image, conf=conf_threshold, iou=0.7)
+        return np.ascontiguousarray(image)
         
-        # Process results
-        targets_found = False
+    def filter_results(self, results):
+        """
+        Apply ignore list, class name mapping and class-specific thresholds to YOLO results
+        using boolean masks instead of a per-box loop.
+        Returns a Detections object with mapped class ids.
+        """
+        filtered = []
         for result in results:
             boxes = result.boxes
-            if len(boxes) > 0:
-                targets_found = True
-                for box in boxes:
-                    conf = box.conf.item()
-                    class_id = int(box.cls.item())
-                    class_name = self.model.names[class_id]
-                    
-                    # Skip if class is in ignore list
-                    if class_name in self.__class__.IGNORE_CLASSES:
-                        continue
-                    
-                    # Apply class name mapping if exists
-                    if class_name in self.__class__.class_name_mapping:
-                        class_name = self.__class__.class_name_mapping[class_name]
-                    
-                    # Check class-specific confidence threshold
-                    if class_name in self.__class__.CLASS_CONF_THRESHOLDS:
-                        class_threshold = self.__class__.CLASS_CONF_THRESHOLDS[class_name]
-                        if conf < class_threshold:
-                            continue
-                    
-                    bx1, by1, bx2, by2 = [int(x) for x in box.xyxy[0]]
-                    
-                    # Get consistent color for this class
-                    color = self.get_color_for_class(class_name)
-                    
-                    # Increased line thickness from 2 to 4
-                    cv2.rectangle(detection_image, (bx1, by1), (bx2, by2), color, 4)
-                    conf_text = f"{class_name}: {conf:.2%}"
-                    # Increased font scale from 0.6 to 1.0 and thickness from 2 to 3
-                    cv2.putText(detection_image, conf_text, (bx1, by1-15), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
-        
-        return detection_image, results
+            if len(boxes) == 0:
+                continue
+            
+            xyxy = boxes.xyxy.cpu().numpy()
+            conf = boxes.conf.cpu().numpy()
+            class_ids = boxes.cls.cpu().numpy().astype(np.intp)
+            
+            mapped_ids = self.class_id_to_mapped_id[class_ids]
+            keep = (mapped_ids >= 0) & (conf >= self.class_id_to_threshold[class_ids])
+            
+            filtered.append(Detections.from_arrays(xyxy[keep], conf[keep], mapped_ids[keep]))
+        
+        return Detections.concatenate(filtered)
+    
+    def detect(self, image, conf_threshold=0.2, iou_threshold=0.7):
+        """
+        Run YOLO detection on an image and return the filtered detections without drawing anything
+        """
+        results = self.model.predict(self.prepare_image(image), conf=conf_threshold, iou=iou_threshold)
+        return self.filter_results(results)
+    
+    def detect_batch(self, images, conf_threshold=0.2, iou_threshold=0.7):
+        """
+        Run YOLO detection on several images in one batched predict call.
+        Returns one Detections object per image, in order.
+        """
+        if len(images) == 0:
+            return []
+        results = self.model.predict([self.prepare_image(image) for image in images], conf=conf_threshold, iou=iou_threshold)
+        # predict returns one result per image
+        return [self.filter_results([result]) for result in results]
+        
+    def process_image(self, image, conf_threshold=0.2):
+        """
+        Process an image using YOLO detection and return both the original and annotated images
+        """
+        detection_image = self.prepare_image(image)
+        
+        # Perform YOLO detection
+        results = self.model.predict(detection_image, conf=conf_threshold, iou=0.7)
+        
+        return ANNOTATED_RENDERER.render(detection_image, self.filter_results(results)), results
         
     def draw_detections(self, image, results):
         """
         Draw detection results on an image
         """
-        detection_image = image.copy()
+        return DEFAULT_RENDERER.render(image, self.filter_results(results))
+
+
+class DetectionRenderer:
+    """
+    Draws a whole batch of detections onto an image in one pass.
+    Only needed for display; headless callers can skip it entirely.
+    """
+    
+    def __init__(self, thickness=2, font_scale=0.6, text_thickness=2, text_offset=10):
+        self.thickness = thickness
+        self.font_scale = font_scale
+        self.text_thickness = text_thickness
+        self.text_offset = text_offset
+    
+    def render(self, image, detections, copy=True):
+        """
+        Draw detections onto an image. With copy=False the image is drawn on in place
+        (unless it has to be converted from RGBA or is a read-only capture view, which need a new image anyway).
+        """
+        if image.shape[-1] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+        elif copy or not image.flags.writeable:
+            image = image.copy()
         
-        # Convert RGBA to RGB if needed
-        if detection_image.shape[-1] == 4:
-            detection_image = cv2.cvtColor(detection_image, cv2.COLOR_RGBA2RGB)
+        if len(detections) == 0:
+            return image
         
-        targets_found = False
-        for result in results:
-            boxes = result.boxes
-            if len(boxes) > 0:
-                targets_found = True
-                for box in boxes:
-                    conf = box.conf.item()
-                    class_id = int(box.cls.item())
-                    class_name = self.model.names[class_id]
-                    
-                    # Skip if class is in ignore list
-                    if class_name in self.__class__.IGNORE_CLASSES:
-                        continue
-                    
-                    # Apply class name mapping if exists
-                    if class_name in self.__class__.class_name_mapping:
-                        class_name = self.__class__.class_name_mapping[class_name]
-                    
-                    # Check class-specific confidence threshold
-                    if class_name in self.__class__.CLASS_CONF_THRESHOLDS:
-                        class_threshold = self.__class__.CLASS_CONF_THRESHOLDS[class_name]
-                        if conf < class_threshold:
-                            continue
-                    
-                    bx1, by1, bx2, by2 = [int(x) for x in box.xyxy[0]]
-                    
-                    # Get consistent color for this class
-                    color = self.get_color_for_class(class_name)
-                    
-                    cv2.rectangle(detection_image, (bx1, by1), (bx2, by2), color, 2)
-                    conf_text = f"{class_name}: {conf:.2%}"
-                    cv2.putText(detection_image, conf_text, (bx1, by1-10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        return detection_image
+        # Group by class so each color is looked up once per batch rather than once per box
+        class_ids = detections.class_ids
+        for class_id in np.unique(class_ids).tolist():
+            class_name = YOLODetector.mapped_class_names[class_id]
+            color = YOLODetector.get_color_for_class(class_name)
+            
+            in_class = class_ids == class_id
+            for (bx1, by1, bx2, by2), conf in zip(detections.boxes[in_class].tolist(), detections.confidences[in_class].tolist()):
+                cv2.rectangle(image, (bx1, by1), (bx2, by2), color, self.thickness)
+                conf_text = f"{class_name}: {conf:.2%}"
+                cv2.putText(image, conf_text, (bx1, by1-self.text_offset), 
+                          cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, color, self.text_thickness)
+        
+        return image
+
+# Style used by draw_detections
+DEFAULT_RENDERER = DetectionRenderer()
+# Style used by process_image (thicker lines and bigger text)
+ANNOTATED_RENDERER = DetectionRenderer(thickness=4, font_scale=1.0, text_thickness=3, text_offset=15)
+
+
+class MultiModelDetector:
+    """
+    Runs a stack of YOLO models on the same frame.
+    The frame is converted once and shared by every model, and the filtered
+    detections of all models are merged into a single list.
+    """
+    
+    def __init__(self, model_paths, device="cuda", conf_threshold=0.2, iou_threshold=0.7):
+        self.detectors = [YOLODetector(path, device=device) for path in model_paths]
+        self.device = device
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        
+        # Separate models can overlap their kernels on a GPU. On the CPU each predict
+        # already uses every core, so running them side by side would only add contention.
+        if str(device).startswith("cuda") and len(self.detectors) > 1:
+            self.executor = ThreadPoolExecutor(max_workers=len(self.detectors))
+        else:
+            self.executor = None
+    
+    @staticmethod
+    def prepare_image(image):
+        """
+        Convert a frame once so every model can share it
+        """
+        return YOLODetector.prepare_image(image)
+    
+    def _detect_with(self, detector, image):
+        return detector.detect(image, conf_threshold=self.conf_threshold, iou_threshold=self.iou_threshold)
+    
+    def detect(self, image):
+        """
+        Run every registered model on an image and return the merged, per-class filtered detections
+        """
+        image = self.prepare_image(image)
+        
+        if self.executor is None:
+            per_model = [self._detect_with(detector, image) for detector in self.detectors]
+        else:
+            per_model = list(self.executor.map(lambda detector: self._detect_with(detector, image), self.detectors))
+        
+        return Detections.concatenate(per_model)
+    
+    def _detect_batch_with(self, detector, images):
+        return detector.detect_batch(images, conf_threshold=self.conf_threshold, iou_threshold=self.iou_threshold)
+    
+    def detect_batch(self, images):
+        """
+        Run every registered model on a batch of images (one predict call per model)
+        and return the merged detections for each image, in order
+        """
+        images = [self.prepare_image(image) for image in images]
+        
+        if self.executor is None:
+            per_model = [self._detect_batch_with(detector, images) for detector in self.detectors]
+        else:
+            per_model = list(self.executor.map(lambda detector: self._detect_batch_with(detector, images), self.detectors))
+        
+        return [Detections.concatenate(per_image) for per_image in zip(*per_model)] if per_model else [Detections() for image in images]
+    
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None